@@ -3,11 +3,18 @@ Comprehensive CRUD Views for all models
 This module provides generic CRUD operations for all models in the system
 """
 
+import csv
+import itertools
+import json
 from rest_framework import generics, status, permissions
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.pagination import PageNumberPagination
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
 from django.db.models import Q
+from django.db.models.signals import post_save, pre_save
+from django.http import StreamingHttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters
 
@@ -38,6 +45,10 @@ from inventory.serializers import (
     CustomerInvoiceSerializer, CustomerInvoiceLineItemSerializer, StockMovementSerializer
 )
 from reports.serializers import SalesReportSerializer, ProductAnalyticsSerializer
+from reports.analytics import record_product_view
+from reports.cache import invalidate_reports
+from inventory.idempotency import IdempotentCreateMixin
+from inventory.views import CartReservationMixin
 
 class StandardResultsSetPagination(PageNumberPagination):
     page_size = 20
@@ -67,13 +78,56 @@ class CRUDMixin:
         
         return queryset
 
+class Echo:
+    """File-like object that hands each written line straight back"""
+    
+    def write(self, value):
+        return value
+
+class StreamingExportMixin:
+    """
+    Mixin that streams the whole filtered list as ?export=csv or ?export=jsonl.
+    Rows are read with values() in chunks so memory stays flat for any size.
+    """
+    export_chunk_size = 2000
+    export_exclude = []
+    
+    def get_export_fields(self, queryset):
+        return [
+            field.attname for field in queryset.model._meta.concrete_fields
+            if field.name not in self.export_exclude
+        ]
+    
+    def list(self, request, *args, **kwargs):
+        export = request.query_params.get('export')
+        if export not in ('csv', 'jsonl'):
+            return super().list(request, *args, **kwargs)
+        
+        queryset = self.filter_queryset(self.get_queryset())
+        fields = self.get_export_fields(queryset)
+        # Exports only read the row's own columns, drop any relations the list view prefetches
+        rows = queryset.prefetch_related(None).values_list(*fields).iterator(chunk_size=self.export_chunk_size)
+        
+        if export == 'csv':
+            writer = csv.writer(Echo())
+            content = itertools.chain([writer.writerow(fields)], (writer.writerow(row) for row in rows))
+            content_type = 'text/csv'
+        else:
+            content = (json.dumps(dict(zip(fields, row)), cls=DjangoJSONEncoder) + '\n' for row in rows)
+            content_type = 'application/x-ndjson'
+        
+        response = StreamingHttpResponse(content, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{queryset.model._meta.model_name}.{export}"'
+        return response
+
 # =============================================================================
 # USER CRUD VIEWS
 # =============================================================================
 
-class UserListCreateView(CRUDMixin, generics.ListCreateAPIView):
+class UserListCreateView(IdempotentCreateMixin, StreamingExportMixin, CRUDMixin, generics.ListCreateAPIView):
     queryset = User.objects.all()
     serializer_class = UserSerializer
+    export_exclude = ['password']
     pagination_class = StandardResultsSetPagination
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['role', 'user_type', 'is_active', 'is_staff']
@@ -93,7 +147,7 @@ class UserRetrieveUpdateDestroyView(CRUDMixin, generics.RetrieveUpdateDestroyAPI
 # COMPANY CRUD VIEWS
 # =============================================================================
 
-class CompanyListCreateView(CRUDMixin, generics.ListCreateAPIView):
+class CompanyListCreateView(IdempotentCreateMixin, StreamingExportMixin, CRUDMixin, generics.ListCreateAPIView):
     queryset = Company.objects.all()
     serializer_class = CompanySerializer
     pagination_class = StandardResultsSetPagination
@@ -115,8 +169,8 @@ class CompanyRetrieveUpdateDestroyView(CRUDMixin, generics.RetrieveUpdateDestroy
 # CONTACT CRUD VIEWS
 # =============================================================================
 
-class ContactListCreateView(CRUDMixin, generics.ListCreateAPIView):
-    queryset = Contact.objects.all()
+class ContactListCreateView(IdempotentCreateMixin, StreamingExportMixin, CRUDMixin, generics.ListCreateAPIView):
+    queryset = Contact.objects.select_related('company')
     serializer_class = ContactSerializer
     pagination_class = StandardResultsSetPagination
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
@@ -129,7 +183,7 @@ class ContactListCreateView(CRUDMixin, generics.ListCreateAPIView):
         serializer.save(created_by=self.request.user)
 
 class ContactRetrieveUpdateDestroyView(CRUDMixin, generics.RetrieveUpdateDestroyAPIView):
-    queryset = Contact.objects.all()
+    queryset = Contact.objects.select_related('company')
     serializer_class = ContactSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -137,8 +191,8 @@ class ContactRetrieveUpdateDestroyView(CRUDMixin, generics.RetrieveUpdateDestroy
 # CATEGORY CRUD VIEWS
 # =============================================================================
 
-class CategoryListCreateView(CRUDMixin, generics.ListCreateAPIView):
-    queryset = Category.objects.all()
+class CategoryListCreateView(IdempotentCreateMixin, StreamingExportMixin, CRUDMixin, generics.ListCreateAPIView):
+    queryset = Category.objects.prefetch_related('subcategories__subcategories')
     serializer_class = CategorySerializer
     pagination_class = StandardResultsSetPagination
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
@@ -151,7 +205,7 @@ class CategoryListCreateView(CRUDMixin, generics.ListCreateAPIView):
         serializer.save(created_by=self.request.user)
 
 class CategoryRetrieveUpdateDestroyView(CRUDMixin, generics.RetrieveUpdateDestroyAPIView):
-    queryset = Category.objects.all()
+    queryset = Category.objects.prefetch_related('subcategories__subcategories')
     serializer_class = CategorySerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -159,8 +213,8 @@ class CategoryRetrieveUpdateDestroyView(CRUDMixin, generics.RetrieveUpdateDestro
 # PRODUCT CRUD VIEWS
 # =============================================================================
 
-class ProductListCreateView(CRUDMixin, generics.ListCreateAPIView):
-    queryset = Product.objects.all()
+class ProductListCreateView(IdempotentCreateMixin, StreamingExportMixin, CRUDMixin, generics.ListCreateAPIView):
+    queryset = Product.objects.select_related('company', 'tax', 'category', 'subcategory').prefetch_related('images', 'reviews__user')
     serializer_class = ProductSerializer
     pagination_class = StandardResultsSetPagination
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
@@ -173,15 +227,20 @@ class ProductListCreateView(CRUDMixin, generics.ListCreateAPIView):
         serializer.save(created_by=self.request.user)
 
 class ProductRetrieveUpdateDestroyView(CRUDMixin, generics.RetrieveUpdateDestroyAPIView):
-    queryset = Product.objects.all()
+    queryset = Product.objects.select_related('company', 'tax', 'category', 'subcategory').prefetch_related('images', 'reviews__user')
     serializer_class = ProductSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    def retrieve(self, request, *args, **kwargs):
+        response = super().retrieve(request, *args, **kwargs)
+        record_product_view(self.kwargs['pk'])
+        return response
+
 # =============================================================================
 # PRODUCT IMAGE CRUD VIEWS
 # =============================================================================
 
-class ProductImageListCreateView(CRUDMixin, generics.ListCreateAPIView):
+class ProductImageListCreateView(IdempotentCreateMixin, StreamingExportMixin, CRUDMixin, generics.ListCreateAPIView):
     queryset = ProductImage.objects.all()
     serializer_class = ProductImageSerializer
     pagination_class = StandardResultsSetPagination
@@ -202,20 +261,20 @@ class ProductImageRetrieveUpdateDestroyView(CRUDMixin, generics.RetrieveUpdateDe
 # PRODUCT REVIEW CRUD VIEWS
 # =============================================================================
 
-class ProductReviewListCreateView(CRUDMixin, generics.ListCreateAPIView):
-    queryset = ProductReview.objects.all()
+class ProductReviewListCreateView(IdempotentCreateMixin, StreamingExportMixin, CRUDMixin, generics.ListCreateAPIView):
+    queryset = ProductReview.objects.select_related('user')
     serializer_class = ProductReviewSerializer
     pagination_class = StandardResultsSetPagination
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
-    filterset_fields = ['product', 'rating', 'is_verified']
-    ordering_fields = ['created_at', 'updated_at', 'rating']
+    filterset_fields = ['product', 'rating']
+    ordering_fields = ['created_at', 'rating']
     permission_classes = [permissions.IsAuthenticated]
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
 class ProductReviewRetrieveUpdateDestroyView(CRUDMixin, generics.RetrieveUpdateDestroyAPIView):
-    queryset = ProductReview.objects.all()
+    queryset = ProductReview.objects.select_related('user')
     serializer_class = ProductReviewSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -223,8 +282,8 @@ class ProductReviewRetrieveUpdateDestroyView(CRUDMixin, generics.RetrieveUpdateD
 # TAX CRUD VIEWS
 # =============================================================================
 
-class TaxListCreateView(CRUDMixin, generics.ListCreateAPIView):
-    queryset = Tax.objects.all()
+class TaxListCreateView(IdempotentCreateMixin, StreamingExportMixin, CRUDMixin, generics.ListCreateAPIView):
+    queryset = Tax.objects.select_related('company')
     serializer_class = TaxSerializer
     pagination_class = StandardResultsSetPagination
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
@@ -237,7 +296,7 @@ class TaxListCreateView(CRUDMixin, generics.ListCreateAPIView):
         serializer.save(created_by=self.request.user)
 
 class TaxRetrieveUpdateDestroyView(CRUDMixin, generics.RetrieveUpdateDestroyAPIView):
-    queryset = Tax.objects.all()
+    queryset = Tax.objects.select_related('company')
     serializer_class = TaxSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -245,8 +304,8 @@ class TaxRetrieveUpdateDestroyView(CRUDMixin, generics.RetrieveUpdateDestroyAPIV
 # CHART OF ACCOUNTS CRUD VIEWS
 # =============================================================================
 
-class ChartOfAccountsListCreateView(CRUDMixin, generics.ListCreateAPIView):
-    queryset = ChartOfAccounts.objects.all()
+class ChartOfAccountsListCreateView(IdempotentCreateMixin, StreamingExportMixin, CRUDMixin, generics.ListCreateAPIView):
+    queryset = ChartOfAccounts.objects.select_related('company', 'parent')
     serializer_class = ChartOfAccountsSerializer
     pagination_class = StandardResultsSetPagination
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
@@ -259,7 +318,7 @@ class ChartOfAccountsListCreateView(CRUDMixin, generics.ListCreateAPIView):
         serializer.save(created_by=self.request.user)
 
 class ChartOfAccountsRetrieveUpdateDestroyView(CRUDMixin, generics.RetrieveUpdateDestroyAPIView):
-    queryset = ChartOfAccounts.objects.all()
+    queryset = ChartOfAccounts.objects.select_related('company', 'parent')
     serializer_class = ChartOfAccountsSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -267,7 +326,7 @@ class ChartOfAccountsRetrieveUpdateDestroyView(CRUDMixin, generics.RetrieveUpdat
 # SELLER PROFILE CRUD VIEWS
 # =============================================================================
 
-class SellerProfileListCreateView(CRUDMixin, generics.ListCreateAPIView):
+class SellerProfileListCreateView(IdempotentCreateMixin, StreamingExportMixin, CRUDMixin, generics.ListCreateAPIView):
     queryset = SellerProfile.objects.all()
     serializer_class = SellerProfileSerializer
     pagination_class = StandardResultsSetPagination
@@ -289,8 +348,8 @@ class SellerProfileRetrieveUpdateDestroyView(CRUDMixin, generics.RetrieveUpdateD
 # SELLER PRODUCT CRUD VIEWS
 # =============================================================================
 
-class SellerProductListCreateView(CRUDMixin, generics.ListCreateAPIView):
-    queryset = SellerProduct.objects.all()
+class SellerProductListCreateView(IdempotentCreateMixin, StreamingExportMixin, CRUDMixin, generics.ListCreateAPIView):
+    queryset = SellerProduct.objects.select_related('product', 'seller')
     serializer_class = SellerProductSerializer
     pagination_class = StandardResultsSetPagination
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
@@ -303,7 +362,7 @@ class SellerProductListCreateView(CRUDMixin, generics.ListCreateAPIView):
         serializer.save(seller=self.request.user)
 
 class SellerProductRetrieveUpdateDestroyView(CRUDMixin, generics.RetrieveUpdateDestroyAPIView):
-    queryset = SellerProduct.objects.all()
+    queryset = SellerProduct.objects.select_related('product', 'seller')
     serializer_class = SellerProductSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -311,8 +370,8 @@ class SellerProductRetrieveUpdateDestroyView(CRUDMixin, generics.RetrieveUpdateD
 # SELLER INVOICE CRUD VIEWS
 # =============================================================================
 
-class SellerInvoiceListCreateView(CRUDMixin, generics.ListCreateAPIView):
-    queryset = SellerInvoice.objects.all()
+class SellerInvoiceListCreateView(IdempotentCreateMixin, StreamingExportMixin, CRUDMixin, generics.ListCreateAPIView):
+    queryset = SellerInvoice.objects.select_related('seller')
     serializer_class = SellerInvoiceSerializer
     pagination_class = StandardResultsSetPagination
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
@@ -325,7 +384,7 @@ class SellerInvoiceListCreateView(CRUDMixin, generics.ListCreateAPIView):
         serializer.save()
 
 class SellerInvoiceRetrieveUpdateDestroyView(CRUDMixin, generics.RetrieveUpdateDestroyAPIView):
-    queryset = SellerInvoice.objects.all()
+    queryset = SellerInvoice.objects.select_related('seller')
     serializer_class = SellerInvoiceSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -333,7 +392,7 @@ class SellerInvoiceRetrieveUpdateDestroyView(CRUDMixin, generics.RetrieveUpdateD
 # CART CRUD VIEWS
 # =============================================================================
 
-class CartListCreateView(CRUDMixin, generics.ListCreateAPIView):
+class CartListCreateView(IdempotentCreateMixin, StreamingExportMixin, CartReservationMixin, CRUDMixin, generics.ListCreateAPIView):
     queryset = Cart.objects.all()
     serializer_class = CartSerializer
     pagination_class = StandardResultsSetPagination
@@ -343,24 +402,21 @@ class CartListCreateView(CRUDMixin, generics.ListCreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return Cart.objects.filter(user=self.request.user)
+        return Cart.objects.filter(user=self.request.user).select_related('product', 'reservation')
 
-    def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
-
-class CartRetrieveUpdateDestroyView(CRUDMixin, generics.RetrieveUpdateDestroyAPIView):
+class CartRetrieveUpdateDestroyView(CartReservationMixin, CRUDMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Cart.objects.all()
     serializer_class = CartSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return Cart.objects.filter(user=self.request.user)
+        return Cart.objects.filter(user=self.request.user).select_related('product', 'reservation')
 
 # =============================================================================
 # ORDER CRUD VIEWS
 # =============================================================================
 
-class OrderListCreateView(CRUDMixin, generics.ListCreateAPIView):
+class OrderListCreateView(IdempotentCreateMixin, StreamingExportMixin, CRUDMixin, generics.ListCreateAPIView):
     queryset = Order.objects.all()
     serializer_class = OrderSerializer
     pagination_class = StandardResultsSetPagination
@@ -371,7 +427,7 @@ class OrderListCreateView(CRUDMixin, generics.ListCreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user)
+        return Order.objects.filter(user=self.request.user).select_related('user').prefetch_related('items__product')
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
@@ -382,14 +438,14 @@ class OrderRetrieveUpdateDestroyView(CRUDMixin, generics.RetrieveUpdateDestroyAP
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user)
+        return Order.objects.filter(user=self.request.user).select_related('user').prefetch_related('items__product')
 
 # =============================================================================
 # ORDER ITEM CRUD VIEWS
 # =============================================================================
 
-class OrderItemListCreateView(CRUDMixin, generics.ListCreateAPIView):
-    queryset = OrderItem.objects.all()
+class OrderItemListCreateView(IdempotentCreateMixin, StreamingExportMixin, CRUDMixin, generics.ListCreateAPIView):
+    queryset = OrderItem.objects.select_related('product')
     serializer_class = OrderItemSerializer
     pagination_class = StandardResultsSetPagination
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
@@ -401,7 +457,7 @@ class OrderItemListCreateView(CRUDMixin, generics.ListCreateAPIView):
         serializer.save()
 
 class OrderItemRetrieveUpdateDestroyView(CRUDMixin, generics.RetrieveUpdateDestroyAPIView):
-    queryset = OrderItem.objects.all()
+    queryset = OrderItem.objects.select_related('product')
     serializer_class = OrderItemSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -409,8 +465,8 @@ class OrderItemRetrieveUpdateDestroyView(CRUDMixin, generics.RetrieveUpdateDestr
 # PURCHASE ORDER CRUD VIEWS
 # =============================================================================
 
-class PurchaseOrderListCreateView(CRUDMixin, generics.ListCreateAPIView):
-    queryset = PurchaseOrder.objects.all()
+class PurchaseOrderListCreateView(IdempotentCreateMixin, StreamingExportMixin, CRUDMixin, generics.ListCreateAPIView):
+    queryset = PurchaseOrder.objects.select_related('supplier', 'created_by').prefetch_related('line_items__product')
     serializer_class = PurchaseOrderSerializer
     pagination_class = StandardResultsSetPagination
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
@@ -423,7 +479,7 @@ class PurchaseOrderListCreateView(CRUDMixin, generics.ListCreateAPIView):
         serializer.save(created_by=self.request.user)
 
 class PurchaseOrderRetrieveUpdateDestroyView(CRUDMixin, generics.RetrieveUpdateDestroyAPIView):
-    queryset = PurchaseOrder.objects.all()
+    queryset = PurchaseOrder.objects.select_related('supplier', 'created_by').prefetch_related('line_items__product')
     serializer_class = PurchaseOrderSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -431,8 +487,8 @@ class PurchaseOrderRetrieveUpdateDestroyView(CRUDMixin, generics.RetrieveUpdateD
 # SALES ORDER CRUD VIEWS
 # =============================================================================
 
-class SalesOrderListCreateView(CRUDMixin, generics.ListCreateAPIView):
-    queryset = SalesOrder.objects.all()
+class SalesOrderListCreateView(IdempotentCreateMixin, StreamingExportMixin, CRUDMixin, generics.ListCreateAPIView):
+    queryset = SalesOrder.objects.select_related('customer', 'created_by').prefetch_related('line_items__product')
     serializer_class = SalesOrderSerializer
     pagination_class = StandardResultsSetPagination
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
@@ -445,7 +501,7 @@ class SalesOrderListCreateView(CRUDMixin, generics.ListCreateAPIView):
         serializer.save(created_by=self.request.user)
 
 class SalesOrderRetrieveUpdateDestroyView(CRUDMixin, generics.RetrieveUpdateDestroyAPIView):
-    queryset = SalesOrder.objects.all()
+    queryset = SalesOrder.objects.select_related('customer', 'created_by').prefetch_related('line_items__product')
     serializer_class = SalesOrderSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -453,8 +509,8 @@ class SalesOrderRetrieveUpdateDestroyView(CRUDMixin, generics.RetrieveUpdateDest
 # CUSTOMER INVOICE CRUD VIEWS
 # =============================================================================
 
-class CustomerInvoiceListCreateView(CRUDMixin, generics.ListCreateAPIView):
-    queryset = CustomerInvoice.objects.all()
+class CustomerInvoiceListCreateView(IdempotentCreateMixin, StreamingExportMixin, CRUDMixin, generics.ListCreateAPIView):
+    queryset = CustomerInvoice.objects.select_related('customer', 'created_by').prefetch_related('line_items__product')
     serializer_class = CustomerInvoiceSerializer
     pagination_class = StandardResultsSetPagination
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
@@ -467,7 +523,7 @@ class CustomerInvoiceListCreateView(CRUDMixin, generics.ListCreateAPIView):
         serializer.save(created_by=self.request.user)
 
 class CustomerInvoiceRetrieveUpdateDestroyView(CRUDMixin, generics.RetrieveUpdateDestroyAPIView):
-    queryset = CustomerInvoice.objects.all()
+    queryset = CustomerInvoice.objects.select_related('customer', 'created_by').prefetch_related('line_items__product')
     serializer_class = CustomerInvoiceSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -475,20 +531,20 @@ class CustomerInvoiceRetrieveUpdateDestroyView(CRUDMixin, generics.RetrieveUpdat
 # STOCK MOVEMENT CRUD VIEWS
 # =============================================================================
 
-class StockMovementListCreateView(CRUDMixin, generics.ListCreateAPIView):
-    queryset = StockMovement.objects.all()
+class StockMovementListCreateView(IdempotentCreateMixin, StreamingExportMixin, CRUDMixin, generics.ListCreateAPIView):
+    queryset = StockMovement.objects.select_related('product', 'created_by')
     serializer_class = StockMovementSerializer
     pagination_class = StandardResultsSetPagination
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
-    filterset_fields = ['product', 'movement_type', 'reference_type']
-    ordering_fields = ['created_at', 'updated_at']
+    filterset_fields = ['company', 'product', 'movement_type', 'reference_type']
+    ordering_fields = ['created_at']
     permission_classes = [permissions.IsAuthenticated]
 
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
 
 class StockMovementRetrieveUpdateDestroyView(CRUDMixin, generics.RetrieveUpdateDestroyAPIView):
-    queryset = StockMovement.objects.all()
+    queryset = StockMovement.objects.select_related('product', 'created_by')
     serializer_class = StockMovementSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -496,7 +552,7 @@ class StockMovementRetrieveUpdateDestroyView(CRUDMixin, generics.RetrieveUpdateD
 # SALES REPORT CRUD VIEWS
 # =============================================================================
 
-class SalesReportListCreateView(CRUDMixin, generics.ListCreateAPIView):
+class SalesReportListCreateView(IdempotentCreateMixin, StreamingExportMixin, CRUDMixin, generics.ListCreateAPIView):
     queryset = SalesReport.objects.all()
     serializer_class = SalesReportSerializer
     pagination_class = StandardResultsSetPagination
@@ -517,20 +573,20 @@ class SalesReportRetrieveUpdateDestroyView(CRUDMixin, generics.RetrieveUpdateDes
 # PRODUCT ANALYTICS CRUD VIEWS
 # =============================================================================
 
-class ProductAnalyticsListCreateView(CRUDMixin, generics.ListCreateAPIView):
-    queryset = ProductAnalytics.objects.all()
+class ProductAnalyticsListCreateView(IdempotentCreateMixin, StreamingExportMixin, CRUDMixin, generics.ListCreateAPIView):
+    queryset = ProductAnalytics.objects.select_related('product')
     serializer_class = ProductAnalyticsSerializer
     pagination_class = StandardResultsSetPagination
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['product', 'is_active']
-    ordering_fields = ['last_updated', 'created_at']
+    ordering_fields = ['last_updated', 'total_views', 'total_sales']
     permission_classes = [permissions.IsAuthenticated]
 
     def perform_create(self, serializer):
         serializer.save()
 
 class ProductAnalyticsRetrieveUpdateDestroyView(CRUDMixin, generics.RetrieveUpdateDestroyAPIView):
-    queryset = ProductAnalytics.objects.all()
+    queryset = ProductAnalytics.objects.select_related('product')
     serializer_class = ProductAnalyticsSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -586,6 +642,19 @@ def bulk_delete(request, model_name):
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+# Models that bulk update refuses, with the reason
+BULK_UPDATE_EXCLUDED = {
+    'carts': 'Cart lines hold stock, update them through /api/cart/ or /api/cart/bulk/',
+}
+
+def keeps_derived_state(model):
+    """True when saving the model runs save() logic or signal handlers that update() would skip"""
+    return (
+        model.save is not models.Model.save
+        or pre_save.has_listeners(model)
+        or post_save.has_listeners(model)
+    )
+
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def bulk_update(request, model_name):
@@ -604,7 +673,6 @@ def bulk_update(request, model_name):
             'seller_profiles': SellerProfile,
             'seller_products': SellerProduct,
             'seller_invoices': SellerInvoice,
-            'carts': Cart,
             'orders': Order,
             'order_items': OrderItem,
             'purchase_orders': PurchaseOrder,
@@ -615,6 +683,8 @@ def bulk_update(request, model_name):
             'product_analytics': ProductAnalytics,
         }
         
+        if model_name in BULK_UPDATE_EXCLUDED:
+            return Response({'error': BULK_UPDATE_EXCLUDED[model_name]}, status=status.HTTP_400_BAD_REQUEST)
         if model_name not in model_map:
             return Response({'error': 'Invalid model name'}, status=status.HTTP_400_BAD_REQUEST)
         
@@ -625,7 +695,21 @@ def bulk_update(request, model_name):
         if not ids or not update_data:
             return Response({'error': 'No IDs or update data provided'}, status=status.HTTP_400_BAD_REQUEST)
         
-        updated_count = model.objects.filter(id__in=ids).update(**update_data)
+        if keeps_derived_state(model):
+            # Save row by row so stock balances, counters, leaderboards and the
+            # report cache follow the change
+            values = [(model._meta.get_field(name), value) for name, value in update_data.items()]
+            with transaction.atomic():
+                objects = list(model.objects.select_for_update().filter(id__in=ids))
+                for obj in objects:
+                    for field, value in values:
+                        setattr(obj, field.attname, field.to_python(value))
+                    obj.save()
+            updated_count = len(objects)
+        else:
+            updated_count = model.objects.filter(id__in=ids).update(**update_data)
+            # update() skips model signals, so drop cached reports explicitly
+            invalidate_reports()
         
         return Response({
             'message': f'Successfully updated {updated_count} records',
@@ -4,7 +4,8 @@ from .models import (
     SalesOrder, SalesOrderLineItem,
     VendorBill, VendorBillLineItem,
     CustomerInvoice, CustomerInvoiceLineItem,
-    StockMovement
+    StockMovement, StockBalance, StockSnapshot, StockReservation, IdempotencyRecord,
+    CheckoutIntent
 )
 
 class PurchaseOrderLineItemInline(admin.TabularInline):
@@ -60,4 +61,36 @@ class StockMovementAdmin(admin.ModelAdmin):
     list_display = ('product', 'movement_type', 'quantity', 'reference_type', 'created_at')
     list_filter = ('movement_type', 'company', 'created_at')
     search_fields = ('product__name', 'reference_type')
-    readonly_fields = ('created_at',)
\ No newline at end of file
+    readonly_fields = ('created_at',)
+
+@admin.register(StockBalance)
+class StockBalanceAdmin(admin.ModelAdmin):
+    list_display = ('product', 'company', 'on_hand', 'reserved', 'last_movement_at')
+    list_filter = ('company',)
+    search_fields = ('product__name', 'product__sku')
+    readonly_fields = ('updated_at',)
+
+@admin.register(StockSnapshot)
+class StockSnapshotAdmin(admin.ModelAdmin):
+    list_display = ('product', 'company', 'snapshot_date', 'on_hand')
+    list_filter = ('company', 'snapshot_date')
+    search_fields = ('product__name', 'product__sku')
+    readonly_fields = ('created_at',)
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ('product', 'cart', 'quantity', 'expires_at')
+    search_fields = ('product__name', 'product__sku')
+    readonly_fields = ('created_at', 'updated_at')
+
+@admin.register(IdempotencyRecord)
+class IdempotencyRecordAdmin(admin.ModelAdmin):
+    list_display = ('key', 'user', 'method', 'path', 'status_code', 'created_at')
+    search_fields = ('key', 'path')
+    readonly_fields = ('created_at',)
+
+@admin.register(CheckoutIntent)
+class CheckoutIntentAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'status', 'order', 'created_at', 'finished_at')
+    list_filter = ('status',)
+    readonly_fields = ('created_at', 'started_at', 'finished_at')
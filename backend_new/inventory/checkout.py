@@ -0,0 +1,277 @@
+"""
+Checkout
+
+build_order() prices and numbers an Order for a cart outside any transaction
+and save_orders() writes orders with their items and stock movements in one
+batch. The checkout view uses both for a single cart.
+
+With QUEUED_CHECKOUT on, checkout only records a CheckoutIntent and
+`manage.py process_checkouts` workers place the orders. Each worker claims a
+batch of intents, takes the stock of all their carts with one conditional
+UPDATE and writes the whole batch in one transaction, so concurrent
+checkouts stop contending on the same product rows and on the order number
+sequence. Intents that touch a product that is short are retried one at a
+time, oldest first. An intent left running longer than CHECKOUT_INTENT_TIMEOUT
+lost its worker, it is queued again until it has been claimed
+CHECKOUT_INTENT_MAX_ATTEMPTS times. A worker only writes the intents it still
+holds the claim on, so a slow worker that was presumed dead places nothing twice.
+"""
+
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+from functools import partial
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from reports.analytics import record_product_sale
+from .models import Cart, CheckoutIntent, Order, OrderItem, StockMovement, StockReservation
+from .pricing import price_cart, priced_carts
+from .reservations import convert_reservations, reservation_expiry
+from .stock import apply_movements
+
+
+def build_order(user, cart_items, shipping_address='', payment_method='cash_on_delivery', notes=''):
+    """
+    Priced and numbered, unsaved Order for priced cart lines, plus the line totals by cart line id
+    """
+    summary = price_cart(cart_items)
+    order = Order(
+        user=user,
+        shipping_address=shipping_address,
+        payment_method=payment_method,
+        notes=notes,
+        subtotal=summary['subtotal'],
+        tax_amount=summary['tax_amount'],
+        delivery_charge=summary['delivery_charge'],
+        total_amount=summary['total_amount'],
+    )
+    # Number the order before the transaction so a new block of order numbers
+    # is committed straight away instead of holding the sequence row lock
+    order.assign_number()
+    return order, {line['cart_id']: line['line_total'] for line in summary['items']}
+
+
+def save_orders(placements):
+    """
+    Save (order, cart_items, line_totals) placements built by build_order() in the
+    caller's transaction. Stock must already be taken, see convert_reservations().
+    """
+    for order, _, _ in placements:
+        order.save()
+
+    # bulk_create skips OrderItem.save(), so the line total is set here
+    OrderItem.objects.bulk_create([
+        OrderItem(
+            order=order,
+            product=cart_item.product,
+            quantity=cart_item.quantity,
+            unit_price=cart_item.product.unit_price,
+            total_price=line_totals[cart_item.pk],
+        )
+        for order, cart_items, line_totals in placements
+        for cart_item in cart_items
+    ])
+
+    # bulk_create skips StockMovement.save(), apply the batch to the balances once
+    movements = StockMovement.objects.bulk_create([
+        StockMovement(
+            company_id=cart_item.product.company_id,
+            product=cart_item.product,
+            movement_type='out',
+            quantity=cart_item.quantity,
+            reference_type='order',
+            reference_id=order.id,
+            notes=f'Stock out from Order {order.order_number}',
+            created_by_id=order.user_id,
+        )
+        for order, cart_items, _ in placements
+        for cart_item in cart_items
+    ])
+    apply_movements(movements)
+
+    # Clear the carts
+    Cart.objects.filter(pk__in=[cart_item.pk for _, cart_items, _ in placements for cart_item in cart_items]).delete()
+
+    for _, cart_items, line_totals in placements:
+        for cart_item in cart_items:
+            transaction.on_commit(partial(
+                record_product_sale, cart_item.product_id, cart_item.quantity, line_totals[cart_item.pk]
+            ))
+
+
+def enqueue_checkout(user, data):
+    """
+    Queue a checkout for the workers, a user with one still waiting gets that one back
+    """
+    intent = CheckoutIntent.objects.filter(user=user, status__in=['queued', 'running']).first()
+    if intent:
+        return intent
+    intent = CheckoutIntent.objects.create(
+        user=user,
+        shipping_address=data.get('shipping_address', ''),
+        payment_method=data.get('payment_method', 'cash_on_delivery'),
+        notes=data.get('notes', ''),
+    )
+    # Keep the cart's holds while the intent waits in the queue
+    StockReservation.objects.filter(cart__user=user).update(expires_at=reservation_expiry())
+    return intent
+
+
+def recover_stale_intents():
+    """
+    Queue running intents whose worker stopped again, or fail them after their last attempt
+    """
+    stale = CheckoutIntent.objects.filter(
+        status='running',
+        started_at__lt=timezone.now() - timedelta(seconds=getattr(settings, 'CHECKOUT_INTENT_TIMEOUT', 5 * 60)),
+    )
+    max_attempts = getattr(settings, 'CHECKOUT_INTENT_MAX_ATTEMPTS', 3)
+    failed = stale.filter(attempts__gte=max_attempts).update(
+        status='failed',
+        error=f'Timed out after {max_attempts} attempts',
+        finished_at=timezone.now(),
+    )
+    return stale.update(status='queued', claimed_by='', started_at=None) + failed
+
+
+def claim_intents(batch_size):
+    """
+    Atomically move the oldest queued intents to running, safe with many workers
+    """
+    recover_stale_intents()
+    candidates = list(
+        CheckoutIntent.objects.filter(status='queued').order_by('created_at').values_list('id', flat=True)[:batch_size]
+    )
+    if not candidates:
+        return []
+    token = uuid.uuid4().hex
+    CheckoutIntent.objects.filter(id__in=candidates, status='queued').update(
+        status='running',
+        claimed_by=token,
+        started_at=timezone.now(),
+        attempts=F('attempts') + 1
+    )
+    return list(CheckoutIntent.objects.filter(claimed_by=token).select_related('user').order_by('created_at'))
+
+
+def still_claimed(intents):
+    """
+    The intents this worker still holds the claim on, locked for the caller's
+    transaction. An intent whose worker was presumed dead may have been claimed
+    by another worker since.
+    """
+    if not intents:
+        return []
+    claimed = set(CheckoutIntent.objects.select_for_update().filter(
+        pk__in=[intent.pk for intent in intents], status='running', claimed_by=intents[0].claimed_by
+    ).values_list('pk', flat=True))
+    return [intent for intent in intents if intent.pk in claimed]
+
+
+def fail(intent, error):
+    intent.status = 'failed'
+    intent.error = error
+    intent.finished_at = timezone.now()
+
+
+def convert_batch(entries):
+    """
+    Take the stock of (intent, order, cart_items, line_totals) entries, all at once
+    when there is enough. Returns the entries whose stock was taken.
+    """
+    short = set(convert_reservations([cart_item for _, _, cart_items, _ in entries for cart_item in cart_items]))
+    if not short:
+        return entries
+
+    def touches_short(entry):
+        return any(cart_item.product_id in short for cart_item in entry[2])
+
+    grouped = [entry for entry in entries if not touches_short(entry)]
+    alone = [entry for entry in entries if touches_short(entry)]
+    if grouped and convert_reservations([cart_item for _, _, cart_items, _ in grouped for cart_item in cart_items]):
+        # Stock moved underneath, fall back to one at a time for the whole batch
+        grouped, alone = [], entries
+
+    converted = list(grouped)
+    for entry in alone:
+        intent, _, cart_items, _ = entry
+        short = convert_reservations(cart_items)
+        if short:
+            names = ', '.join(cart_item.product.name for cart_item in cart_items if cart_item.product_id in short)
+            fail(intent, f'Insufficient stock for {names}')
+        else:
+            converted.append(entry)
+    return converted
+
+
+def unplace(entry):
+    """
+    Undo in memory what a rolled back place_batch() did to an entry, the order keeps its number
+    """
+    intent, order, _, _ = entry
+    intent.status, intent.error, intent.order, intent.finished_at = 'running', '', None, None
+    order.pk = None
+    order._state.adding = True
+
+
+def place_batch(entries):
+    """
+    Turn the entries into orders in the caller's transaction, marking the placed intents completed
+    """
+    claimed = set(still_claimed([intent for intent, _, _, _ in entries]))
+    placed = convert_batch([entry for entry in entries if entry[0] in claimed])
+    save_orders([(order, cart_items, line_totals) for _, order, cart_items, line_totals in placed])
+    finished_at = timezone.now()
+    for intent, order, _, _ in placed:
+        intent.order = order
+        intent.status = 'completed'
+        intent.finished_at = finished_at
+    CheckoutIntent.objects.bulk_update(
+        [intent for intent, _, _, _ in placed], ['order', 'status', 'finished_at']
+    )
+
+
+def process_checkout_batch(batch_size=None):
+    """
+    Claim a batch of queued intents and place their orders, returns the processed intents
+    """
+    intents = claim_intents(batch_size or getattr(settings, 'CHECKOUT_QUEUE_BATCH_SIZE', 100))
+    if not intents:
+        return []
+
+    carts = defaultdict(list)
+    for cart_item in priced_carts({intent.user_id for intent in intents}):
+        carts[cart_item.user_id].append(cart_item)
+
+    entries = []
+    for intent in intents:
+        # A later intent of the same user finds the cart already taken
+        cart_items = carts.pop(intent.user_id, None)
+        if not cart_items:
+            fail(intent, 'Cart is empty')
+            continue
+        order, line_totals = build_order(
+            intent.user, cart_items, intent.shipping_address, intent.payment_method, intent.notes
+        )
+        entries.append((intent, order, cart_items, line_totals))
+
+    try:
+        with transaction.atomic():
+            place_batch(entries)
+    except Exception:
+        # Not a stock shortage, place the intents one by one so only the culprit fails
+        for entry in entries:
+            unplace(entry)
+            try:
+                with transaction.atomic():
+                    place_batch([entry])
+            except Exception as e:
+                unplace(entry)
+                fail(entry[0], str(e))
+
+    with transaction.atomic():
+        failed = still_claimed([intent for intent in intents if intent.status == 'failed'])
+        CheckoutIntent.objects.bulk_update(failed, ['status', 'error', 'finished_at'])
+    return intents
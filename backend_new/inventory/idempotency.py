@@ -0,0 +1,173 @@
+"""
+Idempotency-Key support for POST endpoints
+
+A POST sent with an Idempotency-Key header first claims the key with an
+IdempotencyRecord in a short transaction of its own, then runs the view
+outside it so the view's own transactions stay outermost (document numbers
+are only reserved in blocks outside a transaction, see masters.sequences).
+The response is stored on the claim once the view succeeded. A retry with
+the same key inside IDEMPOTENCY_KEY_RETENTION seconds gets the stored
+response back without running the view again, one sent while the first is
+still running gets a 409. Failed attempts give the key up so they can be
+retried with it, and a claim left unfinished for IDEMPOTENCY_CLAIM_TIMEOUT
+seconds by a process that died is given up as well.
+
+A claim is not renewed while its view runs, so IDEMPOTENCY_CLAIM_TIMEOUT has to
+be longer than the web server's worker / request timeout: a request still
+running past it could otherwise lose its key to a retry. A request that does
+outlive its claim leaves the retry's record alone when it finishes.
+"""
+
+import hashlib
+import json
+from datetime import timedelta
+from functools import wraps
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+from .models import IdempotencyRecord
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+
+
+def retention_cutoff(now=None):
+    retention = getattr(settings, 'IDEMPOTENCY_KEY_RETENTION', 24 * 60 * 60)
+    return (now or timezone.now()) - timedelta(seconds=retention)
+
+
+def claim_cutoff(now=None):
+    timeout = getattr(settings, 'IDEMPOTENCY_CLAIM_TIMEOUT', 15 * 60)
+    return (now or timezone.now()) - timedelta(seconds=timeout)
+
+
+def live_records():
+    """
+    Stored responses inside the retention window and claims still being worked on
+    """
+    now = timezone.now()
+    return (
+        Q(status_code__isnull=False, created_at__gte=retention_cutoff(now))
+        | Q(status_code__isnull=True, created_at__gte=claim_cutoff(now))
+    )
+
+
+def request_fingerprint(request):
+    data = request.data
+    if hasattr(data, 'lists'):
+        data = dict(data.lists())
+    payload = json.dumps(
+        {'method': request.method, 'path': request.path, 'data': data},
+        sort_keys=True,
+        # Uploaded files and other non-JSON values are hashed by their str()
+        default=str,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def replay(record, fingerprint):
+    if record.request_hash != fingerprint:
+        return Response({'error': f'{IDEMPOTENCY_HEADER} was already used for a different request'},
+                        status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+    if record.status_code is None:
+        return Response({'error': f'A request with this {IDEMPOTENCY_HEADER} is still in progress'},
+                        status=status.HTTP_409_CONFLICT)
+    response = Response(record.response_body, status=record.status_code)
+    response[REPLAYED_HEADER] = 'true'
+    return response
+
+
+def stored_record(user, key):
+    return IdempotencyRecord.objects.filter(live_records(), user=user, key=key).first()
+
+
+def run_idempotent(request, handler):
+    """
+    Run handler() once per (user, Idempotency-Key), replaying its response on retries
+    """
+    key = request.headers.get(IDEMPOTENCY_HEADER)
+    if not key or not request.user.is_authenticated:
+        return handler()
+    if len(key) > MAX_KEY_LENGTH:
+        return Response({'error': f'{IDEMPOTENCY_HEADER} must be at most {MAX_KEY_LENGTH} characters'},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    fingerprint = request_fingerprint(request)
+    record = stored_record(request.user, key)
+    if record:
+        return replay(record, fingerprint)
+
+    try:
+        with transaction.atomic():
+            # An expired response or an abandoned claim does not count
+            IdempotencyRecord.objects.filter(user=request.user, key=key).exclude(live_records()).delete()
+            record = IdempotencyRecord.objects.create(
+                user=request.user,
+                key=key,
+                method=request.method,
+                path=request.path[:255],
+                request_hash=fingerprint,
+            )
+    except IntegrityError:
+        # A concurrent request with the same key claimed it first
+        record = stored_record(request.user, key)
+        if record is None:
+            raise
+        return replay(record, fingerprint)
+
+    # Filtered on the pk, so a request that outlived its claim touches nothing
+    # when a retry has taken the key over since
+    claim = IdempotencyRecord.objects.filter(pk=record.pk, status_code__isnull=True)
+    try:
+        response = handler()
+    except Exception:
+        claim.delete()
+        raise
+    if not status.is_success(response.status_code):
+        claim.delete()
+        return response
+
+    claim.update(
+        status_code=response.status_code,
+        # Encoded the way the renderer does, so a replay matches the original body
+        response_body=json.loads(json.dumps(response.data, cls=JSONEncoder)),
+    )
+    return response
+
+
+def idempotent(view):
+    """
+    Decorator for @api_view functions, put it below @api_view
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        return run_idempotent(request, lambda: view(request, *args, **kwargs))
+    return wrapper
+
+
+class IdempotentCreateMixin:
+    """
+    Idempotency-Key support for the create side of list-create views
+    """
+
+    def create(self, request, *args, **kwargs):
+        return run_idempotent(request, lambda: super(IdempotentCreateMixin, self).create(request, *args, **kwargs))
+
+
+def purge_idempotency_records(batch_size=1000, now=None):
+    """
+    Delete records older than the retention window in batches, returns how many
+    """
+    cutoff = retention_cutoff(now)
+    purged = 0
+    while True:
+        batch = list(IdempotencyRecord.objects.filter(created_at__lt=cutoff).values_list('pk', flat=True)[:batch_size])
+        if not batch:
+            break
+        purged += IdempotencyRecord.objects.filter(pk__in=batch).delete()[0]
+    return purged
@@ -0,0 +1,42 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from inventory.checkout import process_checkout_batch
+
+
+class Command(BaseCommand):
+    help = 'Place queued checkouts (QUEUED_CHECKOUT), run several of these to scale out'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Drain the queue and exit instead of polling forever',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=1.0,
+            help='Seconds to wait between polls when the queue is empty',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=None,
+            help='Intents placed per transaction, defaults to CHECKOUT_QUEUE_BATCH_SIZE',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('Checkout worker started')
+        while True:
+            close_old_connections()
+            intents = process_checkout_batch(options['batch_size'])
+            if not intents:
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+                continue
+
+            completed = sum(1 for intent in intents if intent.status == 'completed')
+            style = self.style.SUCCESS if completed == len(intents) else self.style.WARNING
+            self.stdout.write(style(f'Placed {completed} of {len(intents)} checkouts'))
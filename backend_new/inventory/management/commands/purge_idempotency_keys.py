@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from inventory.idempotency import purge_idempotency_records
+
+
+class Command(BaseCommand):
+    help = 'Delete stored Idempotency-Key responses older than IDEMPOTENCY_KEY_RETENTION, run once a day'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Records deleted per query',
+        )
+
+    def handle(self, *args, **options):
+        count = purge_idempotency_records(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Purged {count} idempotency records'))
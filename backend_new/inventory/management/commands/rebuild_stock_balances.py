@@ -0,0 +1,107 @@
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max, Q, Sum
+from masters.models import Product
+from inventory.models import StockBalance, StockMovement, StockReservation
+from inventory.stock import sync_reorder_levels
+
+BALANCE_FIELDS = ['on_hand', 'reserved', 'total_in', 'total_out', 'total_adjustment', 'last_movement_at']
+
+
+class Command(BaseCommand):
+    help = 'Recompute StockBalance rows from the StockMovement log and the cart holds'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Only report balances that differ from the movement log, do not write',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of products to recompute per batch',
+        )
+
+    def handle(self, *args, **options):
+        verify = options['verify']
+        batch_size = options['batch_size']
+        product_ids = list(Product.objects.order_by('id').values_list('id', flat=True))
+        mismatched = 0
+
+        for start in range(0, len(product_ids), batch_size):
+            batch = product_ids[start:start + batch_size]
+            with transaction.atomic():
+                mismatched += self.process_batch(batch, verify)
+
+        if verify:
+            style = self.style.SUCCESS if not mismatched else self.style.WARNING
+            self.stdout.write(style(f'{mismatched} stock balances differ from the movement log'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt stock balances, {mismatched} rows corrected'))
+
+    def process_batch(self, product_ids, verify):
+        expected = {}
+        totals = StockMovement.objects.filter(product_id__in=product_ids).values(
+            'company_id', 'product_id'
+        ).annotate(
+            total_in=Sum('quantity', filter=Q(movement_type='in')),
+            total_out=Sum('quantity', filter=Q(movement_type='out')),
+            total_adjustment=Sum('quantity', filter=Q(movement_type='adjustment')),
+            last_movement_at=Max('created_at'),
+        )
+        for row in totals:
+            total_in = row['total_in'] or Decimal('0')
+            total_out = row['total_out'] or Decimal('0')
+            total_adjustment = row['total_adjustment'] or Decimal('0')
+            expected[(row['company_id'], row['product_id'])] = {
+                'on_hand': total_in - total_out + total_adjustment,
+                'reserved': Decimal('0'),
+                'total_in': total_in,
+                'total_out': total_out,
+                'total_adjustment': total_adjustment,
+                'last_movement_at': row['last_movement_at'],
+            }
+
+        # Holds count on the product's own company
+        held = StockReservation.objects.filter(product_id__in=product_ids).values(
+            'product_id', 'product__company_id'
+        ).annotate(total=Sum('quantity'))
+        for row in held:
+            values = expected.setdefault((row['product__company_id'], row['product_id']), {
+                **dict.fromkeys(BALANCE_FIELDS[:-1], Decimal('0')),
+                'last_movement_at': None,
+            })
+            values['reserved'] = Decimal(row['total'])
+
+        to_update = []
+        existing = StockBalance.objects.select_for_update().filter(product_id__in=product_ids)
+        for balance in existing:
+            values = expected.pop((balance.company_id, balance.product_id), None)
+            if values is None:
+                values = dict.fromkeys(BALANCE_FIELDS[:-1], Decimal('0'))
+                values['last_movement_at'] = None
+            if any(getattr(balance, field) != value for field, value in values.items()):
+                for field, value in values.items():
+                    setattr(balance, field, value)
+                to_update.append(balance)
+
+        # Whatever is left has movements or holds but no balance row yet
+        to_create = [
+            StockBalance(company_id=company_id, product_id=product_id, **values)
+            for (company_id, product_id), values in expected.items()
+        ]
+
+        if verify:
+            for balance in to_update:
+                self.stdout.write(f'Mismatch: company {balance.company_id} product {balance.product_id}')
+            for balance in to_create:
+                self.stdout.write(f'Missing: company {balance.company_id} product {balance.product_id}')
+        else:
+            StockBalance.objects.bulk_update(to_update, BALANCE_FIELDS)
+            StockBalance.objects.bulk_create(to_create)
+            sync_reorder_levels(product_ids)
+
+        return len(to_update) + len(to_create)
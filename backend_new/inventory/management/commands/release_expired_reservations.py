@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from inventory.reservations import release_expired_reservations
+
+
+class Command(BaseCommand):
+    help = 'Give the stock held by expired or orphaned cart reservations back, run every few minutes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Reservations released per transaction',
+        )
+
+    def handle(self, *args, **options):
+        count = release_expired_reservations(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Released {count} expired cart reservations'))
@@ -0,0 +1,46 @@
+from datetime import datetime, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from inventory.snapshots import take_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Write a stock snapshot checkpoint for a day or a month end'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--period',
+            choices=['daily', 'monthly'],
+            default='daily',
+            help='daily snapshots the given day, monthly snapshots the last day of its month',
+        )
+        parser.add_argument(
+            '--date',
+            help='Date in YYYY-MM-DD (defaults to yesterday for daily, last month for monthly)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Rows per insert batch',
+        )
+
+    def handle(self, *args, **options):
+        today = timezone.now().date()
+        if options['date']:
+            try:
+                snapshot_date = datetime.strptime(options['date'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('--date must be in YYYY-MM-DD format')
+        elif options['period'] == 'monthly':
+            snapshot_date = today.replace(day=1) - timedelta(days=1)
+        else:
+            snapshot_date = today - timedelta(days=1)
+
+        if options['period'] == 'monthly':
+            # Move to the last day of the month
+            next_month = (snapshot_date.replace(day=1) + timedelta(days=32)).replace(day=1)
+            snapshot_date = next_month - timedelta(days=1)
+
+        count = take_snapshot(snapshot_date, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Stock snapshot for {snapshot_date}: {count} products'))
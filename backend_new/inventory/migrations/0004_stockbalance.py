@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:45
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Max, Q, Sum
+
+
+def fill_stock_balances(apps, schema_editor):
+    StockBalance = apps.get_model('inventory', 'StockBalance')
+    StockMovement = apps.get_model('inventory', 'StockMovement')
+    totals = StockMovement.objects.values('company_id', 'product_id').annotate(
+        total_in=Sum('quantity', filter=Q(movement_type='in')),
+        total_out=Sum('quantity', filter=Q(movement_type='out')),
+        total_adjustment=Sum('quantity', filter=Q(movement_type='adjustment')),
+        last_movement_at=Max('created_at'),
+    ).order_by()
+    balances = []
+    for row in totals.iterator():
+        total_in = row['total_in'] or Decimal('0')
+        total_out = row['total_out'] or Decimal('0')
+        total_adjustment = row['total_adjustment'] or Decimal('0')
+        balances.append(StockBalance(
+            company_id=row['company_id'],
+            product_id=row['product_id'],
+            on_hand=total_in - total_out + total_adjustment,
+            total_in=total_in,
+            total_out=total_out,
+            total_adjustment=total_adjustment,
+            last_movement_at=row['last_movement_at'],
+        ))
+    StockBalance.objects.bulk_create(balances, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0003_customerinvoice_is_active_purchaseorder_is_active_and_more'),
+        ('masters', '0005_sellerinvoice_is_active_sellerproduct_is_active_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('on_hand', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('reserved', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total_in', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total_out', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total_adjustment', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('last_movement_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_balances', to='masters.company')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_balances', to='masters.product')),
+            ],
+            options={
+                'unique_together': {('company', 'product')},
+            },
+        ),
+        migrations.RunPython(fill_stock_balances, migrations.RunPython.noop),
+    ]
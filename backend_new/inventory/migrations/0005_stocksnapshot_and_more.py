@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:46
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0004_stockbalance'),
+        ('masters', '0005_sellerinvoice_is_active_sellerproduct_is_active_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('snapshot_date', models.DateField(db_index=True)),
+                ('on_hand', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total_in', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total_out', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total_adjustment', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['product', 'created_at'], name='inventory_s_product_5919a9_idx'),
+        ),
+        migrations.AddField(
+            model_name='stocksnapshot',
+            name='company',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_snapshots', to='masters.company'),
+        ),
+        migrations.AddField(
+            model_name='stocksnapshot',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_snapshots', to='masters.product'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='stocksnapshot',
+            unique_together={('company', 'product', 'snapshot_date')},
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0007_customerinvoice_inventory_c_created_677529_idx_and_more'),
+        ('masters', '0005_sellerinvoice_is_active_sellerproduct_is_active_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customerinvoice',
+            index=models.Index(fields=['created_by', 'status', 'due_date'], name='inventory_c_created_ed567a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vendorbill',
+            index=models.Index(fields=['created_by', 'status', 'due_date'], name='inventory_v_created_2f0d8f_idx'),
+        ),
+    ]
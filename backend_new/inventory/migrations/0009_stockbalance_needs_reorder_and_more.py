@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:57
+
+from django.db import migrations, models
+from django.db.models import BooleanField, ExpressionWrapper, F, OuterRef, Q, Subquery
+
+
+def fill_reorder_flags(apps, schema_editor):
+    Product = apps.get_model('masters', 'Product')
+    StockBalance = apps.get_model('inventory', 'StockBalance')
+    StockBalance.objects.update(reorder_level=Subquery(
+        Product.objects.filter(pk=OuterRef('product_id')).values('reorder_level')[:1]
+    ))
+    StockBalance.objects.update(needs_reorder=ExpressionWrapper(
+        Q(on_hand__lt=F('reserved') + F('reorder_level')), output_field=BooleanField()
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0008_customerinvoice_inventory_c_created_ed567a_idx_and_more'),
+        ('masters', '0006_product_reorder_level'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stockbalance',
+            name='needs_reorder',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='stockbalance',
+            name='reorder_level',
+            field=models.IntegerField(default=10),
+        ),
+        migrations.AddIndex(
+            model_name='stockbalance',
+            index=models.Index(condition=models.Q(('needs_reorder', True)), fields=['company', 'product'], name='stock_balance_reorder_idx'),
+        ),
+        migrations.RunPython(fill_reorder_flags, migrations.RunPython.noop),
+    ]
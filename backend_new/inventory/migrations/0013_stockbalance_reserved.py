@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:42
+
+from django.db import migrations
+from django.db.models import Sum
+
+
+def fill_reserved(apps, schema_editor):
+    """
+    Put the stock held by existing cart holds into StockBalance.reserved
+    """
+    StockBalance = apps.get_model('inventory', 'StockBalance')
+    held = apps.get_model('inventory', 'StockReservation').objects.values(
+        'product_id', 'product__company_id', 'product__reorder_level'
+    ).annotate(total=Sum('quantity'))
+    for row in held:
+        balance, _ = StockBalance.objects.get_or_create(
+            company_id=row['product__company_id'],
+            product_id=row['product_id'],
+            defaults={'reorder_level': row['product__reorder_level'] or 0},
+        )
+        balance.reserved = row['total']
+        balance.needs_reorder = balance.on_hand < balance.reserved + balance.reorder_level
+        balance.save(update_fields=['reserved', 'needs_reorder'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0012_checkoutintent'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_reserved, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:05
+
+from django.db import migrations
+from django.db.models import Case, DecimalField, F, Sum, Value, When
+
+
+def record_shelf_stock(apps, schema_editor):
+    """
+    Record the shelf stock the movement log never saw as adjustment movements,
+    so each product's own company has on_hand equal to its shelf plus held stock
+    """
+    Product = apps.get_model('masters', 'Product')
+    StockBalance = apps.get_model('inventory', 'StockBalance')
+    StockMovement = apps.get_model('inventory', 'StockMovement')
+    StockReservation = apps.get_model('inventory', 'StockReservation')
+
+    held = dict(
+        StockReservation.objects.values('product_id').annotate(total=Sum('quantity')).values_list('product_id', 'total')
+    )
+    on_hand = {
+        (company_id, product_id): total
+        for company_id, product_id, total in StockMovement.objects.values('company_id', 'product_id').annotate(
+            total=Sum(Case(
+                When(movement_type='out', then=-F('quantity')),
+                default=F('quantity'),
+                output_field=DecimalField(max_digits=14, decimal_places=2),
+            ))
+        ).values_list('company_id', 'product_id', 'total')
+    }
+
+    for product in Product.objects.all():
+        quantity = product.stock_quantity + held.get(product.pk, 0) - on_hand.get((product.company_id, product.pk), 0)
+        if not quantity:
+            continue
+        StockMovement.objects.create(
+            company_id=product.company_id,
+            product_id=product.pk,
+            movement_type='adjustment',
+            quantity=quantity,
+            reference_type='product',
+            reference_id=product.pk,
+            notes=f'Shelf stock of {product.name} set to {product.stock_quantity}',
+            created_by_id=product.created_by_id,
+        )
+        balance, _ = StockBalance.objects.get_or_create(
+            company_id=product.company_id,
+            product_id=product.pk,
+            defaults={'reorder_level': product.reorder_level or 0},
+        )
+        balance.on_hand += quantity
+        balance.total_adjustment += quantity
+        balance.needs_reorder = balance.on_hand < balance.reserved + balance.reorder_level
+        balance.save(update_fields=['on_hand', 'total_adjustment', 'needs_reorder'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0014_idempotencyrecord_in_progress'),
+        ('masters', '0007_documentsequence'),
+    ]
+
+    operations = [
+        migrations.RunPython(record_shelf_stock, migrations.RunPython.noop),
+    ]
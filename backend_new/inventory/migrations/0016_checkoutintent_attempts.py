@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0015_shelf_stock_movements'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='checkoutintent',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+    ]
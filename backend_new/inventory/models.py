@@ -1,6 +1,6 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth import get_user_model
-from masters.models import Company, Contact, Product, Tax
+from masters.models import Company, Contact, DocumentNumberMixin, Product, Tax
 
 User = get_user_model()
 
@@ -21,7 +21,23 @@ class Cart(models.Model):
     def total_price(self):
         return self.quantity * self.product.unit_price
 
-class Order(models.Model):
+class StockReservation(models.Model):
+    """
+    Shelf stock held for a cart line until expires_at. The quantity has already
+    been taken off Product.stock_quantity; see inventory.reservations.
+    """
+    # SET_NULL so a cart line deleted outside the cart views leaves an orphan for the sweeper
+    cart = models.OneToOneField(Cart, on_delete=models.SET_NULL, null=True, blank=True, related_name='reservation')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_reservations')
+    quantity = models.IntegerField()
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.product.name} - {self.quantity} held until {self.expires_at}"
+
+class Order(DocumentNumberMixin, models.Model):
     ORDER_STATUS_CHOICES = [
         ('pending', 'Pending'),
         ('confirmed', 'Confirmed'),
@@ -51,19 +67,18 @@ class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at']),
+            models.Index(fields=['updated_at']),
+        ]
+    
     def __str__(self):
         return f"Order {self.order_number} - {self.user.username}"
     
-    def save(self, *args, **kwargs):
-        if not self.order_number:
-            # Generate order number
-            last_order = Order.objects.order_by('-id').first()
-            if last_order:
-                last_number = int(last_order.order_number.split('-')[-1])
-                self.order_number = f"ORD-{last_number + 1:06d}"
-            else:
-                self.order_number = "ORD-000001"
-        super().save(*args, **kwargs)
+    number_field = 'order_number'
+    number_format = 'ORD-{number:06d}'
+    number_per_company = False
 
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
@@ -80,7 +95,7 @@ class OrderItem(models.Model):
     def __str__(self):
         return f"{self.product.name} - {self.quantity} x {self.unit_price}"
 
-class PurchaseOrder(models.Model):
+class PurchaseOrder(DocumentNumberMixin, models.Model):
     STATUS_CHOICES = [
         ('draft', 'Draft'),
         ('confirmed', 'Confirmed'),
@@ -106,16 +121,8 @@ class PurchaseOrder(models.Model):
     def __str__(self):
         return f"PO-{self.po_number} - {self.supplier.name}"
     
-    def save(self, *args, **kwargs):
-        if not self.po_number:
-            # Generate PO number
-            last_po = PurchaseOrder.objects.filter(company=self.company).order_by('-id').first()
-            if last_po:
-                last_number = int(last_po.po_number.split('-')[-1])
-                self.po_number = f"PO-{self.company.id:03d}-{last_number + 1:04d}"
-            else:
-                self.po_number = f"PO-{self.company.id:03d}-0001"
-        super().save(*args, **kwargs)
+    number_field = 'po_number'
+    number_format = 'PO-{company:03d}-{number:04d}'
 
 class PurchaseOrderLineItem(models.Model):
     purchase_order = models.ForeignKey(PurchaseOrder, on_delete=models.CASCADE, related_name='line_items')
@@ -133,7 +140,7 @@ class PurchaseOrderLineItem(models.Model):
     def __str__(self):
         return f"{self.product.name} - {self.quantity} x {self.unit_price}"
 
-class SalesOrder(models.Model):
+class SalesOrder(DocumentNumberMixin, models.Model):
     STATUS_CHOICES = [
         ('draft', 'Draft'),
         ('confirmed', 'Confirmed'),
@@ -159,16 +166,8 @@ class SalesOrder(models.Model):
     def __str__(self):
         return f"SO-{self.so_number} - {self.customer.name}"
     
-    def save(self, *args, **kwargs):
-        if not self.so_number:
-            # Generate SO number
-            last_so = SalesOrder.objects.filter(company=self.company).order_by('-id').first()
-            if last_so:
-                last_number = int(last_so.so_number.split('-')[-1])
-                self.so_number = f"SO-{self.company.id:03d}-{last_number + 1:04d}"
-            else:
-                self.so_number = f"SO-{self.company.id:03d}-0001"
-        super().save(*args, **kwargs)
+    number_field = 'so_number'
+    number_format = 'SO-{company:03d}-{number:04d}'
 
 class SalesOrderLineItem(models.Model):
     sales_order = models.ForeignKey(SalesOrder, on_delete=models.CASCADE, related_name='line_items')
@@ -186,7 +185,7 @@ class SalesOrderLineItem(models.Model):
     def __str__(self):
         return f"{self.product.name} - {self.quantity} x {self.unit_price}"
 
-class VendorBill(models.Model):
+class VendorBill(DocumentNumberMixin, models.Model):
     STATUS_CHOICES = [
         ('draft', 'Draft'),
         ('confirmed', 'Confirmed'),
@@ -209,19 +208,17 @@ class VendorBill(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_by', 'company', 'bill_date']),
+            models.Index(fields=['created_by', 'status', 'due_date']),
+        ]
+    
     def __str__(self):
         return f"BILL-{self.bill_number} - {self.supplier.name}"
     
-    def save(self, *args, **kwargs):
-        if not self.bill_number:
-            # Generate Bill number
-            last_bill = VendorBill.objects.filter(company=self.company).order_by('-id').first()
-            if last_bill:
-                last_number = int(last_bill.bill_number.split('-')[-1])
-                self.bill_number = f"BILL-{self.company.id:03d}-{last_number + 1:04d}"
-            else:
-                self.bill_number = f"BILL-{self.company.id:03d}-0001"
-        super().save(*args, **kwargs)
+    number_field = 'bill_number'
+    number_format = 'BILL-{company:03d}-{number:04d}'
 
 class VendorBillLineItem(models.Model):
     vendor_bill = models.ForeignKey(VendorBill, on_delete=models.CASCADE, related_name='line_items')
@@ -239,7 +236,7 @@ class VendorBillLineItem(models.Model):
     def __str__(self):
         return f"{self.product.name} - {self.quantity} x {self.unit_price}"
 
-class CustomerInvoice(models.Model):
+class CustomerInvoice(DocumentNumberMixin, models.Model):
     STATUS_CHOICES = [
         ('draft', 'Draft'),
         ('sent', 'Sent'),
@@ -264,19 +261,17 @@ class CustomerInvoice(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_by', 'company', 'invoice_date']),
+            models.Index(fields=['created_by', 'status', 'due_date']),
+        ]
+    
     def __str__(self):
         return f"INV-{self.invoice_number} - {self.customer.name}"
     
-    def save(self, *args, **kwargs):
-        if not self.invoice_number:
-            # Generate Invoice number
-            last_invoice = CustomerInvoice.objects.filter(company=self.company).order_by('-id').first()
-            if last_invoice:
-                last_number = int(last_invoice.invoice_number.split('-')[-1])
-                self.invoice_number = f"INV-{self.company.id:03d}-{last_number + 1:04d}"
-            else:
-                self.invoice_number = f"INV-{self.company.id:03d}-0001"
-        super().save(*args, **kwargs)
+    number_field = 'invoice_number'
+    number_format = 'INV-{company:03d}-{number:04d}'
 
 class CustomerInvoiceLineItem(models.Model):
     customer_invoice = models.ForeignKey(CustomerInvoice, on_delete=models.CASCADE, related_name='line_items')
@@ -311,5 +306,135 @@ class StockMovement(models.Model):
     created_by = models.ForeignKey(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['product', 'created_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.product.name} - {self.movement_type} - {self.quantity}"
+    
+    @property
+    def signed_quantity(self):
+        return -self.quantity if self.movement_type == 'out' else self.quantity
+    
+    def save(self, *args, **kwargs):
+        from .snapshots import invalidate_snapshots
+        from .stock import apply_movements
+        
+        # Keep the stock balance in step with the movement log
+        with transaction.atomic():
+            if self.pk:
+                previous = StockMovement.objects.filter(pk=self.pk).first()
+                if previous:
+                    apply_movements([previous], sign=-1)
+                    # Checkpoints taken since the movement was made include its old values
+                    invalidate_snapshots(previous.created_at)
+            super().save(*args, **kwargs)
+            apply_movements([self])
+
+class StockBalance(models.Model):
+    """
+    Running stock position per company and product, maintained from StockMovement
+    """
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='stock_balances')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_balances')
+    on_hand = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    reserved = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_in = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_out = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_adjustment = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    # Copied from the product so the reorder flag can be set in the same UPDATE
+    reorder_level = models.IntegerField(default=10)
+    needs_reorder = models.BooleanField(default=False)
+    last_movement_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ['company', 'product']
+        indexes = [
+            # Only the reorder worklist is indexed, it stays small however big the catalog is
+            models.Index(fields=['company', 'product'], condition=models.Q(needs_reorder=True),
+                         name='stock_balance_reorder_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.product.name} - {self.on_hand} on hand"
+    
+    @property
+    def available(self):
+        return self.on_hand - self.reserved
+
+class StockSnapshot(models.Model):
+    """
+    Stock position per company and product at the end of snapshot_date
+    """
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='stock_snapshots')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_snapshots')
+    snapshot_date = models.DateField(db_index=True)
+    on_hand = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_in = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_out = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_adjustment = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        unique_together = ['company', 'product', 'snapshot_date']
+    
+    def __str__(self):
+        return f"{self.product.name} - {self.snapshot_date} - {self.on_hand}"
+
+class IdempotencyRecord(models.Model):
+    """
+    Response of a POST made with an Idempotency-Key header, replayed when the
+    client retries with the same key. status_code is empty while the request
+    that claimed the key is still running. See inventory.idempotency.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idempotency_records')
+    key = models.CharField(max_length=255)
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    
+    class Meta:
+        unique_together = ['user', 'key']
+    
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.key})"
+
+class CheckoutIntent(models.Model):
+    """
+    A checkout queued for the process_checkouts workers, which turn it into an
+    Order. See inventory.checkout.
+    """
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='checkout_intents')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    shipping_address = models.TextField(blank=True)
+    payment_method = models.CharField(max_length=50, default='cash_on_delivery')
+    notes = models.TextField(blank=True, null=True)
+    order = models.OneToOneField(Order, on_delete=models.SET_NULL, null=True, blank=True, related_name='checkout_intent')
+    error = models.TextField(blank=True)
+    # Set by the worker that claimed the intent
+    claimed_by = models.CharField(max_length=32, blank=True, db_index=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+    
     def __str__(self):
-        return f"{self.product.name} - {self.movement_type} - {self.quantity}"
\ No newline at end of file
+        return f"Checkout #{self.id} - {self.user.username} ({self.status})"
@@ -0,0 +1,129 @@
+"""
+Cart pricing
+
+Cart lines are loaded with their product and tax in one query, with the line
+total (quantity x unit price) computed by the database. Tax is charged per
+rate on the summed line totals at that rate, so the breakdown adds up to the
+order's tax exactly. All money is Decimal, rounded half up to the cent.
+"""
+
+from collections import OrderedDict
+from decimal import ROUND_HALF_UP, Decimal
+from django.conf import settings
+from django.db.models import DecimalField, ExpressionWrapper, F
+from .models import Cart
+
+PRICE_FIELD = DecimalField(max_digits=14, decimal_places=2)
+CENT = Decimal('0.01')
+ZERO = Decimal('0.00')
+
+
+def money(value):
+    return Decimal(value).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def delivery_charge(subtotal):
+    """
+    Flat delivery charge, nothing to deliver for an empty cart
+    """
+    if not subtotal:
+        return ZERO
+    return money(getattr(settings, 'CART_DELIVERY_CHARGE', '50.00'))
+
+
+def priced(carts):
+    """
+    Cart queryset with product, tax and line_total loaded in the same query
+    """
+    return carts.select_related('product', 'product__tax').annotate(
+        line_total=ExpressionWrapper(F('quantity') * F('product__unit_price'), output_field=PRICE_FIELD),
+    )
+
+
+def priced_cart_items(user):
+    return priced(Cart.objects.filter(user=user)).order_by('id')
+
+
+def priced_carts(user_ids):
+    """
+    The cart lines of several users in one query, grouped by user
+    """
+    return priced(Cart.objects.filter(user_id__in=list(user_ids))).order_by('user_id', 'id')
+
+
+def line_tax(cart_item):
+    """
+    The tax that applies to a cart line, None when the product is untaxed
+    """
+    tax = cart_item.product.tax
+    if tax is None or not tax.is_active:
+        return None
+    return tax
+
+
+def price_cart(cart_items):
+    """
+    Line totals, per-tax breakdown, delivery charge and grand total for priced cart lines
+    """
+    lines = []
+    taxes = OrderedDict()
+    subtotal = ZERO
+    for cart_item in cart_items:
+        line_total = money(cart_item.line_total)
+        subtotal += line_total
+        tax = line_tax(cart_item)
+        lines.append({
+            'cart_id': cart_item.pk,
+            'product': cart_item.product_id,
+            'product_name': cart_item.product.name,
+            'quantity': cart_item.quantity,
+            'unit_price': cart_item.product.unit_price,
+            'line_total': line_total,
+            'tax_rate': tax.rate if tax else None,
+            'tax_type': tax.tax_type if tax else None,
+        })
+        if tax is None:
+            continue
+        # Taxes of different companies with the same rate share one line
+        bucket = taxes.setdefault((tax.tax_type, tax.rate), {
+            'name': tax.name,
+            'tax_type': tax.tax_type,
+            'rate': tax.rate,
+            'taxable_amount': ZERO,
+            'quantity': 0,
+        })
+        bucket['taxable_amount'] += line_total
+        bucket['quantity'] += cart_item.quantity
+
+    for bucket in taxes.values():
+        if bucket['tax_type'] == 'fixed':
+            # Fixed taxes are an amount per unit sold
+            bucket['tax_amount'] = money(bucket['rate'] * bucket['quantity'])
+        else:
+            bucket['tax_amount'] = money(bucket['taxable_amount'] * bucket['rate'] / 100)
+        del bucket['quantity']
+
+    tax_amount = sum((bucket['tax_amount'] for bucket in taxes.values()), ZERO)
+    delivery = delivery_charge(subtotal)
+    return {
+        'items': lines,
+        'taxes': list(taxes.values()),
+        'items_count': len(lines),
+        'subtotal': subtotal,
+        'tax_amount': tax_amount,
+        'delivery_charge': delivery,
+        'total_amount': subtotal + tax_amount + delivery,
+    }
+
+
+def summary_data(summary):
+    """
+    The pricing summary with money as strings, the way DRF renders DecimalFields
+    """
+    def as_strings(row):
+        return {key: str(value) if isinstance(value, Decimal) else value for key, value in row.items()}
+
+    data = as_strings({key: value for key, value in summary.items() if key not in ('items', 'taxes')})
+    data['items'] = [as_strings(line) for line in summary['items']]
+    data['taxes'] = [as_strings(bucket) for bucket in summary['taxes']]
+    return data
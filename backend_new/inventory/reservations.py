@@ -0,0 +1,219 @@
+"""
+Cart stock reservations
+
+Adding or changing a cart line takes its quantity off Product.stock_quantity
+with a conditional UPDATE and records the hold in a StockReservation that
+expires CART_RESERVATION_TTL seconds after the line was last touched. The
+release_expired_reservations command gives expired and orphaned holds back
+in batches. Checkout converts the cart's holds into the order and only takes
+stock from the product rows for lines whose hold was already released. Every
+hold change is mirrored in StockBalance.reserved.
+"""
+
+from collections import defaultdict
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from masters.models import Product
+from .models import StockReservation
+from .stock import adjust_reserved, return_shelf_stock, take_shelf_stock
+
+
+def reservation_expiry(now=None):
+    return (now or timezone.now()) + timedelta(seconds=getattr(settings, 'CART_RESERVATION_TTL', 15 * 60))
+
+
+def reserve_cart_line(cart_item):
+    """
+    Hold the cart line's quantity, topping up or giving back the difference on an
+    existing hold and extending it. Returns False, changing nothing, when stock is short.
+    """
+    with transaction.atomic():
+        reservation = StockReservation.objects.select_for_update().filter(cart=cart_item).first()
+        held = 0
+        reserved = defaultdict(int)
+        if reservation and reservation.product_id != cart_item.product_id:
+            # The line was switched to another product, give the old hold back
+            return_shelf_stock({reservation.product_id: reservation.quantity})
+            reserved[reservation.product_id] -= reservation.quantity
+        elif reservation:
+            held = reservation.quantity
+
+        needed = cart_item.quantity - held
+        if needed > 0 and take_shelf_stock({cart_item.product_id: needed}):
+            transaction.set_rollback(True)
+            return False
+        if needed < 0:
+            return_shelf_stock({cart_item.product_id: -needed})
+        reserved[cart_item.product_id] += needed
+        adjust_reserved(reserved)
+
+        if reservation:
+            reservation.product_id = cart_item.product_id
+            reservation.quantity = cart_item.quantity
+            reservation.expires_at = reservation_expiry()
+            reservation.save(update_fields=['product', 'quantity', 'expires_at', 'updated_at'])
+        else:
+            StockReservation.objects.create(
+                cart=cart_item,
+                product_id=cart_item.product_id,
+                quantity=cart_item.quantity,
+                expires_at=reservation_expiry(),
+            )
+    return True
+
+
+def reserve_cart_lines(cart_items):
+    """
+    reserve_cart_line() for many lines with a fixed number of queries. Returns
+    the ids of the products that are short, in which case nothing changes.
+    """
+    with transaction.atomic():
+        reservations = {
+            reservation.cart_id: reservation
+            for reservation in StockReservation.objects.select_for_update().filter(
+                cart__in=[cart_item.pk for cart_item in cart_items]
+            )
+        }
+        needed = defaultdict(int)
+        for cart_item in cart_items:
+            needed[cart_item.product_id] += cart_item.quantity
+            reservation = reservations.get(cart_item.pk)
+            if reservation:
+                needed[reservation.product_id] -= reservation.quantity
+
+        short = take_shelf_stock({product_id: quantity for product_id, quantity in needed.items() if quantity > 0})
+        if short:
+            return short
+        return_shelf_stock({product_id: -quantity for product_id, quantity in needed.items() if quantity < 0})
+        adjust_reserved(needed)
+
+        now = timezone.now()
+        expires_at = reservation_expiry(now)
+        created = []
+        for cart_item in cart_items:
+            reservation = reservations.get(cart_item.pk)
+            if reservation is None:
+                created.append(StockReservation(
+                    cart=cart_item,
+                    product_id=cart_item.product_id,
+                    quantity=cart_item.quantity,
+                    expires_at=expires_at,
+                ))
+                continue
+            reservation.product_id = cart_item.product_id
+            reservation.quantity = cart_item.quantity
+            reservation.expires_at = expires_at
+            # bulk_update does not touch auto_now fields
+            reservation.updated_at = now
+        if reservations:
+            StockReservation.objects.bulk_update(
+                list(reservations.values()), ['product', 'quantity', 'expires_at', 'updated_at']
+            )
+        StockReservation.objects.bulk_create(created)
+    return []
+
+
+def cart_stock(user, product_ids):
+    """
+    Map product id -> (name, quantity the user's cart can hold) for the active
+    products among product_ids, in one query. The user's own holds count as
+    available, they are already off the shelf.
+    """
+    held = StockReservation.objects.filter(cart__user=user, product=OuterRef('pk')).values('product').annotate(
+        total=Sum('quantity')
+    ).values('total')
+    products = Product.objects.filter(pk__in=list(product_ids), is_active=True).annotate(
+        held=Coalesce(Subquery(held), Value(0))
+    )
+    return {
+        pk: (name, stock_quantity + held)
+        for pk, name, stock_quantity, held in products.values_list('pk', 'name', 'stock_quantity', 'held')
+    }
+
+
+def release_reservations(reservations, skip_locked=False):
+    """
+    Give the stock held by a StockReservation queryset back and delete the holds
+    """
+    with transaction.atomic():
+        rows = list(reservations.select_for_update(skip_locked=skip_locked).values_list(
+            'pk', 'product_id', 'quantity'
+        ))
+        totals = defaultdict(int)
+        for _, product_id, quantity in rows:
+            totals[product_id] += quantity
+        return_shelf_stock(totals)
+        adjust_reserved({product_id: -quantity for product_id, quantity in totals.items()})
+        StockReservation.objects.filter(pk__in=[pk for pk, _, _ in rows]).delete()
+    return len(rows)
+
+
+def releasable(now):
+    # Orphans lost their cart line outside the cart views
+    return Q(expires_at__lt=now) | Q(cart__isnull=True)
+
+
+def release_expired_reservations(batch_size=500, now=None):
+    """
+    Release expired and orphaned holds in batches, returns how many were released
+    """
+    now = now or timezone.now()
+    released = 0
+    while True:
+        batch = list(StockReservation.objects.filter(releasable(now)).order_by('expires_at').values_list(
+            'pk', flat=True
+        )[:batch_size])
+        if not batch:
+            break
+        # The condition is checked again under the lock, a hold refreshed meanwhile is kept.
+        # Holds being refreshed right now are skipped rather than waited for.
+        count = release_reservations(
+            StockReservation.objects.filter(releasable(now), pk__in=batch), skip_locked=True
+        )
+        if not count:
+            break
+        released += count
+    return released
+
+
+def convert_reservations(cart_items):
+    """
+    Turn the cart's holds into stock taken for the order. Lines without a
+    matching hold take the missing quantity now. Returns the ids of the products
+    that are short, in which case nothing is converted.
+    """
+    with transaction.atomic():
+        reservations = StockReservation.objects.select_for_update().filter(
+            cart__in=[cart_item.pk for cart_item in cart_items]
+        )
+        held = defaultdict(int)
+        reservation_ids = []
+        for pk, product_id, quantity in reservations.values_list('pk', 'product_id', 'quantity'):
+            held[product_id] += quantity
+            reservation_ids.append(pk)
+
+        needed = defaultdict(int)
+        for cart_item in cart_items:
+            needed[cart_item.product_id] += cart_item.quantity
+
+        missing = {
+            product_id: quantity - held[product_id]
+            for product_id, quantity in needed.items() if quantity > held[product_id]
+        }
+        surplus = {
+            product_id: quantity - needed[product_id]
+            for product_id, quantity in held.items() if quantity > needed[product_id]
+        }
+
+        short = take_shelf_stock(missing)
+        if short:
+            return short
+        return_shelf_stock(surplus)
+        # The held stock leaves with the order's stock out movements
+        adjust_reserved({product_id: -quantity for product_id, quantity in held.items()})
+        StockReservation.objects.filter(pk__in=reservation_ids).delete()
+    return []
@@ -2,7 +2,7 @@ from rest_framework import serializers
 from .models import (
     Cart, Order, OrderItem, PurchaseOrder, PurchaseOrderLineItem,
     SalesOrder, SalesOrderLineItem, VendorBill, VendorBillLineItem,
-    CustomerInvoice, CustomerInvoiceLineItem, StockMovement
+    CustomerInvoice, CustomerInvoiceLineItem, StockMovement, CheckoutIntent
 )
 from masters.models import Product, Contact
 from users.models import User
@@ -11,17 +11,37 @@ class CartSerializer(serializers.ModelSerializer):
     product_name = serializers.CharField(source='product.name', read_only=True)
     product_price = serializers.DecimalField(source='product.unit_price', max_digits=12, decimal_places=2, read_only=True)
     total_price = serializers.SerializerMethodField()
+    reserved_until = serializers.SerializerMethodField()
     
     class Meta:
         model = Cart
         fields = [
             'id', 'user', 'product', 'product_name', 'product_price', 
-            'quantity', 'total_price', 'created_at', 'updated_at'
+            'quantity', 'total_price', 'reserved_until', 'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
     
     def get_total_price(self, obj):
         return obj.total_price
+    
+    def get_reserved_until(self, obj):
+        reservation = getattr(obj, 'reservation', None)
+        return reservation.expires_at if reservation else None
+
+class CartBulkItemSerializer(serializers.Serializer):
+    # Plain ids, the products are looked up for the whole batch at once
+    product = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1)
+
+class CartBulkSerializer(serializers.Serializer):
+    items = CartBulkItemSerializer(many=True, allow_empty=False)
+    
+    def validate_items(self, items):
+        # Repeated products are added up into one line
+        quantities = {}
+        for item in items:
+            quantities[item['product']] = quantities.get(item['product'], 0) + item['quantity']
+        return quantities
 
 class OrderItemSerializer(serializers.ModelSerializer):
     product_name = serializers.CharField(source='product.name', read_only=True)
@@ -32,9 +52,9 @@ class OrderItemSerializer(serializers.ModelSerializer):
         model = OrderItem
         fields = [
             'id', 'order', 'product', 'product_name', 'product_price',
-            'quantity', 'unit_price', 'total_price', 'created_at', 'updated_at'
+            'quantity', 'unit_price', 'total_price', 'created_at'
         ]
-        read_only_fields = ['id', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'created_at']
     
     def get_total_price(self, obj):
         return obj.total_price
@@ -42,7 +62,7 @@ class OrderItemSerializer(serializers.ModelSerializer):
 class OrderSerializer(serializers.ModelSerializer):
     user_name = serializers.CharField(source='user.username', read_only=True)
     user_email = serializers.CharField(source='user.email', read_only=True)
-    order_items = OrderItemSerializer(many=True, read_only=True)
+    order_items = OrderItemSerializer(source='items', many=True, read_only=True)
     items_count = serializers.SerializerMethodField()
     
     class Meta:
@@ -56,24 +76,20 @@ class OrderSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'order_number', 'created_at', 'updated_at']
     
     def get_items_count(self, obj):
-        return obj.order_items.count()
+        # len() so prefetched items are not counted with another query
+        return len(obj.items.all())
 
 class PurchaseOrderLineItemSerializer(serializers.ModelSerializer):
     product_name = serializers.CharField(source='product.name', read_only=True)
     product_sku = serializers.CharField(source='product.sku', read_only=True)
-    total_price = serializers.SerializerMethodField()
     
     class Meta:
         model = PurchaseOrderLineItem
         fields = [
             'id', 'purchase_order', 'product', 'product_name', 'product_sku',
-            'quantity', 'unit_price', 'total_price', 'received_quantity',
-            'created_at', 'updated_at'
+            'quantity', 'unit_price', 'line_total', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'created_at', 'updated_at']
-    
-    def get_total_price(self, obj):
-        return obj.total_price
+        read_only_fields = ['id', 'line_total', 'created_at', 'updated_at']
 
 class PurchaseOrderSerializer(serializers.ModelSerializer):
     supplier_name = serializers.CharField(source='supplier.name', read_only=True)
@@ -84,33 +100,29 @@ class PurchaseOrderSerializer(serializers.ModelSerializer):
     class Meta:
         model = PurchaseOrder
         fields = [
-            'id', 'po_number', 'supplier', 'supplier_name', 'order_date',
+            'id', 'po_number', 'company', 'supplier', 'supplier_name', 'po_date',
             'expected_delivery_date', 'status', 'subtotal', 'tax_amount',
-            'total_amount', 'notes', 'is_received', 'received_date',
+            'total_amount', 'notes', 'is_active',
             'created_by', 'created_by_name', 'line_items', 'items_count',
             'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'po_number', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'po_number', 'created_by', 'created_at', 'updated_at']
     
     def get_items_count(self, obj):
-        return obj.line_items.count()
+        # len() so prefetched line items are not counted with another query
+        return len(obj.line_items.all())
 
 class SalesOrderLineItemSerializer(serializers.ModelSerializer):
     product_name = serializers.CharField(source='product.name', read_only=True)
     product_sku = serializers.CharField(source='product.sku', read_only=True)
-    total_price = serializers.SerializerMethodField()
     
     class Meta:
         model = SalesOrderLineItem
         fields = [
             'id', 'sales_order', 'product', 'product_name', 'product_sku',
-            'quantity', 'unit_price', 'total_price', 'delivered_quantity',
-            'created_at', 'updated_at'
+            'quantity', 'unit_price', 'line_total', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'created_at', 'updated_at']
-    
-    def get_total_price(self, obj):
-        return obj.total_price
+        read_only_fields = ['id', 'line_total', 'created_at', 'updated_at']
 
 class SalesOrderSerializer(serializers.ModelSerializer):
     customer_name = serializers.CharField(source='customer.name', read_only=True)
@@ -121,32 +133,28 @@ class SalesOrderSerializer(serializers.ModelSerializer):
     class Meta:
         model = SalesOrder
         fields = [
-            'id', 'so_number', 'customer', 'customer_name', 'order_date',
+            'id', 'so_number', 'company', 'customer', 'customer_name', 'so_date',
             'expected_delivery_date', 'status', 'subtotal', 'tax_amount',
-            'total_amount', 'notes', 'is_delivered', 'delivered_date',
+            'total_amount', 'notes', 'is_active',
             'created_by', 'created_by_name', 'line_items', 'items_count',
             'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'so_number', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'so_number', 'created_by', 'created_at', 'updated_at']
     
     def get_items_count(self, obj):
-        return obj.line_items.count()
+        return len(obj.line_items.all())
 
 class CustomerInvoiceLineItemSerializer(serializers.ModelSerializer):
     product_name = serializers.CharField(source='product.name', read_only=True)
     product_sku = serializers.CharField(source='product.sku', read_only=True)
-    total_price = serializers.SerializerMethodField()
     
     class Meta:
         model = CustomerInvoiceLineItem
         fields = [
-            'id', 'invoice', 'product', 'product_name', 'product_sku',
-            'quantity', 'unit_price', 'total_price', 'created_at', 'updated_at'
+            'id', 'customer_invoice', 'product', 'product_name', 'product_sku',
+            'quantity', 'unit_price', 'line_total', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'created_at', 'updated_at']
-    
-    def get_total_price(self, obj):
-        return obj.total_price
+        read_only_fields = ['id', 'line_total', 'created_at', 'updated_at']
 
 class CustomerInvoiceSerializer(serializers.ModelSerializer):
     customer_name = serializers.CharField(source='customer.name', read_only=True)
@@ -157,35 +165,31 @@ class CustomerInvoiceSerializer(serializers.ModelSerializer):
     class Meta:
         model = CustomerInvoice
         fields = [
-            'id', 'invoice_number', 'customer', 'customer_name', 'invoice_date',
-            'due_date', 'status', 'subtotal', 'tax_amount', 'total_amount',
-            'notes', 'is_paid', 'paid_date', 'payment_method',
+            'id', 'invoice_number', 'company', 'customer', 'customer_name', 'sales_order',
+            'invoice_date', 'due_date', 'status', 'subtotal', 'tax_amount', 'total_amount',
+            'notes', 'is_active',
             'created_by', 'created_by_name', 'line_items', 'items_count',
             'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'invoice_number', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'invoice_number', 'created_by', 'created_at', 'updated_at']
     
     def get_items_count(self, obj):
-        return obj.line_items.count()
+        return len(obj.line_items.all())
 
 class VendorBillLineItemSerializer(serializers.ModelSerializer):
     product_name = serializers.CharField(source='product.name', read_only=True)
     product_sku = serializers.CharField(source='product.sku', read_only=True)
-    total_price = serializers.SerializerMethodField()
     
     class Meta:
         model = VendorBillLineItem
         fields = [
             'id', 'vendor_bill', 'product', 'product_name', 'product_sku',
-            'quantity', 'unit_price', 'total_price', 'created_at', 'updated_at'
+            'quantity', 'unit_price', 'line_total', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'created_at', 'updated_at']
-    
-    def get_total_price(self, obj):
-        return obj.total_price
+        read_only_fields = ['id', 'line_total', 'created_at', 'updated_at']
 
 class VendorBillSerializer(serializers.ModelSerializer):
-    vendor_name = serializers.CharField(source='vendor.name', read_only=True)
+    supplier_name = serializers.CharField(source='supplier.name', read_only=True)
     created_by_name = serializers.CharField(source='created_by.username', read_only=True)
     line_items = VendorBillLineItemSerializer(many=True, read_only=True)
     items_count = serializers.SerializerMethodField()
@@ -193,16 +197,16 @@ class VendorBillSerializer(serializers.ModelSerializer):
     class Meta:
         model = VendorBill
         fields = [
-            'id', 'bill_number', 'vendor', 'vendor_name', 'bill_date',
-            'due_date', 'status', 'subtotal', 'tax_amount', 'total_amount',
-            'notes', 'is_paid', 'paid_date', 'payment_method',
+            'id', 'bill_number', 'company', 'supplier', 'supplier_name', 'purchase_order',
+            'bill_date', 'due_date', 'status', 'subtotal', 'tax_amount', 'total_amount',
+            'notes',
             'created_by', 'created_by_name', 'line_items', 'items_count',
             'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'bill_number', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'bill_number', 'created_by', 'created_at', 'updated_at']
     
     def get_items_count(self, obj):
-        return obj.line_items.count()
+        return len(obj.line_items.all())
 
 class StockMovementSerializer(serializers.ModelSerializer):
     product_name = serializers.CharField(source='product.name', read_only=True)
@@ -212,8 +216,19 @@ class StockMovementSerializer(serializers.ModelSerializer):
     class Meta:
         model = StockMovement
         fields = [
-            'id', 'product', 'product_name', 'product_sku', 'movement_type',
+            'id', 'company', 'product', 'product_name', 'product_sku', 'movement_type',
             'quantity', 'reference_type', 'reference_id', 'notes',
-            'created_by', 'created_by_name', 'created_at', 'updated_at'
+            'created_by', 'created_by_name', 'created_at'
+        ]
+        read_only_fields = ['id', 'created_by', 'created_at']
+
+class CheckoutIntentSerializer(serializers.ModelSerializer):
+    order = OrderSerializer(read_only=True)
+    
+    class Meta:
+        model = CheckoutIntent
+        fields = [
+            'id', 'status', 'shipping_address', 'payment_method', 'notes',
+            'order', 'error', 'attempts', 'created_at', 'started_at', 'finished_at'
         ]
-        read_only_fields = ['id', 'created_at', 'updated_at']
\ No newline at end of file
+        read_only_fields = fields
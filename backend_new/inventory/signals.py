@@ -0,0 +1,40 @@
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from masters.models import Product
+from .models import StockBalance, StockMovement
+from .snapshots import invalidate_snapshots
+from .stock import apply_movements, record_shelf_adjustment, refresh_reorder_flags
+
+
+@receiver(post_delete, sender=StockMovement)
+def reverse_deleted_movement(sender, instance, **kwargs):
+    # Covers single deletes as well as queryset.delete() from the bulk endpoints
+    apply_movements([instance], sign=-1)
+    invalidate_snapshots(instance.created_at)
+
+
+@receiver(post_save, sender=Product)
+def sync_reorder_level(sender, instance, **kwargs):
+    # Only touches balances when the product's reorder level actually changed
+    balances = StockBalance.objects.filter(product=instance).exclude(reorder_level=instance.reorder_level)
+    if balances.update(reorder_level=instance.reorder_level):
+        refresh_reorder_flags(StockBalance.objects.filter(product=instance))
+
+
+@receiver(post_init, sender=Product)
+def remember_shelf_stock(sender, instance, **kwargs):
+    # Read from __dict__ so a product loaded without the field is not fetched again
+    instance._saved_stock_quantity = instance.__dict__.get('stock_quantity')
+
+
+@receiver(post_save, sender=Product)
+def record_shelf_stock(sender, instance, created, update_fields=None, **kwargs):
+    # Checkout and cart holds move the shelf with update() and never come through here
+    if update_fields is not None and 'stock_quantity' not in update_fields:
+        return
+    saved = 0 if created else instance._saved_stock_quantity
+    current = instance.__dict__.get('stock_quantity')
+    if saved is None or current is None:
+        return
+    record_shelf_adjustment(instance, current - saved)
+    instance._saved_stock_quantity = current
@@ -0,0 +1,94 @@
+"""
+Stock snapshot checkpoints
+
+A snapshot stores every product's stock position at the end of a day. New
+snapshots are built from the previous checkpoint plus the movements since,
+so each run only reads one period of the movement log. Editing or deleting a
+movement drops the checkpoints that include it, see invalidate_snapshots().
+"""
+
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Max, Q, Sum
+from django.utils import timezone
+from .models import StockMovement, StockSnapshot
+
+SNAPSHOT_FIELDS = ['on_hand', 'total_in', 'total_out', 'total_adjustment']
+
+
+def day_end(day):
+    """
+    First instant after the given date, movements before it belong to that day
+    """
+    return timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min))
+
+
+def latest_checkpoint(on_or_before):
+    return StockSnapshot.objects.filter(
+        snapshot_date__lte=on_or_before
+    ).aggregate(latest=Max('snapshot_date'))['latest']
+
+
+def movement_totals(movements):
+    """
+    Group movements by (company, product) into in / out / adjustment sums
+    """
+    return movements.values('company_id', 'product_id').annotate(
+        total_in=Sum('quantity', filter=Q(movement_type='in')),
+        total_out=Sum('quantity', filter=Q(movement_type='out')),
+        total_adjustment=Sum('quantity', filter=Q(movement_type='adjustment')),
+    )
+
+
+def invalidate_snapshots(moved_at):
+    """
+    Drop the checkpoints on or after the day of a movement that was edited or
+    deleted. Reports fall back to the last checkpoint before it until
+    take_stock_snapshots writes them again.
+    """
+    return StockSnapshot.objects.filter(snapshot_date__gte=timezone.localdate(moved_at)).delete()[0]
+
+
+def take_snapshot(snapshot_date, batch_size=1000):
+    """
+    Write (or rewrite) the checkpoint for snapshot_date and return the row count
+    """
+    previous = latest_checkpoint(snapshot_date - timedelta(days=1))
+    positions = {}
+
+    movements = StockMovement.objects.filter(created_at__lt=day_end(snapshot_date))
+    if previous:
+        rows = StockSnapshot.objects.filter(snapshot_date=previous).values(
+            'company_id', 'product_id', *SNAPSHOT_FIELDS
+        )
+        for row in rows.iterator(chunk_size=batch_size):
+            positions[(row['company_id'], row['product_id'])] = {
+                field: row[field] for field in SNAPSHOT_FIELDS
+            }
+        movements = movements.filter(created_at__gte=day_end(previous))
+
+    for row in movement_totals(movements):
+        position = positions.setdefault(
+            (row['company_id'], row['product_id']),
+            dict.fromkeys(SNAPSHOT_FIELDS, Decimal('0'))
+        )
+        total_in = row['total_in'] or Decimal('0')
+        total_out = row['total_out'] or Decimal('0')
+        total_adjustment = row['total_adjustment'] or Decimal('0')
+        position['total_in'] += total_in
+        position['total_out'] += total_out
+        position['total_adjustment'] += total_adjustment
+        position['on_hand'] += total_in - total_out + total_adjustment
+
+    with transaction.atomic():
+        StockSnapshot.objects.filter(snapshot_date=snapshot_date).delete()
+        StockSnapshot.objects.bulk_create(
+            [
+                StockSnapshot(company_id=company_id, product_id=product_id, snapshot_date=snapshot_date, **values)
+                for (company_id, product_id), values in positions.items()
+            ],
+            batch_size=batch_size,
+        )
+
+    return len(positions)
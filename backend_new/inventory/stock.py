@@ -0,0 +1,289 @@
+"""
+Stock balance maintenance
+
+Every StockMovement insert, update or delete is folded into StockBalance with
+F() increments inside the caller's transaction, so stock reads never have to
+rescan the movement log. Cart holds (see inventory.reservations) are kept in
+StockBalance.reserved the same way.
+
+Product.stock_quantity, the shelf stock checkout sells from, is set outside the
+movement log when a product is created or edited. Those changes are recorded as
+adjustment movements on the product's company, so that company's on_hand is
+always the shelf stock plus the held stock.
+
+The shelf and reservation writers here use update(), which sends no model
+signals, so they drop the cached reports themselves.
+"""
+
+from collections import defaultdict
+from decimal import Decimal
+from django.db import IntegrityError, transaction
+from django.db.models import (
+    BooleanField, Case, DecimalField, ExpressionWrapper, F, IntegerField, OuterRef, Q, Subquery, Value, When
+)
+from django.utils import timezone
+from masters.models import Product
+from reports.cache import invalidate_reports
+from .models import StockBalance, StockMovement
+
+TOTAL_FIELDS = {
+    'in': 'total_in',
+    'out': 'total_out',
+    'adjustment': 'total_adjustment',
+}
+
+DELTA_FIELDS = ['on_hand', *TOTAL_FIELDS.values()]
+
+QUANTITY_FIELD = DecimalField(max_digits=14, decimal_places=2)
+
+
+def reorder_flag():
+    """
+    True when available stock (on hand less reserved) is below the reorder level
+    """
+    return ExpressionWrapper(Q(on_hand__lt=F('reserved') + F('reorder_level')), output_field=BooleanField())
+
+
+def refresh_reorder_flags(balances):
+    """
+    Recompute needs_reorder for a StockBalance queryset in one UPDATE
+    """
+    return balances.update(needs_reorder=reorder_flag())
+
+
+def sync_reorder_levels(product_ids):
+    """
+    Copy the products' reorder levels onto their balances and refresh the flags
+    """
+    balances = StockBalance.objects.filter(product_id__in=product_ids)
+    balances.update(reorder_level=Subquery(
+        Product.objects.filter(pk=OuterRef('product_id')).values('reorder_level')[:1]
+    ))
+    refresh_reorder_flags(balances)
+
+
+def adjust_reserved(quantities):
+    """
+    Add {product_id: quantity} to the reserved stock of the products' balances
+    and refresh their reorder flags in the same UPDATE, negative quantities
+    release. A product without a balance row yet gets one.
+    """
+    quantities = {product_id: quantity for product_id, quantity in quantities.items() if quantity}
+    if not quantities:
+        return
+    invalidate_reports()
+    delta = Case(
+        *[When(product_id=product_id, then=Value(Decimal(quantity))) for product_id, quantity in quantities.items()],
+        default=Value(Decimal('0')),
+        output_field=QUANTITY_FIELD,
+    )
+    # Holds are on the product's own company, like its shelf stock
+    balances = StockBalance.objects.filter(product_id__in=list(quantities), company_id=F('product__company_id'))
+    updates = {
+        'reserved': F('reserved') + delta,
+        'needs_reorder': ExpressionWrapper(
+            Q(on_hand__lt=F('reserved') + delta + F('reorder_level')), output_field=BooleanField()
+        ),
+        'updated_at': timezone.now(),
+    }
+
+    if balances.update(**updates) == len(quantities):
+        return
+
+    existing = set(balances.values_list('product_id', flat=True))
+    products = Product.objects.filter(
+        pk__in=[product_id for product_id, quantity in quantities.items() if product_id not in existing and quantity > 0]
+    ).values_list('pk', 'company_id', 'reorder_level')
+    try:
+        with transaction.atomic():
+            StockBalance.objects.bulk_create([
+                StockBalance(
+                    company_id=company_id,
+                    product_id=product_id,
+                    reserved=quantities[product_id],
+                    reorder_level=reorder_level or 0,
+                    needs_reorder=0 < quantities[product_id] + (reorder_level or 0),
+                )
+                for product_id, company_id, reorder_level in products
+            ])
+    except IntegrityError:
+        # Another transaction created some of the rows first, add to them instead
+        balances.exclude(product_id__in=existing).update(**updates)
+
+
+def _movement_deltas(movements, sign):
+    deltas = defaultdict(lambda: {
+        'on_hand': Decimal('0'),
+        'total_in': Decimal('0'),
+        'total_out': Decimal('0'),
+        'total_adjustment': Decimal('0'),
+    })
+    last_movement = {}
+
+    for movement in movements:
+        key = (movement.company_id, movement.product_id)
+        quantity = Decimal(movement.quantity)
+        delta = deltas[key]
+        delta['on_hand'] += (-quantity if movement.movement_type == 'out' else quantity) * sign
+        delta[TOTAL_FIELDS[movement.movement_type]] += quantity * sign
+
+        created_at = movement.created_at or timezone.now()
+        if sign > 0 and (key not in last_movement or created_at > last_movement[key]):
+            last_movement[key] = created_at
+
+    return deltas, last_movement
+
+
+def _apply_one(company_id, product_id, delta, last_movement_at, now):
+    updates = {field: F(field) + value for field, value in delta.items() if value}
+    updates['updated_at'] = now
+    if last_movement_at:
+        updates['last_movement_at'] = last_movement_at
+
+    balances = StockBalance.objects.filter(company_id=company_id, product_id=product_id)
+    if balances.update(**updates):
+        return
+
+    try:
+        with transaction.atomic():
+            StockBalance.objects.create(
+                company_id=company_id,
+                product_id=product_id,
+                reorder_level=Product.objects.filter(pk=product_id).values_list(
+                    'reorder_level', flat=True
+                ).first() or 0,
+                last_movement_at=last_movement_at,
+                **delta
+            )
+    except IntegrityError:
+        # Another transaction created the row first, fall back to the increment
+        balances.update(**updates)
+
+
+def _apply_many(deltas, last_movement, now):
+    """
+    Apply the deltas of several balances with one UPDATE and one INSERT
+    """
+    product_ids = {product_id for _, product_id in deltas}
+    existing = {
+        (company_id, product_id): pk
+        for pk, company_id, product_id in StockBalance.objects.filter(
+            company_id__in={company_id for company_id, _ in deltas},
+            product_id__in=product_ids,
+        ).values_list('pk', 'company_id', 'product_id')
+        if (company_id, product_id) in deltas
+    }
+
+    if existing:
+        updates = {'updated_at': now}
+        for field in DELTA_FIELDS:
+            whens = [When(pk=pk, then=Value(deltas[key][field])) for key, pk in existing.items() if deltas[key][field]]
+            if whens:
+                updates[field] = F(field) + Case(*whens, default=Value(Decimal('0')), output_field=QUANTITY_FIELD)
+        whens = [When(pk=pk, then=Value(last_movement[key])) for key, pk in existing.items() if key in last_movement]
+        if whens:
+            updates['last_movement_at'] = Case(*whens, default=F('last_movement_at'))
+        StockBalance.objects.filter(pk__in=existing.values()).update(**updates)
+
+    missing = [key for key in deltas if key not in existing]
+    if not missing:
+        return
+    reorder_levels = dict(Product.objects.filter(pk__in=product_ids).values_list('pk', 'reorder_level'))
+    try:
+        with transaction.atomic():
+            StockBalance.objects.bulk_create([
+                StockBalance(
+                    company_id=company_id,
+                    product_id=product_id,
+                    reorder_level=reorder_levels.get(product_id) or 0,
+                    last_movement_at=last_movement.get((company_id, product_id)),
+                    **deltas[(company_id, product_id)]
+                )
+                for company_id, product_id in missing
+            ])
+    except IntegrityError:
+        # Another transaction created some of the rows first, apply them one by one
+        for company_id, product_id in missing:
+            _apply_one(company_id, product_id, deltas[(company_id, product_id)],
+                       last_movement.get((company_id, product_id)), now)
+
+
+def apply_movements(movements, sign=1):
+    """
+    Apply (sign=1) or reverse (sign=-1) a batch of movements on StockBalance
+    """
+    deltas, last_movement = _movement_deltas(movements, sign)
+    now = timezone.now()
+
+    with transaction.atomic():
+        if len(deltas) == 1:
+            (company_id, product_id), delta = next(iter(deltas.items()))
+            _apply_one(company_id, product_id, delta, last_movement.get((company_id, product_id)), now)
+        elif deltas:
+            _apply_many(deltas, last_movement, now)
+        
+        if deltas:
+            refresh_reorder_flags(StockBalance.objects.filter(
+                product_id__in={product_id for _, product_id in deltas}
+            ))
+
+
+def per_product(quantities):
+    """
+    CASE expression picking each product's value out of {product_id: quantity}
+    """
+    return Case(
+        *[When(pk=product_id, then=Value(quantity)) for product_id, quantity in quantities.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def take_shelf_stock(quantities):
+    """
+    Take {product_id: quantity} off Product.stock_quantity with one conditional
+    UPDATE. Returns the ids of the products that are short, in which case
+    nothing is taken.
+    """
+    if not quantities:
+        return []
+    requested = per_product(quantities)
+    products = Product.objects.filter(pk__in=list(quantities))
+    with transaction.atomic():
+        taken = products.filter(stock_quantity__gte=requested).update(stock_quantity=F('stock_quantity') - requested)
+        if taken == len(quantities):
+            invalidate_reports()
+            return []
+        # The products that had enough were decremented, undo them
+        transaction.set_rollback(True)
+    enough = set(products.filter(stock_quantity__gte=requested).values_list('pk', flat=True))
+    return [product_id for product_id in quantities if product_id not in enough]
+
+
+def return_shelf_stock(quantities):
+    """
+    Put {product_id: quantity} back on Product.stock_quantity with one UPDATE
+    """
+    if quantities:
+        Product.objects.filter(pk__in=list(quantities)).update(
+            stock_quantity=F('stock_quantity') + per_product(quantities)
+        )
+        invalidate_reports()
+
+
+def record_shelf_adjustment(product, quantity):
+    """
+    Record a change of a product's shelf stock made outside checkout and cart
+    holds as an adjustment movement on the product's company
+    """
+    if quantity:
+        StockMovement.objects.create(
+            company_id=product.company_id,
+            product=product,
+            movement_type='adjustment',
+            quantity=quantity,
+            reference_type='product',
+            reference_id=product.pk,
+            notes=f'Shelf stock of {product.name} set to {product.stock_quantity}',
+            created_by_id=product.created_by_id,
+        )
@@ -1,3 +1,568 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from users.models import User
+from masters.models import Category, Company, DocumentSequence, Product, Tax
+from masters.sequences import block_allocator
+from reports.analytics import analytics_buffer
+from reports.stock import stock_queryset
+from . import checkout as checkout_module
+from .checkout import build_order, claim_intents, place_batch, process_checkout_batch
+from .models import Cart, CheckoutIntent, IdempotencyRecord, Order, StockBalance, StockMovement, StockReservation, StockSnapshot
+from .pricing import priced_carts
+from .reservations import release_expired_reservations, release_reservations
+from .snapshots import take_snapshot
 
-# Create your tests here.
+
+class InventoryFixtures:
+    """
+    A user with one company and a taxed product with 100 units on the shelf
+    """
+
+    @classmethod
+    def make_world(cls):
+        cls.user = User.objects.create_user(username='buyer', password='buyer')
+        cls.company = Company.objects.create(
+            name='Test Company', address='1 Test Street', city='Pune', state='MH', postal_code='411001',
+            phone='0000000000', email='company@example.com', tax_id='TAX-1', created_by=cls.user,
+        )
+        cls.category = Category.objects.create(name='Category')
+        cls.tax = Tax.objects.create(company=cls.company, name='GST', rate=Decimal('18'), created_by=cls.user)
+        cls.product = cls.make_product('Widget', 'SKU-1')
+
+    @classmethod
+    def make_product(cls, name, sku, stock_quantity=100):
+        return Product.objects.create(
+            company=cls.company, category=cls.category, tax=cls.tax, name=name, product_type='goods',
+            sku=sku, unit_price=Decimal('10.00'), stock_quantity=stock_quantity, created_by=cls.user,
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def add_to_cart(self, product, quantity):
+        response = self.client.post(
+            '/api/cart/', {'user': self.user.pk, 'product': product.pk, 'quantity': quantity}, format='json'
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        return response
+
+    def checkout(self, **headers):
+        return self.client.post('/api/checkout/', {'shipping_address': '2 Test Street'}, format='json', **headers)
+
+    def move(self, movement_type, quantity, product=None):
+        return StockMovement.objects.create(
+            company=self.company, product=product or self.product, movement_type=movement_type,
+            quantity=quantity, reference_type='test', reference_id=1, created_by=self.user,
+        )
+
+    def balance(self, product=None):
+        return StockBalance.objects.get(company=self.company, product=product or self.product)
+
+    def shelf(self, product):
+        return Product.objects.values_list('stock_quantity', flat=True).get(pk=product.pk)
+
+
+class InventoryTestCase(InventoryFixtures, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.make_world()
+
+
+class StockBalanceTests(InventoryTestCase):
+
+    def test_movements_are_folded_into_the_balance(self):
+        self.move('in', 10)
+        self.move('out', 3)
+        self.move('adjustment', 2)
+        balance = self.balance()
+
+        # On top of the 100 units of opening shelf stock
+        self.assertEqual(balance.on_hand, Decimal('109'))
+        self.assertEqual((balance.total_in, balance.total_out, balance.total_adjustment), (10, 3, 102))
+
+    def test_editing_and_deleting_a_movement_reverses_it(self):
+        movement = self.move('in', 10)
+        movement.quantity = 4
+        movement.movement_type = 'out'
+        movement.save()
+        self.assertEqual(self.balance().on_hand, Decimal('96'))
+
+        movement.delete()
+        balance = self.balance()
+        self.assertEqual(balance.on_hand, Decimal('100'))
+        self.assertEqual((balance.total_in, balance.total_out), (0, 0))
+
+    def test_bulk_update_keeps_the_balance(self):
+        movement = self.move('in', 10)
+        response = self.client.post(
+            '/api/crud/bulk/bulk/update/stock_movements/',
+            {'ids': [movement.pk], 'update_data': {'quantity': '25'}}, format='json',
+        )
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(self.balance().on_hand, Decimal('125'))
+
+    def test_bulk_delete_reverses_the_movements(self):
+        movements = [self.move('in', 10), self.move('in', 5)]
+        response = self.client.post(
+            '/api/crud/bulk/bulk/delete/stock_movements/', {'ids': [m.pk for m in movements]}, format='json'
+        )
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(self.balance().on_hand, Decimal('100'))
+
+    def test_shelf_stock_set_on_the_product_is_on_hand(self):
+        self.assertEqual(self.balance().on_hand, Decimal('100'))
+        self.add_to_cart(self.product, 4)
+
+        product = Product.objects.get(pk=self.product.pk)
+        product.stock_quantity = 150
+        product.save()
+        product.name = 'Renamed'
+        product.save()
+
+        balance = self.balance()
+        self.assertEqual((balance.on_hand, balance.reserved, balance.total_adjustment), (154, 4, 154))
+        self.assertEqual(StockMovement.objects.filter(reference_type='product').count(), 2)
+
+    def test_bulk_update_refuses_cart_lines(self):
+        cart_item = Cart.objects.create(user=self.user, product=self.product, quantity=1)
+        response = self.client.post(
+            '/api/crud/bulk/bulk/update/carts/', {'ids': [cart_item.pk], 'update_data': {'quantity': 50}}, format='json'
+        )
+
+        self.assertEqual(response.status_code, 400)
+        cart_item.refresh_from_db()
+        self.assertEqual(cart_item.quantity, 1)
+
+
+class StockSnapshotTests(InventoryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.today = timezone.localdate()
+
+    def move_on(self, days_ago, movement_type, quantity):
+        movement = self.move(movement_type, quantity)
+        # auto_now_add ignores a given created_at
+        StockMovement.objects.filter(pk=movement.pk).update(created_at=timezone.now() - timedelta(days=days_ago))
+        movement.refresh_from_db()
+        return movement
+
+    def on_hand(self, snapshot_date):
+        return StockSnapshot.objects.get(product=self.product, snapshot_date=snapshot_date).on_hand
+
+    def as_of(self, day):
+        return stock_queryset(self.user, as_of=day).get(pk=self.product.pk).available_stock
+
+    def test_each_checkpoint_builds_on_the_previous_one(self):
+        self.move_on(3, 'in', 10)
+        self.move_on(3, 'out', 3)
+        take_snapshot(self.today - timedelta(days=3))
+        self.move_on(2, 'in', 5)
+        take_snapshot(self.today - timedelta(days=2))
+
+        self.assertEqual(self.on_hand(self.today - timedelta(days=3)), Decimal('7'))
+        self.assertEqual(self.on_hand(self.today - timedelta(days=2)), Decimal('12'))
+        self.assertEqual(self.as_of(self.today - timedelta(days=1)), Decimal('12'))
+
+    def test_editing_a_movement_drops_the_checkpoints_that_include_it(self):
+        self.move_on(5, 'in', 1)
+        early = self.move_on(3, 'in', 10)
+        take_snapshot(self.today - timedelta(days=4))
+        take_snapshot(self.today - timedelta(days=3))
+        take_snapshot(self.today - timedelta(days=2))
+
+        early.quantity = 20
+        early.save()
+
+        self.assertEqual(
+            list(StockSnapshot.objects.values_list('snapshot_date', flat=True)), [self.today - timedelta(days=4)]
+        )
+        self.assertEqual(self.as_of(self.today - timedelta(days=2)), Decimal('21'))
+
+    def test_deleting_a_movement_drops_the_checkpoints_that_include_it(self):
+        self.move_on(3, 'in', 10)
+        late = self.move_on(2, 'in', 5)
+        take_snapshot(self.today - timedelta(days=3))
+        take_snapshot(self.today - timedelta(days=2))
+
+        late.delete()
+
+        self.assertEqual(StockSnapshot.objects.filter(snapshot_date=self.today - timedelta(days=2)).count(), 0)
+        self.assertEqual(self.on_hand(self.today - timedelta(days=3)), Decimal('10'))
+        self.assertEqual(self.as_of(self.today - timedelta(days=1)), Decimal('10'))
+
+    def test_a_past_position_is_scoped_like_the_live_one(self):
+        branch = Company.objects.create(
+            name='Branch', address='3 Test Street', city='Pune', state='MH', postal_code='411001',
+            phone='0000000000', email='branch@example.com', tax_id='TAX-2', created_by=self.user,
+        )
+        self.move_on(3, 'in', 10)
+        branch_movement = StockMovement.objects.create(
+            company=branch, product=self.product, movement_type='in', quantity=7,
+            reference_type='test', reference_id=1, created_by=self.user,
+        )
+        StockMovement.objects.filter(pk=branch_movement.pk).update(created_at=timezone.now() - timedelta(days=2))
+        take_snapshot(self.today - timedelta(days=1))
+        self.move_on(0, 'in', 5)
+
+        def available(as_of=None):
+            return stock_queryset(self.user, company_id=self.company.pk, as_of=as_of).get(pk=self.product.pk).available_stock
+
+        # The branch's stock of the product counts in neither the checkpoint nor the replay
+        self.assertEqual(available(self.today - timedelta(days=1)), Decimal('10'))
+        self.assertEqual(available(self.today), available())
+        self.assertFalse(stock_queryset(User.objects.create_user(username='other'), as_of=self.today).exists())
+
+
+class ReservationTests(InventoryTestCase):
+
+    def reserved(self, product=None):
+        return self.balance(product).reserved
+
+    def test_a_hold_is_reserved_on_a_new_balance(self):
+        # A product from before balances were kept
+        StockBalance.objects.all().delete()
+        self.add_to_cart(self.product, 3)
+
+        balance = self.balance()
+        self.assertEqual((balance.on_hand, balance.reserved), (0, 3))
+        self.assertTrue(balance.needs_reorder)
+        self.assertEqual(self.shelf(self.product), 97)
+
+    def test_changing_a_line_moves_its_reservation(self):
+        self.move('in', 50)
+        gizmo = self.make_product('Gizmo', 'SKU-2')
+        cart_id = self.add_to_cart(self.product, 3).json()['id']
+
+        response = self.client.patch(f'/api/cart/{cart_id}/', {'quantity': 5}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(self.reserved(), 5)
+
+        response = self.client.patch(f'/api/cart/{cart_id}/', {'product': gizmo.pk, 'quantity': 2}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual((self.reserved(), self.reserved(gizmo)), (0, 2))
+
+        self.assertEqual(self.client.delete(f'/api/cart/{cart_id}/').status_code, 204)
+        self.assertEqual(self.reserved(gizmo), 0)
+
+    def test_bulk_changes_are_reserved(self):
+        gizmo = self.make_product('Gizmo', 'SKU-2')
+        for quantities in ([(self.product, 4), (gizmo, 1)], [(self.product, 2), (gizmo, 6)]):
+            response = self.client.post('/api/cart/bulk/', {
+                'items': [{'product': product.pk, 'quantity': quantity} for product, quantity in quantities]
+            }, format='json')
+            self.assertEqual(response.status_code, 200, response.content)
+
+        self.assertEqual((self.reserved(), self.reserved(gizmo)), (2, 6))
+
+    def test_expired_holds_are_unreserved(self):
+        self.add_to_cart(self.product, 3)
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(minutes=1))
+
+        self.assertEqual(release_expired_reservations(), 1)
+        self.assertEqual(self.reserved(), 0)
+        self.assertEqual(self.shelf(self.product), 100)
+
+    def test_checkout_turns_the_reservation_into_stock_out(self):
+        self.move('in', 20)
+        self.add_to_cart(self.product, 3)
+        self.assertEqual(self.checkout().status_code, 201)
+
+        balance = self.balance()
+        self.assertEqual((balance.on_hand, balance.reserved), (117, 0))
+
+    def test_rebuild_recomputes_the_reservation(self):
+        self.add_to_cart(self.product, 3)
+        StockBalance.objects.update(reserved=0)
+
+        call_command('rebuild_stock_balances', stdout=StringIO())
+        self.assertEqual(self.reserved(), 3)
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'holds'}})
+    def test_holds_drop_the_cached_stock_report(self):
+        def reported():
+            return self.client.get('/api/reports/stock/').json()['data'][0]['reserved_stock']
+
+        self.assertEqual(reported(), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.add_to_cart(self.product, 3)
+        self.assertEqual(reported(), 3)
+
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(minutes=1))
+        with self.captureOnCommitCallbacks(execute=True):
+            release_expired_reservations()
+        self.assertEqual(reported(), 0)
+
+
+class IdempotencyTests(InventoryTestCase):
+
+    def test_a_retry_replays_the_first_response(self):
+        self.add_to_cart(self.product, 2)
+        first = self.checkout(HTTP_IDEMPOTENCY_KEY='order-1')
+        retry = self.checkout(HTTP_IDEMPOTENCY_KEY='order-1')
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual((retry.status_code, retry['Idempotent-Replayed']), (201, 'true'))
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_a_key_cannot_be_reused_for_another_request(self):
+        self.add_to_cart(self.product, 2)
+        self.checkout(HTTP_IDEMPOTENCY_KEY='order-1')
+        response = self.client.post(
+            '/api/checkout/', {'shipping_address': 'Elsewhere'}, format='json', HTTP_IDEMPOTENCY_KEY='order-1'
+        )
+
+        self.assertEqual(response.status_code, 422)
+
+    def test_a_failed_attempt_gives_the_key_up(self):
+        self.assertEqual(self.checkout(HTTP_IDEMPOTENCY_KEY='order-1').status_code, 400)
+        self.assertFalse(IdempotencyRecord.objects.exists())
+
+        self.add_to_cart(self.product, 2)
+        self.assertEqual(self.checkout(HTTP_IDEMPOTENCY_KEY='order-1').status_code, 201)
+
+    def claim(self, age):
+        # What a request that is still running, or whose process died, leaves behind
+        record = IdempotencyRecord.objects.create(
+            user=self.user, key='order-1', method='POST', path='/api/checkout/', request_hash='',
+        )
+        IdempotencyRecord.objects.filter(pk=record.pk).update(created_at=timezone.now() - age)
+
+    def test_a_retry_while_the_first_request_runs_is_refused(self):
+        self.add_to_cart(self.product, 2)
+        self.claim(timedelta(seconds=1))
+        with mock.patch('inventory.idempotency.request_fingerprint', return_value=''):
+            response = self.checkout(HTTP_IDEMPOTENCY_KEY='order-1')
+
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Order.objects.exists())
+
+    @override_settings(IDEMPOTENCY_CLAIM_TIMEOUT=60)
+    def test_an_abandoned_claim_is_taken_over(self):
+        self.add_to_cart(self.product, 2)
+        self.claim(timedelta(minutes=5))
+        response = self.checkout(HTTP_IDEMPOTENCY_KEY='order-1')
+
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(IdempotencyRecord.objects.get().status_code, 201)
+
+    def test_a_claim_outlives_a_slow_request(self):
+        # The default timeout is longer than a web server lets a request run
+        self.add_to_cart(self.product, 2)
+        self.claim(timedelta(minutes=5))
+        with mock.patch('inventory.idempotency.request_fingerprint', return_value=''):
+            response = self.checkout(HTTP_IDEMPOTENCY_KEY='order-1')
+
+        self.assertEqual(response.status_code, 409)
+
+    def test_a_request_that_outlived_its_claim_leaves_the_retry_alone(self):
+        self.add_to_cart(self.product, 2)
+
+        def taken_over(*args, **kwargs):
+            # A retry took the key over while this request was still running
+            IdempotencyRecord.objects.filter(key='order-1').update(status_code=202, response_body={'id': 1})
+            return build_order(*args, **kwargs)
+
+        with mock.patch('inventory.views.build_order', side_effect=taken_over):
+            response = self.checkout(HTTP_IDEMPOTENCY_KEY='order-1')
+
+        self.assertEqual(response.status_code, 201)
+        record = IdempotencyRecord.objects.get()
+        self.assertEqual((record.status_code, record.response_body), (202, {'id': 1}))
+
+
+@override_settings(DOCUMENT_SEQUENCES={'inventory.order': {'allow_gaps': True, 'block_size': 5}})
+class IdempotentCheckoutNumberingTests(InventoryFixtures, TransactionTestCase):
+    # TestCase wraps every test in a transaction, which keeps blocks from being reserved
+
+    def setUp(self):
+        block_allocator.clear()
+        self.make_world()
+        super().setUp()
+
+    def tearDown(self):
+        block_allocator.clear()
+        # The committed checkouts buffered their sales, write them while the tables exist
+        analytics_buffer.flush()
+
+    def test_orders_are_numbered_from_a_block(self):
+        for key in ('order-1', 'order-2'):
+            self.add_to_cart(self.product, 1)
+            self.assertEqual(self.checkout(HTTP_IDEMPOTENCY_KEY=key).status_code, 201)
+
+        # One block reserved up front instead of a sequence increment per order
+        self.assertEqual(DocumentSequence.objects.get(document_type='inventory.order').last_value, 5)
+
+
+class CheckoutTests(InventoryTestCase):
+
+    def test_same_product_can_be_checked_out_twice(self):
+        self.add_to_cart(self.product, 2)
+        self.assertEqual(self.checkout().status_code, 201)
+        self.add_to_cart(self.product, 2)
+        response = self.checkout()
+
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(self.shelf(self.product), 96)
+        # The balance sells from the opening shelf stock too
+        balance = self.balance()
+        self.assertEqual((balance.on_hand, balance.reserved, balance.needs_reorder), (96, 0, False))
+        self.assertEqual(Order.objects.filter(user=self.user).count(), 2)
+
+    def test_checkout_is_limited_by_shelf_stock(self):
+        self.add_to_cart(self.product, 2)
+        # The shelf was emptied behind the cart's back after its hold expired
+        self.product.stock_reservations.all().delete()
+        Product.objects.filter(pk=self.product.pk).update(stock_quantity=1)
+        response = self.checkout()
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], 'Insufficient stock for Widget')
+        self.assertEqual(self.shelf(self.product), 1)
+        self.assertFalse(Order.objects.exists())
+
+
+@override_settings(QUEUED_CHECKOUT=True)
+class QueuedCheckoutTests(InventoryTestCase):
+
+    def make_buyer(self, username):
+        user = User.objects.create_user(username=username, password=username)
+        client = APIClient()
+        client.force_authenticate(user)
+        return user, client
+
+    def queue(self, buyer, product, quantity, shipping_address='2 Test Street'):
+        user, client = buyer
+        response = client.post('/api/cart/', {'user': user.pk, 'product': product.pk, 'quantity': quantity}, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        response = client.post('/api/checkout/', {'shipping_address': shipping_address}, format='json')
+        self.assertEqual(response.status_code, 202, response.content)
+        return response.json()['id']
+
+    def intent(self, buyer, intent_id):
+        response = buyer[1].get(f'/api/checkout/{intent_id}/')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_queued_checkouts_are_placed_by_the_worker(self):
+        buyers = [self.make_buyer('first'), self.make_buyer('second')]
+        intents = [self.queue(buyer, self.product, 5) for buyer in buyers]
+        # Checking out again while queued returns the same intent
+        again = buyers[0][1].post('/api/checkout/', {'shipping_address': '2 Test Street'}, format='json')
+        self.assertEqual(again.json()['id'], intents[0])
+        self.assertFalse(Order.objects.exists())
+
+        self.assertEqual(len(process_checkout_batch()), 2)
+
+        for buyer, intent_id in zip(buyers, intents):
+            intent = self.intent(buyer, intent_id)
+            self.assertEqual(intent['status'], 'completed')
+            self.assertEqual(intent['order']['user'], buyer[0].pk)
+        self.assertEqual(self.shelf(self.product), 90)
+        self.assertFalse(Cart.objects.exists())
+        self.assertEqual(self.balance().on_hand, 90)
+
+    def test_an_intent_short_of_stock_fails_alone(self):
+        widget_buyer, gizmo_buyer = self.make_buyer('first'), self.make_buyer('second')
+        gizmo = self.make_product('Gizmo', 'SKU-2')
+        short = self.queue(widget_buyer, self.product, 5)
+        placed = self.queue(gizmo_buyer, gizmo, 1)
+        # The hold expired and the shelf was emptied meanwhile
+        release_reservations(StockReservation.objects.filter(cart__user=widget_buyer[0]))
+        Product.objects.filter(pk=self.product.pk).update(stock_quantity=2)
+
+        process_checkout_batch()
+
+        failed = self.intent(widget_buyer, short)
+        self.assertEqual((failed['status'], failed['error']), ('failed', 'Insufficient stock for Widget'))
+        self.assertEqual(self.intent(gizmo_buyer, placed)['status'], 'completed')
+        self.assertEqual(self.shelf(self.product), 2)
+
+    def test_a_failing_intent_does_not_take_the_batch_down(self):
+        buyers = [self.make_buyer('first'), self.make_buyer('second'), self.make_buyer('third')]
+        intents = [
+            self.queue(buyer, self.product, 1, shipping_address='Nowhere' if index == 1 else '2 Test Street')
+            for index, buyer in enumerate(buyers)
+        ]
+        save_orders = checkout_module.save_orders
+
+        def failing_save(placements):
+            save_orders(placements)
+            if any(order.shipping_address == 'Nowhere' for order, _, _ in placements):
+                raise RuntimeError('Address rejected')
+
+        with mock.patch.object(checkout_module, 'save_orders', failing_save):
+            process_checkout_batch()
+
+        statuses = [CheckoutIntent.objects.values_list('status', 'error').get(pk=pk) for pk in intents]
+        self.assertEqual(statuses, [('completed', ''), ('failed', 'Address rejected'), ('completed', '')])
+        self.assertEqual(Order.objects.count(), 2)
+        # The failed buyer keeps the cart and its hold
+        self.assertEqual(Cart.objects.get().user, buyers[1][0])
+        self.assertEqual(self.balance().reserved, 1)
+
+    def test_another_user_cannot_poll_an_intent(self):
+        intent_id = self.queue(self.make_buyer('first'), self.product, 1)
+        self.assertEqual(self.client.get(f'/api/checkout/{intent_id}/').status_code, 404)
+
+
+@override_settings(QUEUED_CHECKOUT=True, CHECKOUT_INTENT_TIMEOUT=60, CHECKOUT_INTENT_MAX_ATTEMPTS=2)
+class StaleCheckoutIntentTests(InventoryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.add_to_cart(self.product, 3)
+        self.intent_id = self.checkout().json()['id']
+
+    def abandon(self):
+        # The worker died a while after claiming the intent
+        CheckoutIntent.objects.filter(pk=self.intent_id).update(started_at=timezone.now() - timedelta(minutes=5))
+
+    def test_an_intent_whose_worker_died_is_claimed_again(self):
+        self.assertEqual(len(claim_intents(10)), 1)
+        self.assertEqual(claim_intents(10), [])
+
+        self.abandon()
+        process_checkout_batch()
+
+        intent = CheckoutIntent.objects.get(pk=self.intent_id)
+        self.assertEqual((intent.status, intent.attempts), ('completed', 2))
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_an_intent_fails_after_its_last_attempt_and_the_user_can_check_out_again(self):
+        claim_intents(10)
+        self.abandon()
+        claim_intents(10)
+        self.abandon()
+
+        self.assertEqual(claim_intents(10), [])
+        intent = CheckoutIntent.objects.get(pk=self.intent_id)
+        self.assertEqual((intent.status, intent.error), ('failed', 'Timed out after 2 attempts'))
+        self.assertNotEqual(self.checkout().json()['id'], self.intent_id)
+
+    def test_a_worker_that_was_taken_over_places_nothing(self):
+        # The slow worker priced its batch before it was presumed dead
+        slow = claim_intents(10)
+        cart_items = list(priced_carts({self.user.pk}))
+        order, line_totals = build_order(self.user, cart_items, '2 Test Street')
+        self.abandon()
+        process_checkout_batch()
+
+        with transaction.atomic():
+            place_batch([(slow[0], order, cart_items, line_totals)])
+
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(self.shelf(self.product), 97)
+        self.assertEqual(CheckoutIntent.objects.get(pk=self.intent_id).status, 'completed')
@@ -25,8 +25,11 @@ urlpatterns = [
     
     # E-commerce URLs
     path('cart/', views.CartListCreateView.as_view(), name='cart-list-create'),
+    path('cart/bulk/', views.cart_bulk_upsert, name='cart-bulk-upsert'),
+    path('cart/summary/', views.cart_summary, name='cart-summary'),
     path('cart/<int:pk>/', views.CartRetrieveUpdateDestroyView.as_view(), name='cart-detail'),
     path('orders/', views.OrderListCreateView.as_view(), name='order-list-create'),
     path('orders/<int:pk>/', views.OrderRetrieveUpdateDestroyView.as_view(), name='order-detail'),
     path('checkout/', views.checkout, name='checkout'),
+    path('checkout/<int:intent_id>/', views.checkout_status, name='checkout-status'),
 ]
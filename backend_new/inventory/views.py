@@ -1,28 +1,35 @@
-from rest_framework import generics, status
+from rest_framework import generics, serializers, status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
+from django.conf import settings
 from django.db import transaction
 from .models import (
     PurchaseOrder, PurchaseOrderLineItem,
     SalesOrder, SalesOrderLineItem,
     VendorBill, VendorBillLineItem,
     CustomerInvoice, CustomerInvoiceLineItem,
-    StockMovement, Cart, Order, OrderItem
+    StockMovement, StockReservation, Cart, Order, OrderItem, CheckoutIntent
 )
 from .serializers import (
     PurchaseOrderSerializer, SalesOrderSerializer,
     VendorBillSerializer, CustomerInvoiceSerializer,
-    StockMovementSerializer, CartSerializer, OrderSerializer, OrderItemSerializer
+    StockMovementSerializer, CartSerializer, CartBulkSerializer, OrderSerializer, OrderItemSerializer,
+    CheckoutIntentSerializer
 )
+from .checkout import build_order, enqueue_checkout, save_orders
+from .idempotency import IdempotentCreateMixin, idempotent
+from .pricing import price_cart, priced_cart_items, summary_data
+from .reservations import cart_stock, convert_reservations, release_reservations, reserve_cart_line, reserve_cart_lines
+
 
 # Purchase Order Views
-class PurchaseOrderListCreateView(generics.ListCreateAPIView):
+class PurchaseOrderListCreateView(IdempotentCreateMixin, generics.ListCreateAPIView):
     serializer_class = PurchaseOrderSerializer
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        return PurchaseOrder.objects.filter(created_by=self.request.user)
+        return PurchaseOrder.objects.filter(created_by=self.request.user).select_related('supplier', 'created_by').prefetch_related('line_items__product')
     
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
@@ -32,15 +39,15 @@ class PurchaseOrderRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIVi
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        return PurchaseOrder.objects.filter(created_by=self.request.user)
+        return PurchaseOrder.objects.filter(created_by=self.request.user).select_related('supplier', 'created_by').prefetch_related('line_items__product')
 
 # Sales Order Views
-class SalesOrderListCreateView(generics.ListCreateAPIView):
+class SalesOrderListCreateView(IdempotentCreateMixin, generics.ListCreateAPIView):
     serializer_class = SalesOrderSerializer
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        return SalesOrder.objects.filter(created_by=self.request.user)
+        return SalesOrder.objects.filter(created_by=self.request.user).select_related('customer', 'created_by').prefetch_related('line_items__product')
     
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
@@ -50,15 +57,15 @@ class SalesOrderRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView)
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        return SalesOrder.objects.filter(created_by=self.request.user)
+        return SalesOrder.objects.filter(created_by=self.request.user).select_related('customer', 'created_by').prefetch_related('line_items__product')
 
 # Vendor Bill Views
-class VendorBillListCreateView(generics.ListCreateAPIView):
+class VendorBillListCreateView(IdempotentCreateMixin, generics.ListCreateAPIView):
     serializer_class = VendorBillSerializer
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        return VendorBill.objects.filter(created_by=self.request.user)
+        return VendorBill.objects.filter(created_by=self.request.user).select_related('supplier', 'created_by').prefetch_related('line_items__product')
     
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
@@ -68,15 +75,15 @@ class VendorBillRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView)
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        return VendorBill.objects.filter(created_by=self.request.user)
+        return VendorBill.objects.filter(created_by=self.request.user).select_related('supplier', 'created_by').prefetch_related('line_items__product')
 
 # Customer Invoice Views
-class CustomerInvoiceListCreateView(generics.ListCreateAPIView):
+class CustomerInvoiceListCreateView(IdempotentCreateMixin, generics.ListCreateAPIView):
     serializer_class = CustomerInvoiceSerializer
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        return CustomerInvoice.objects.filter(created_by=self.request.user)
+        return CustomerInvoice.objects.filter(created_by=self.request.user).select_related('customer', 'created_by').prefetch_related('line_items__product')
     
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
@@ -86,15 +93,15 @@ class CustomerInvoiceRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPI
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        return CustomerInvoice.objects.filter(created_by=self.request.user)
+        return CustomerInvoice.objects.filter(created_by=self.request.user).select_related('customer', 'created_by').prefetch_related('line_items__product')
 
 # Stock Movement Views
-class StockMovementListCreateView(generics.ListCreateAPIView):
+class StockMovementListCreateView(IdempotentCreateMixin, generics.ListCreateAPIView):
     serializer_class = StockMovementSerializer
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        return StockMovement.objects.filter(created_by=self.request.user)
+        return StockMovement.objects.filter(created_by=self.request.user).select_related('product', 'created_by')
     
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
@@ -102,6 +109,7 @@ class StockMovementListCreateView(generics.ListCreateAPIView):
 # Convert PO to Bill
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@idempotent
 def convert_po_to_bill(request, po_id):
     try:
         po = PurchaseOrder.objects.get(id=po_id, created_by=request.user)
@@ -161,6 +169,7 @@ def convert_po_to_bill(request, po_id):
 # Convert SO to Invoice
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@idempotent
 def convert_so_to_invoice(request, so_id):
     try:
         so = SalesOrder.objects.get(id=so_id, created_by=request.user)
@@ -218,30 +227,103 @@ def convert_so_to_invoice(request, so_id):
         return Response({'error': 'Sales Order not found'}, status=status.HTTP_404_NOT_FOUND)
 
 # Cart Views
-class CartListCreateView(generics.ListCreateAPIView):
+class CartReservationMixin:
+    """
+    Holds stock for cart lines as they are added, changed and removed
+    """
+    
+    def save_and_reserve(self, serializer, **kwargs):
+        with transaction.atomic():
+            cart_item = serializer.save(**kwargs)
+            if not reserve_cart_line(cart_item):
+                raise serializers.ValidationError({'error': f'Insufficient stock for {cart_item.product.name}'})
+    
+    def perform_create(self, serializer):
+        self.save_and_reserve(serializer, user=self.request.user)
+    
+    def perform_update(self, serializer):
+        self.save_and_reserve(serializer)
+    
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            release_reservations(StockReservation.objects.filter(cart=instance))
+            instance.delete()
+
+class CartListCreateView(IdempotentCreateMixin, CartReservationMixin, generics.ListCreateAPIView):
     serializer_class = CartSerializer
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        return Cart.objects.filter(user=self.request.user)
-    
-    def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        return Cart.objects.filter(user=self.request.user).select_related('product', 'reservation')
 
-class CartRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
+class CartRetrieveUpdateDestroyView(CartReservationMixin, generics.RetrieveUpdateDestroyAPIView):
     serializer_class = CartSerializer
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        return Cart.objects.filter(user=self.request.user)
+        return Cart.objects.filter(user=self.request.user).select_related('product', 'reservation')
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def cart_summary(request):
+    """
+    Priced cart: line totals, tax per rate, delivery charge and grand total
+    """
+    return Response(summary_data(price_cart(priced_cart_items(request.user))))
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@idempotent
+def cart_bulk_upsert(request):
+    """
+    Add or update many cart lines at once, each product's line is set to the given quantity
+    """
+    serializer = CartBulkSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    quantities = serializer.validated_data['items']
+    
+    # Existence and stock of every product in one query
+    stock = cart_stock(request.user, quantities)
+    missing = [str(product_id) for product_id in quantities if product_id not in stock]
+    if missing:
+        return Response({'error': f'Products not found: {", ".join(missing)}'},
+                      status=status.HTTP_400_BAD_REQUEST)
+    short = [name for product_id, (name, available) in stock.items() if quantities[product_id] > available]
+    if short:
+        return Response({'error': f'Insufficient stock for {", ".join(short)}'},
+                      status=status.HTTP_400_BAD_REQUEST)
+    
+    with transaction.atomic():
+        # One INSERT ... ON CONFLICT (user, product) DO UPDATE for all lines
+        Cart.objects.bulk_create(
+            [
+                Cart(user=request.user, product_id=product_id, quantity=quantity)
+                for product_id, quantity in quantities.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['user', 'product'],
+            update_fields=['quantity', 'updated_at'],
+        )
+        cart_items = list(Cart.objects.filter(user=request.user, product_id__in=list(quantities)))
+        # Stock may have moved since the check above, the holds are taken conditionally
+        short = reserve_cart_lines(cart_items)
+        if short:
+            transaction.set_rollback(True)
+            names = ', '.join(stock[product_id][0] for product_id in short if product_id in stock)
+            return Response({'error': f'Insufficient stock for {names}'},
+                          status=status.HTTP_400_BAD_REQUEST)
+    
+    cart = Cart.objects.filter(user=request.user).select_related('product', 'reservation')
+    return Response(CartSerializer(cart, many=True).data)
 
 # Order Views
-class OrderListCreateView(generics.ListCreateAPIView):
+class OrderListCreateView(IdempotentCreateMixin, generics.ListCreateAPIView):
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user)
+        return Order.objects.filter(user=self.request.user).select_related('user').prefetch_related('items__product')
     
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
@@ -251,69 +333,65 @@ class OrderRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user)
+        return Order.objects.filter(user=self.request.user).select_related('user').prefetch_related('items__product')
 
 # Checkout Process
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@idempotent
 def checkout(request):
     """
-    Process checkout from cart to order
+    Process checkout from cart to order, or queue it when QUEUED_CHECKOUT is on
     """
     try:
-        cart_items = Cart.objects.filter(user=request.user)
-        if not cart_items.exists():
+        if getattr(settings, 'QUEUED_CHECKOUT', False):
+            if not Cart.objects.filter(user=request.user).exists():
+                return Response({'error': 'Cart is empty'}, status=status.HTTP_400_BAD_REQUEST)
+            intent = enqueue_checkout(request.user, request.data)
+            return Response(CheckoutIntentSerializer(intent).data, status=status.HTTP_202_ACCEPTED)
+        
+        cart_items = list(priced_cart_items(request.user))
+        if not cart_items:
             return Response({'error': 'Cart is empty'}, status=status.HTTP_400_BAD_REQUEST)
         
+        order, line_totals = build_order(
+            request.user,
+            cart_items,
+            shipping_address=request.data.get('shipping_address', ''),
+            payment_method=request.data.get('payment_method', 'cash_on_delivery'),
+            notes=request.data.get('notes', '')
+        )
+        
         with transaction.atomic():
-            # Create order
-            order = Order.objects.create(
-                user=request.user,
-                shipping_address=request.data.get('shipping_address', ''),
-                payment_method=request.data.get('payment_method', 'cash_on_delivery'),
-                notes=request.data.get('notes', '')
-            )
-            
-            subtotal = 0
-            # Create order items from cart
-            for cart_item in cart_items:
-                OrderItem.objects.create(
-                    order=order,
-                    product=cart_item.product,
-                    quantity=cart_item.quantity,
-                    unit_price=cart_item.product.unit_price
-                )
-                subtotal += cart_item.total_price
-            
-            # Calculate totals
-            order.subtotal = subtotal
-            order.tax_amount = subtotal * 0.18  # 18% GST
-            order.delivery_charge = 50.0  # Fixed delivery charge
-            order.total_amount = order.subtotal + order.tax_amount + order.delivery_charge
-            order.save()
+            # Product.stock_quantity is the stock checkout sells from. Held stock was
+            # already taken when the lines were added, only lines whose hold expired
+            # take stock here, in one conditional UPDATE
+            short = convert_reservations(cart_items)
+            if short:
+                names = ', '.join(cart_item.product.name for cart_item in cart_items if cart_item.product_id in short)
+                return Response({'error': f'Insufficient stock for {names}'},
+                              status=status.HTTP_400_BAD_REQUEST)
             
-            # Clear cart
-            cart_items.delete()
-            
-            # Update stock
-            for cart_item in cart_items:
-                cart_item.product.stock_quantity -= cart_item.quantity
-                cart_item.product.save()
-                
-                # Create stock movement
-                StockMovement.objects.create(
-                    company=cart_item.product.company,
-                    product=cart_item.product,
-                    movement_type='out',
-                    quantity=cart_item.quantity,
-                    reference_type='order',
-                    reference_id=order.id,
-                    notes=f'Stock out from Order {order.order_number}',
-                    created_by=request.user
-                )
+            save_orders([(order, cart_items, line_totals)])
         
+        # Reload with the items so the response does not fetch them row by row
+        order = Order.objects.select_related('user').prefetch_related('items__product').get(pk=order.pk)
         serializer = OrderSerializer(order)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
         
     except Exception as e:
-        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def checkout_status(request, intent_id):
+    """
+    Poll a queued checkout, the order is included once it was placed
+    """
+    try:
+        intent = CheckoutIntent.objects.select_related('order__user').prefetch_related('order__items__product').get(
+            id=intent_id, user=request.user
+        )
+    except CheckoutIntent.DoesNotExist:
+        return Response({'error': 'Checkout not found'}, status=status.HTTP_404_NOT_FOUND)
+    return Response(CheckoutIntentSerializer(intent).data)
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Company, Contact, Product, Tax, ChartOfAccounts
+from .models import Company, Contact, Product, Tax, ChartOfAccounts, DocumentSequence
 
 @admin.register(Company)
 class CompanyAdmin(admin.ModelAdmin):
@@ -34,4 +34,10 @@ class ChartOfAccountsAdmin(admin.ModelAdmin):
     list_display = ('code', 'name', 'account_type', 'company', 'is_active')
     list_filter = ('account_type', 'is_active', 'company', 'created_at')
     search_fields = ('code', 'name')
-    readonly_fields = ('created_at', 'updated_at')
\ No newline at end of file
+    readonly_fields = ('created_at', 'updated_at')
+
+@admin.register(DocumentSequence)
+class DocumentSequenceAdmin(admin.ModelAdmin):
+    list_display = ('document_type', 'company', 'last_value', 'updated_at')
+    list_filter = ('document_type', 'company')
+    readonly_fields = ('updated_at',)
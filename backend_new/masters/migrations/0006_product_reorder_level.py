@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('masters', '0005_sellerinvoice_is_active_sellerproduct_is_active_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='reorder_level',
+            field=models.IntegerField(default=10),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('masters', '0006_product_reorder_level'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('document_type', models.CharField(max_length=100)),
+                ('last_value', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('company', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='document_sequences', to='masters.company')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('company', 'document_type'), name='document_sequence_company_type'), models.UniqueConstraint(condition=models.Q(('company__isnull', True)), fields=('document_type',), name='document_sequence_global_type')],
+            },
+        ),
+    ]
@@ -1,8 +1,36 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
 
+class DocumentNumberMixin:
+    """
+    Numbers a new document from its DocumentSequence on first save. Gap-free
+    types take the number in the same transaction as the insert so a failed
+    insert gives it back (see masters.sequences).
+    """
+    number_field = None
+    number_format = None
+    number_per_company = True
+    
+    def assign_number(self):
+        from .sequences import next_document_number
+        setattr(self, self.number_field, next_document_number(
+            self, self.number_field, self.number_format, self.number_per_company
+        ))
+    
+    def save(self, *args, **kwargs):
+        if getattr(self, self.number_field):
+            return super().save(*args, **kwargs)
+        from .sequences import sequence_config
+        if sequence_config(type(self))['allow_gaps']:
+            # A failed insert only leaves a gap, number it outside the insert's transaction
+            self.assign_number()
+            return super().save(*args, **kwargs)
+        with transaction.atomic():
+            self.assign_number()
+            super().save(*args, **kwargs)
+
 class Category(models.Model):
     name = models.CharField(max_length=100)
     parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='subcategories')
@@ -72,6 +100,7 @@ class Product(models.Model):
     is_featured = models.BooleanField(default=False)
     stock_quantity = models.IntegerField(default=0)
     min_order_quantity = models.IntegerField(default=1)
+    reorder_level = models.IntegerField(default=10)
     is_active = models.BooleanField(default=True)
     created_by = models.ForeignKey(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -134,7 +163,7 @@ class SellerProduct(models.Model):
     def __str__(self):
         return f"{self.product.name} - {self.seller.username} (₹{self.selling_price})"
 
-class SellerInvoice(models.Model):
+class SellerInvoice(DocumentNumberMixin, models.Model):
     seller = models.ForeignKey(User, on_delete=models.CASCADE, related_name='seller_invoices')
     invoice_number = models.CharField(max_length=50, unique=True)
     total_sales = models.DecimalField(max_digits=12, decimal_places=2)
@@ -144,15 +173,9 @@ class SellerInvoice(models.Model):
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
-    def save(self, *args, **kwargs):
-        if not self.invoice_number:
-            last_invoice = SellerInvoice.objects.order_by('-id').first()
-            if last_invoice:
-                last_number = int(last_invoice.invoice_number.split('-')[-1])
-                self.invoice_number = f"SI-{last_number + 1:04d}"
-            else:
-                self.invoice_number = "SI-0001"
-        super().save(*args, **kwargs)
+    number_field = 'invoice_number'
+    number_format = 'SI-{number:04d}'
+    number_per_company = False
     
     def __str__(self):
         return f"Seller Invoice {self.invoice_number} - {self.seller.username}"
@@ -214,4 +237,27 @@ class Company(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
-        return self.name
\ No newline at end of file
+        return self.name
+class DocumentSequence(models.Model):
+    """
+    Last number handed out per document type, scoped to a company where the
+    number format includes one. See masters.sequences.
+    """
+    company = models.ForeignKey('Company', on_delete=models.CASCADE, null=True, blank=True, related_name='document_sequences')
+    document_type = models.CharField(max_length=100)
+    last_value = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['company', 'document_type'], name='document_sequence_company_type'),
+            # NULLs never collide in a unique constraint, global sequences need their own
+            models.UniqueConstraint(
+                fields=['document_type'],
+                condition=models.Q(company__isnull=True),
+                name='document_sequence_global_type',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.document_type} ({self.company_id or 'global'}) - {self.last_value}"
@@ -0,0 +1,126 @@
+"""
+Document number sequences
+
+Each document type (per company where the number format includes the
+company) has one DocumentSequence row. Gap-free types take every number by
+incrementing that row with an F() UPDATE inside the inserting transaction, so
+a rolled back insert also returns its number. Types that allow gaps (see
+DOCUMENT_SEQUENCES in settings) reserve a block of numbers at once and hand
+them out from memory, so the row is only locked once per block. Callers that
+number a document inside a larger transaction (checkout) should assign the
+number before opening it, see DocumentNumberMixin.assign_number.
+"""
+
+import threading
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from .models import DocumentSequence
+
+DEFAULT_SEQUENCE_CONFIG = {
+    'allow_gaps': False,
+    'block_size': 1,
+}
+
+
+def sequence_key(model):
+    return model._meta.label_lower
+
+
+def sequence_config(model):
+    config = getattr(settings, 'DOCUMENT_SEQUENCES', {}).get(sequence_key(model), {})
+    return {**DEFAULT_SEQUENCE_CONFIG, **config}
+
+
+def _last_used(model, number_field, company_id=None):
+    """
+    Number of the newest existing document, used to seed a new sequence row
+    so numbering continues from documents created before sequences existed
+    """
+    documents = model.objects.all()
+    if company_id is not None:
+        documents = documents.filter(company_id=company_id)
+    last_number = documents.order_by('-id').values_list(number_field, flat=True).first()
+    if not last_number:
+        return 0
+    try:
+        return int(last_number.split('-')[-1])
+    except ValueError:
+        return 0
+
+
+def reserve_numbers(model, number_field, company_id=None, count=1):
+    """
+    Atomically take `count` numbers from the sequence and return the last one
+    """
+    document_type = sequence_key(model)
+    sequence = DocumentSequence.objects.filter(company_id=company_id, document_type=document_type)
+    with transaction.atomic():
+        if sequence.update(last_value=F('last_value') + count):
+            return sequence.values_list('last_value', flat=True).get()
+        try:
+            with transaction.atomic():
+                created = DocumentSequence.objects.create(
+                    company_id=company_id,
+                    document_type=document_type,
+                    last_value=_last_used(model, number_field, company_id) + count,
+                )
+            return created.last_value
+        except IntegrityError:
+            # Another request created the row first
+            sequence.update(last_value=F('last_value') + count)
+            return sequence.values_list('last_value', flat=True).get()
+
+
+class BlockAllocator:
+    """
+    Per-process blocks of reserved numbers, keyed by (document type, company).
+    A new block is only reserved outside a transaction so it is committed at
+    once; if a caller's transaction rolled back after reserving a block, another
+    process could be handed the same numbers.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._blocks = {}
+
+    def take(self, model, number_field, company_id, block_size):
+        """
+        Next number from the block, None when the block is used up inside a transaction
+        """
+        key = (sequence_key(model), company_id)
+        with self._lock:
+            block = self._blocks.get(key)
+            if block is None or block['next'] > block['last']:
+                if connection.in_atomic_block:
+                    return None
+                last = reserve_numbers(model, number_field, company_id, block_size)
+                block = self._blocks[key] = {'next': last - block_size + 1, 'last': last}
+            number = block['next']
+            block['next'] += 1
+            return number
+
+    def clear(self):
+        """
+        Drop the unused numbers of every block, they become gaps
+        """
+        with self._lock:
+            self._blocks.clear()
+
+
+block_allocator = BlockAllocator()
+
+
+def next_document_number(instance, number_field, number_format, per_company=True):
+    """
+    Next formatted number for a document, e.g. 'PO-{company:03d}-{number:04d}'
+    """
+    model = type(instance)
+    company_id = instance.company_id if per_company else None
+    config = sequence_config(model)
+    number = None
+    if config['allow_gaps'] and config['block_size'] > 1:
+        number = block_allocator.take(model, number_field, company_id, config['block_size'])
+    if number is None:
+        number = reserve_numbers(model, number_field, company_id)
+    return number_format.format(company=company_id, number=number)
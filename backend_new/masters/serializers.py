@@ -50,9 +50,8 @@ class CategorySerializer(serializers.ModelSerializer):
         read_only_fields = ('created_at', 'updated_at')
     
     def get_subcategories(self, obj):
-        if obj.subcategories.exists():
-            return CategorySerializer(obj.subcategories.all(), many=True).data
-        return []
+        # all() rather than exists() so a prefetched relation is not queried again
+        return CategorySerializer(obj.subcategories.all(), many=True).data
 
 class ProductImageSerializer(serializers.ModelSerializer):
     class Meta:
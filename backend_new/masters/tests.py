@@ -1,3 +1,108 @@
-from django.test import TestCase
+from datetime import date
+from django.db import IntegrityError, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from users.models import User
+from inventory.models import Order, PurchaseOrder
+from .models import Company, Contact, DocumentSequence
+from .sequences import block_allocator
 
-# Create your tests here.
+
+class SequenceTestMixin:
+    """
+    A user with two companies and a supplier in each
+    """
+
+    def make_world(self):
+        self.user = User.objects.create_user(username='clerk', password='clerk')
+        self.company, self.supplier = self.make_company('First')
+        self.other_company, self.other_supplier = self.make_company('Second')
+
+    def make_company(self, name):
+        company = Company.objects.create(
+            name=name, address='1 Test Street', city='Pune', state='MH', postal_code='411001',
+            phone='0000000000', email='company@example.com', tax_id=f'TAX-{name}', created_by=self.user,
+        )
+        supplier = Contact.objects.create(
+            company=company, contact_type='supplier', name=f'{name} Supplier', email='supplier@example.com',
+            phone='0000000000', address='2 Test Street', city='Pune', state='MH', postal_code='411001',
+            created_by=self.user,
+        )
+        return company, supplier
+
+    def make_purchase_order(self, company=None, supplier=None, **fields):
+        fields.setdefault('po_date', date.today())
+        return PurchaseOrder.objects.create(
+            company=company or self.company, supplier=supplier or self.supplier,
+            expected_delivery_date=date.today(), created_by=self.user, **fields
+        )
+
+    def make_order(self):
+        return Order.objects.create(user=self.user, shipping_address='3 Test Street')
+
+    def last_value(self, model, company=None):
+        return DocumentSequence.objects.get(
+            company=company, document_type=model._meta.label_lower
+        ).last_value
+
+
+class GapFreeSequenceTests(SequenceTestMixin, TestCase):
+
+    def setUp(self):
+        self.make_world()
+
+    def test_numbers_run_per_company(self):
+        numbers = [
+            self.make_purchase_order().po_number,
+            self.make_purchase_order(self.other_company, self.other_supplier).po_number,
+            self.make_purchase_order().po_number,
+        ]
+
+        first, second = self.company.pk, self.other_company.pk
+        self.assertEqual(numbers, [f'PO-{first:03d}-0001', f'PO-{second:03d}-0001', f'PO-{first:03d}-0002'])
+
+    def test_a_failed_insert_gives_its_number_back(self):
+        self.make_purchase_order()
+        with self.assertRaises(IntegrityError):
+            # Numbered first, then the insert fails
+            self.make_purchase_order(po_date=None)
+
+        self.assertEqual(self.make_purchase_order().po_number, f'PO-{self.company.pk:03d}-0002')
+
+    def test_a_new_sequence_continues_from_existing_documents(self):
+        self.make_purchase_order()
+        self.make_purchase_order()
+        DocumentSequence.objects.all().delete()
+
+        self.assertEqual(self.make_purchase_order().po_number, f'PO-{self.company.pk:03d}-0003')
+
+
+@override_settings(DOCUMENT_SEQUENCES={'inventory.order': {'allow_gaps': True, 'block_size': 3}})
+class BlockSequenceTests(SequenceTestMixin, TransactionTestCase):
+    # Blocks are only reserved outside a transaction, which TestCase always opens
+
+    def setUp(self):
+        block_allocator.clear()
+        self.make_world()
+
+    def tearDown(self):
+        block_allocator.clear()
+
+    def test_numbers_come_from_a_reserved_block(self):
+        numbers = [self.make_order().order_number for _ in range(4)]
+
+        self.assertEqual(numbers, ['ORD-000001', 'ORD-000002', 'ORD-000003', 'ORD-000004'])
+        # The fourth order reserved a second block of three
+        self.assertEqual(self.last_value(Order), 6)
+
+    def test_an_exhausted_block_inside_a_transaction_takes_single_numbers(self):
+        with transaction.atomic():
+            numbers = [self.make_order().order_number for _ in range(2)]
+
+        self.assertEqual(numbers, ['ORD-000001', 'ORD-000002'])
+        self.assertEqual(self.last_value(Order), 2)
+
+    def test_unused_numbers_of_a_cleared_block_become_gaps(self):
+        self.make_order()
+        block_allocator.clear()
+
+        self.assertEqual(self.make_order().order_number, 'ORD-000004')
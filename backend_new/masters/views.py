@@ -3,11 +3,17 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
 from django.utils import timezone
+from inventory.idempotency import IdempotentCreateMixin
+from reports.analytics import record_product_view
 from .models import Company, Contact, Product, Tax, ChartOfAccounts, Category, ProductImage, ProductReview, SellerProfile, SellerProduct, SellerInvoice
 from .serializers import CompanySerializer, ContactSerializer, ProductSerializer, TaxSerializer, ChartOfAccountsSerializer, CategorySerializer, ProductImageSerializer, ProductReviewSerializer, SellerProfileSerializer, SellerProductSerializer, SellerInvoiceSerializer
 
+# Relations read by ProductSerializer, loaded up front instead of once per product
+PRODUCT_RELATED = ['company', 'tax', 'category', 'subcategory']
+PRODUCT_PREFETCH = ['images', 'reviews__user']
+
 # Company Views
-class CompanyListCreateView(generics.ListCreateAPIView):
+class CompanyListCreateView(IdempotentCreateMixin, generics.ListCreateAPIView):
     serializer_class = CompanySerializer
     permission_classes = [IsAuthenticated]
     
@@ -25,12 +31,12 @@ class CompanyRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
         return Company.objects.filter(created_by=self.request.user)
 
 # Contact Views
-class ContactListCreateView(generics.ListCreateAPIView):
+class ContactListCreateView(IdempotentCreateMixin, generics.ListCreateAPIView):
     serializer_class = ContactSerializer
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        return Contact.objects.filter(created_by=self.request.user)
+        return Contact.objects.filter(created_by=self.request.user).select_related('company')
     
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
@@ -40,15 +46,15 @@ class ContactRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        return Contact.objects.filter(created_by=self.request.user)
+        return Contact.objects.filter(created_by=self.request.user).select_related('company')
 
 # Product Views
-class ProductListCreateView(generics.ListCreateAPIView):
+class ProductListCreateView(IdempotentCreateMixin, generics.ListCreateAPIView):
     serializer_class = ProductSerializer
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        return Product.objects.filter(created_by=self.request.user)
+        return Product.objects.filter(created_by=self.request.user).select_related(*PRODUCT_RELATED).prefetch_related(*PRODUCT_PREFETCH)
     
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
@@ -58,15 +64,15 @@ class ProductRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        return Product.objects.filter(created_by=self.request.user)
+        return Product.objects.filter(created_by=self.request.user).select_related(*PRODUCT_RELATED).prefetch_related(*PRODUCT_PREFETCH)
 
 # Tax Views
-class TaxListCreateView(generics.ListCreateAPIView):
+class TaxListCreateView(IdempotentCreateMixin, generics.ListCreateAPIView):
     serializer_class = TaxSerializer
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        return Tax.objects.filter(created_by=self.request.user)
+        return Tax.objects.filter(created_by=self.request.user).select_related('company')
     
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
@@ -76,15 +82,15 @@ class TaxRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        return Tax.objects.filter(created_by=self.request.user)
+        return Tax.objects.filter(created_by=self.request.user).select_related('company')
 
 # Chart of Accounts Views
-class ChartOfAccountsListCreateView(generics.ListCreateAPIView):
+class ChartOfAccountsListCreateView(IdempotentCreateMixin, generics.ListCreateAPIView):
     serializer_class = ChartOfAccountsSerializer
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        return ChartOfAccounts.objects.filter(created_by=self.request.user)
+        return ChartOfAccounts.objects.filter(created_by=self.request.user).select_related('company', 'parent')
     
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
@@ -94,26 +100,26 @@ class ChartOfAccountsRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPI
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        return ChartOfAccounts.objects.filter(created_by=self.request.user)
+        return ChartOfAccounts.objects.filter(created_by=self.request.user).select_related('company', 'parent')
 
 # Category Views
-class CategoryListCreateView(generics.ListCreateAPIView):
+class CategoryListCreateView(IdempotentCreateMixin, generics.ListCreateAPIView):
     serializer_class = CategorySerializer
     permission_classes = [AllowAny]
-    queryset = Category.objects.filter(is_active=True)
+    queryset = Category.objects.filter(is_active=True).prefetch_related('subcategories__subcategories')
 
 class CategoryRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = CategorySerializer
     permission_classes = [IsAuthenticated]
-    queryset = Category.objects.all()
+    queryset = Category.objects.prefetch_related('subcategories__subcategories')
 
 # Product Views (Enhanced for E-commerce)
-class ProductListCreateView(generics.ListCreateAPIView):
+class ProductListCreateView(IdempotentCreateMixin, generics.ListCreateAPIView):
     serializer_class = ProductSerializer
     permission_classes = [AllowAny]
     
     def get_queryset(self):
-        queryset = Product.objects.filter(is_active=True)
+        queryset = Product.objects.filter(is_active=True).select_related(*PRODUCT_RELATED).prefetch_related(*PRODUCT_PREFETCH)
         category = self.request.query_params.get('category')
         subcategory = self.request.query_params.get('subcategory')
         search = self.request.query_params.get('search')
@@ -135,10 +141,15 @@ class ProductRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        return Product.objects.filter(created_by=self.request.user)
+        return Product.objects.filter(created_by=self.request.user).select_related(*PRODUCT_RELATED).prefetch_related(*PRODUCT_PREFETCH)
+    
+    def retrieve(self, request, *args, **kwargs):
+        response = super().retrieve(request, *args, **kwargs)
+        record_product_view(self.kwargs['pk'])
+        return response
 
 # Product Review Views
-class ProductReviewListCreateView(generics.ListCreateAPIView):
+class ProductReviewListCreateView(IdempotentCreateMixin, generics.ListCreateAPIView):
     serializer_class = ProductReviewSerializer
     permission_classes = [IsAuthenticated]
     
@@ -160,7 +171,7 @@ class ProductReviewListCreateView(generics.ListCreateAPIView):
             product.save()
 
 # Product Image Views
-class ProductImageListCreateView(generics.ListCreateAPIView):
+class ProductImageListCreateView(IdempotentCreateMixin, generics.ListCreateAPIView):
     serializer_class = ProductImageSerializer
     permission_classes = [IsAuthenticated]
     
@@ -174,7 +185,7 @@ class ProductImageListCreateView(generics.ListCreateAPIView):
         serializer.save(product=product)
 
 # Seller Profile Views
-class SellerProfileListCreateView(generics.ListCreateAPIView):
+class SellerProfileListCreateView(IdempotentCreateMixin, generics.ListCreateAPIView):
     serializer_class = SellerProfileSerializer
     permission_classes = [IsAuthenticated]
     
@@ -192,12 +203,12 @@ class SellerProfileRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIVi
         return SellerProfile.objects.filter(user=self.request.user)
 
 # Seller Product Views
-class SellerProductListCreateView(generics.ListCreateAPIView):
+class SellerProductListCreateView(IdempotentCreateMixin, generics.ListCreateAPIView):
     serializer_class = SellerProductSerializer
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        return SellerProduct.objects.filter(seller=self.request.user)
+        return SellerProduct.objects.filter(seller=self.request.user).select_related('product', 'seller')
     
     def perform_create(self, serializer):
         serializer.save(seller=self.request.user)
@@ -207,18 +218,18 @@ class SellerProductRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIVi
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        return SellerProduct.objects.filter(seller=self.request.user)
+        return SellerProduct.objects.filter(seller=self.request.user).select_related('product', 'seller')
 
 # Admin Views for Seller Management
-class AdminSellerProductListCreateView(generics.ListCreateAPIView):
+class AdminSellerProductListCreateView(IdempotentCreateMixin, generics.ListCreateAPIView):
     serializer_class = SellerProductSerializer
     permission_classes = [IsAuthenticated]
-    queryset = SellerProduct.objects.all()
+    queryset = SellerProduct.objects.select_related('product', 'seller')
 
 class AdminSellerProductRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = SellerProductSerializer
     permission_classes = [IsAuthenticated]
-    queryset = SellerProduct.objects.all()
+    queryset = SellerProduct.objects.select_related('product', 'seller')
 
 # Approve Seller Product
 @api_view(['POST'])
@@ -244,16 +255,16 @@ def approve_seller_product(request, product_id):
         return Response({'error': 'Seller product not found'}, status=status.HTTP_404_NOT_FOUND)
 
 # Seller Invoice Views
-class SellerInvoiceListCreateView(generics.ListCreateAPIView):
+class SellerInvoiceListCreateView(IdempotentCreateMixin, generics.ListCreateAPIView):
     serializer_class = SellerInvoiceSerializer
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        return SellerInvoice.objects.filter(seller=self.request.user)
+        return SellerInvoice.objects.filter(seller=self.request.user).select_related('seller')
 
 class SellerInvoiceRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = SellerInvoiceSerializer
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        return SellerInvoice.objects.filter(seller=self.request.user)
\ No newline at end of file
+        return SellerInvoice.objects.filter(seller=self.request.user).select_related('seller')
\ No newline at end of file
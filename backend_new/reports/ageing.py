@@ -0,0 +1,90 @@
+"""
+Aged receivables / payables report engine
+
+Open documents are bucketed by how far past their due date they are, per
+contact, in one grouped query with a CASE expression per bucket.
+"""
+
+from datetime import timedelta
+from decimal import Decimal
+from django.db.models import Case, Count, DecimalField, F, Q, Sum, Value, When
+from inventory.models import CustomerInvoice, VendorBill
+
+# Report type -> (model, contact field, statuses that still have an open balance)
+AGEING_SOURCES = {
+    'receivables': (CustomerInvoice, 'customer', ['sent', 'overdue']),
+    'payables': (VendorBill, 'supplier', ['confirmed']),
+}
+
+AMOUNT_FIELD = DecimalField(max_digits=14, decimal_places=2)
+
+BUCKETS = ['current', 'days_1_30', 'days_31_60', 'days_61_90', 'days_over_90']
+
+
+def bucket_conditions(as_of):
+    """
+    Due date condition for each bucket, as days overdue on the as_of date
+    """
+    return {
+        'current': Q(due_date__gte=as_of),
+        'days_1_30': Q(due_date__lt=as_of, due_date__gte=as_of - timedelta(days=30)),
+        'days_31_60': Q(due_date__lt=as_of - timedelta(days=30), due_date__gte=as_of - timedelta(days=60)),
+        'days_61_90': Q(due_date__lt=as_of - timedelta(days=60), due_date__gte=as_of - timedelta(days=90)),
+        'days_over_90': Q(due_date__lt=as_of - timedelta(days=90)),
+    }
+
+
+def bucket_totals(as_of):
+    totals = {
+        bucket: Sum(Case(
+            When(condition, then=F('total_amount')),
+            default=Value(Decimal('0')),
+            output_field=AMOUNT_FIELD,
+        ))
+        for bucket, condition in bucket_conditions(as_of).items()
+    }
+    totals['total_due'] = Sum('total_amount')
+    totals['open_documents'] = Count('id')
+    return totals
+
+
+def open_documents(user, report_type, company_id=None):
+    model, _, statuses = AGEING_SOURCES[report_type]
+    documents = model.objects.filter(created_by=user, status__in=statuses)
+    if company_id:
+        documents = documents.filter(company_id=company_id)
+    return documents
+
+
+def ageing_queryset(user, report_type, as_of, company_id=None):
+    """
+    One row per contact with its open balance split into ageing buckets
+    """
+    _, contact_field, _ = AGEING_SOURCES[report_type]
+    return open_documents(user, report_type, company_id).values(
+        contact_id=F(f'{contact_field}_id'),
+        contact_name=F(f'{contact_field}__name'),
+    ).annotate(**bucket_totals(as_of)).order_by('contact_name', 'contact_id')
+
+
+def ageing_summary(user, report_type, as_of, company_id=None):
+    """
+    Bucket totals across every contact
+    """
+    totals = open_documents(user, report_type, company_id).aggregate(**bucket_totals(as_of))
+    return ageing_amounts(totals)
+
+
+def ageing_amounts(row):
+    data = {'open_documents': row['open_documents']}
+    for bucket in BUCKETS + ['total_due']:
+        data[bucket] = float(row[bucket] or 0)
+    return data
+
+
+def ageing_row(row):
+    return {
+        'contact_id': row['contact_id'],
+        'contact_name': row['contact_name'],
+        **ageing_amounts(row),
+    }
@@ -0,0 +1,152 @@
+"""
+Write-behind product analytics counters
+
+Product views and sales are added up in memory per product and written to
+ProductAnalytics in bulk once the flush interval has passed, instead of one
+UPDATE per request. A timer flushes counts that no later request picks up,
+so a quiet process still writes them within one interval. Anything still
+buffered when a process dies is lost, which is at most one flush interval of
+counts. A failed write is logged and its counts wait for the next flush, it
+never fails the request or the checkout that triggered it.
+"""
+
+import atexit
+import logging
+import threading
+import time
+from collections import defaultdict
+from decimal import Decimal
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Case, DecimalField, ExpressionWrapper, F, Value, When
+from .models import ProductAnalytics
+
+MAX_CONVERSION_RATE = Decimal('999.99')
+
+logger = logging.getLogger(__name__)
+
+
+def _empty_counts():
+    return {'views': 0, 'sales': 0, 'revenue': Decimal('0')}
+
+
+class AnalyticsBuffer:
+    """
+    Thread-safe per-process buffer of product view and sale increments
+    """
+
+    def __init__(self, interval=None):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.counts = defaultdict(_empty_counts)
+        self.last_flush = time.monotonic()
+        self.timer = None
+
+    def flush_interval(self):
+        if self.interval is not None:
+            return self.interval
+        return getattr(settings, 'PRODUCT_ANALYTICS_FLUSH_INTERVAL', 30)
+
+    def record_view(self, product_id):
+        self._add(product_id, views=1)
+
+    def record_sale(self, product_id, quantity, revenue):
+        self._add(product_id, sales=quantity, revenue=Decimal(revenue))
+
+    def _add(self, product_id, views=0, sales=0, revenue=Decimal('0')):
+        with self.lock:
+            counts = self.counts[product_id]
+            counts['views'] += views
+            counts['sales'] += sales
+            counts['revenue'] += revenue
+            due = time.monotonic() - self.last_flush >= self.flush_interval()
+            if not due and self.timer is None:
+                self.timer = threading.Timer(self.flush_interval(), self.flush_on_timer)
+                self.timer.daemon = True
+                self.timer.start()
+        if due:
+            self.flush()
+
+    def flush_on_timer(self):
+        try:
+            self.flush()
+        finally:
+            # The timer thread's own connection, a new thread opens a new one
+            connections.close_all()
+
+    def flush(self):
+        """
+        Write buffered increments to the database and return how many products were touched
+        """
+        with self.lock:
+            counts, self.counts = self.counts, defaultdict(_empty_counts)
+            self.last_flush = time.monotonic()
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+        if not counts:
+            return 0
+
+        try:
+            write_counts(counts)
+        except Exception:
+            # Keep the increments for the next flush rather than dropping them
+            with self.lock:
+                for product_id, pending in counts.items():
+                    for field, value in pending.items():
+                        self.counts[product_id][field] += value
+            logger.exception('Could not write product analytics for %d products, keeping them for the next flush', len(counts))
+            return 0
+        return len(counts)
+
+
+def write_counts(counts):
+    """
+    Apply {product_id: {'views', 'sales', 'revenue'}} as bulk F() updates.
+    Products with identical increments share one UPDATE statement.
+    """
+    product_ids = list(counts)
+    with transaction.atomic():
+        # Rows another process created meanwhile are left alone, the updates below add to them
+        ProductAnalytics.objects.bulk_create(
+            [ProductAnalytics(product_id=product_id) for product_id in product_ids], ignore_conflicts=True
+        )
+
+        groups = defaultdict(list)
+        for product_id, pending in counts.items():
+            groups[(pending['views'], pending['sales'], pending['revenue'])].append(product_id)
+
+        for (views, sales, revenue), ids in groups.items():
+            ProductAnalytics.objects.filter(product_id__in=ids).update(
+                total_views=F('total_views') + views,
+                total_sales=F('total_sales') + sales,
+                total_revenue=F('total_revenue') + revenue,
+            )
+
+        # Conversion rate is sales per hundred views, capped to fit the column
+        rate = ExpressionWrapper(
+            F('total_sales') * Value(Decimal('100')) / F('total_views'),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        )
+        ProductAnalytics.objects.filter(product_id__in=product_ids).update(
+            conversion_rate=Case(
+                When(total_views=0, then=Value(Decimal('0'))),
+                When(total_sales__gte=F('total_views') * 10, then=Value(MAX_CONVERSION_RATE)),
+                default=rate,
+                output_field=DecimalField(max_digits=5, decimal_places=2),
+            )
+        )
+
+
+analytics_buffer = AnalyticsBuffer()
+
+# Write out whatever is left when the process shuts down cleanly
+atexit.register(analytics_buffer.flush)
+
+
+def record_product_view(product_id):
+    analytics_buffer.record_view(product_id)
+
+
+def record_product_sale(product_id, quantity, revenue):
+    analytics_buffer.record_sale(product_id, quantity, revenue)
@@ -0,0 +1,254 @@
+"""
+Report endpoint benchmarks
+
+Builds a deterministic dataset at a configurable scale and times the report
+endpoints in-process through the test client, recording latency percentiles,
+query counts and peak Python memory per endpoint. Used by the
+benchmark_reports management command.
+"""
+
+import random
+import statistics
+import time
+import tracemalloc
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from users.models import User
+from masters.models import Category, Company, Contact, Product, Tax
+from inventory.models import CustomerInvoice, Order, OrderItem, StockMovement, VendorBill
+from .leaderboards import rebuild_leaderboards
+from .rollups import rollup_sales
+
+BATCH_SIZE = 5000
+
+ORDER_STATUSES = ['pending', 'confirmed', 'shipped', 'delivered', 'cancelled']
+ORDER_STATUS_WEIGHTS = [10, 25, 20, 35, 10]
+
+MOVEMENT_TYPES = ['in', 'out', 'adjustment']
+MOVEMENT_TYPE_WEIGHTS = [45, 45, 10]
+
+BENCHMARK_ENDPOINTS = {
+    'stock_report': '/api/reports/stock/',
+    'profit_loss_report': '/api/reports/pnl/?start_date={year_ago}',
+    'dashboard_summary': '/api/reports/dashboard/',
+    'ecommerce_analytics': '/api/reports/ecommerce/',
+    'product_performance': '/api/reports/product-performance/',
+}
+
+
+def _batches(rows, size=BATCH_SIZE):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _spread_dates(model, field, days, now):
+    """
+    Spread rows over the last `days` days by id range, auto_now_add ignores given values
+    """
+    ids = list(model.objects.order_by('id').values_list('id', flat=True))
+    if not ids:
+        return
+    per_day = max(len(ids) // days, 1)
+    for day in range(days):
+        chunk = ids[day * per_day:(day + 1) * per_day] if day < days - 1 else ids[day * per_day:]
+        if not chunk:
+            break
+        model.objects.filter(id__gte=chunk[0], id__lte=chunk[-1]).update(
+            **{field: now - timedelta(days=days - 1 - day)}
+        )
+
+
+def build_dataset(products=10000, movements=1000000, orders=200000, invoices=20000,
+                  companies=5, days=365, seed=42):
+    """
+    Create a deterministic benchmark dataset and return its owner
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+    today = now.date()
+
+    user = User.objects.create_user(username='benchmark', password='benchmark')
+    company_list = Company.objects.bulk_create([
+        Company(
+            name=f'Benchmark Company {index}', address='1 Bench Street', city='Bengaluru',
+            state='Karnataka', postal_code='560001', phone='0000000000',
+            email=f'company{index}@example.com', tax_id=f'BENCH-TAX-{index:03d}', created_by=user,
+        )
+        for index in range(companies)
+    ])
+    categories = Category.objects.bulk_create([Category(name=f'Category {index}') for index in range(20)])
+    taxes = Tax.objects.bulk_create([
+        Tax(company=company, name='GST', rate=Decimal('18'), created_by=user) for company in company_list
+    ])
+    contacts = Contact.objects.bulk_create([
+        Contact(
+            company=company, contact_type='both', name=f'Contact {company.pk}-{index}',
+            email=f'contact{company.pk}-{index}@example.com', phone='0000000000', address='2 Bench Street',
+            city='Bengaluru', state='Karnataka', postal_code='560001', created_by=user,
+        )
+        for company in company_list
+        for index in range(20)
+    ])
+
+    product_rows = []
+    for batch in _batches(
+        Product(
+            company=company_list[index % companies],
+            category=categories[index % len(categories)],
+            tax=taxes[index % companies],
+            name=f'Product {index}',
+            product_type='goods',
+            sku=f'BENCH-{index:07d}',
+            unit_price=Decimal(rng.randint(1000, 100000)) / 100,
+            cost_price=Decimal(rng.randint(500, 50000)) / 100,
+            stock_quantity=rng.randint(0, 500),
+            reorder_level=rng.randint(5, 50),
+            created_by=user,
+        )
+        for index in range(products)
+    ):
+        product_rows.extend(Product.objects.bulk_create(batch))
+    product_refs = [(product.pk, product.company_id, product.unit_price) for product in product_rows]
+
+    for batch in _batches(
+        StockMovement(
+            company_id=company_id,
+            product_id=product_id,
+            movement_type=rng.choices(MOVEMENT_TYPES, MOVEMENT_TYPE_WEIGHTS)[0],
+            quantity=rng.randint(1, 50),
+            reference_type='benchmark',
+            reference_id=index,
+            created_by=user,
+        )
+        for index, (product_id, company_id, _) in ((i, rng.choice(product_refs)) for i in range(movements))
+    ):
+        StockMovement.objects.bulk_create(batch)
+
+    order_number = 0
+    for batch in _batches(range(orders)):
+        order_lines = []
+        order_objects = []
+        for _ in batch:
+            order_number += 1
+            lines = [(rng.choice(product_refs), rng.randint(1, 5)) for _ in range(rng.randint(1, 3))]
+            subtotal = sum(unit_price * quantity for (_, _, unit_price), quantity in lines)
+            tax_amount = (subtotal * Decimal('0.18')).quantize(Decimal('0.01'))
+            order_lines.append(lines)
+            order_objects.append(Order(
+                user=user,
+                order_number=f'ORD-{order_number:06d}',
+                status=rng.choices(ORDER_STATUSES, ORDER_STATUS_WEIGHTS)[0],
+                subtotal=subtotal,
+                tax_amount=tax_amount,
+                delivery_charge=Decimal('50'),
+                total_amount=subtotal + tax_amount + Decimal('50'),
+                shipping_address='3 Bench Street',
+            ))
+        created = Order.objects.bulk_create(order_objects)
+        OrderItem.objects.bulk_create(
+            [
+                OrderItem(
+                    order=order, product_id=product_id, quantity=quantity,
+                    unit_price=unit_price, total_price=unit_price * quantity,
+                )
+                for order, lines in zip(created, order_lines)
+                for (product_id, _, unit_price), quantity in lines
+            ],
+            batch_size=BATCH_SIZE,
+        )
+
+    invoice_rows, bill_rows = [], []
+    for index in range(invoices):
+        contact = rng.choice(contacts)
+        issued = today - timedelta(days=rng.randint(0, days - 1))
+        amount = Decimal(rng.randint(10000, 5000000)) / 100
+        cost = (amount * Decimal('0.7')).quantize(Decimal('0.01'))
+        invoice_rows.append(CustomerInvoice(
+            company_id=contact.company_id, customer=contact, invoice_number=f'INV-BENCH-{index:07d}',
+            invoice_date=issued, due_date=issued + timedelta(days=30),
+            status=rng.choice(['sent', 'paid', 'overdue']), subtotal=amount, total_amount=amount,
+            created_by=user,
+        ))
+        bill_rows.append(VendorBill(
+            company_id=contact.company_id, supplier=contact, bill_number=f'BILL-BENCH-{index:07d}',
+            bill_date=issued, due_date=issued + timedelta(days=30),
+            status=rng.choice(['confirmed', 'paid']), subtotal=cost, total_amount=cost,
+            created_by=user,
+        ))
+    CustomerInvoice.objects.bulk_create(invoice_rows, batch_size=BATCH_SIZE)
+    VendorBill.objects.bulk_create(bill_rows, batch_size=BATCH_SIZE)
+
+    _spread_dates(StockMovement, 'created_at', days, now)
+    _spread_dates(Order, 'created_at', days, now)
+    Order.objects.update(updated_at=now)
+
+    # bulk_create skips the signals and save() hooks, rebuild the derived tables once
+    output = StringIO()
+    call_command('rebuild_stock_balances', stdout=output)
+    call_command('rebuild_dashboard_counters', stdout=output)
+    rollup_sales(full=True)
+    rebuild_leaderboards()
+    return user
+
+
+def _percentile(samples, percent):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(percent / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def benchmark_endpoint(client, url, iterations=20, warmup=2):
+    """
+    Time one endpoint and return latency percentiles, query count and peak memory
+    """
+    for _ in range(warmup):
+        client.get(url)
+
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        response = client.get(url)
+        timings.append((time.perf_counter() - started) * 1000)
+
+    # Queries and memory are measured on a separate run so tracing does not skew the timings
+    tracemalloc.start()
+    with CaptureQueriesContext(connection) as captured:
+        client.get(url)
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'url': url,
+        'status_code': response.status_code,
+        'iterations': iterations,
+        'p50_ms': round(statistics.median(timings), 2),
+        'p95_ms': round(_percentile(timings, 95), 2),
+        'min_ms': round(min(timings), 2),
+        'max_ms': round(max(timings), 2),
+        'queries': len(captured),
+        'peak_memory_kb': round(peak_memory / 1024, 1),
+    }
+
+
+def run_benchmarks(user, iterations=20, warmup=2, endpoints=None):
+    client = APIClient()
+    client.force_authenticate(user)
+    year_ago = (timezone.now().date() - timedelta(days=365)).isoformat()
+    results = {}
+    for name, url in BENCHMARK_ENDPOINTS.items():
+        if endpoints and name not in endpoints:
+            continue
+        results[name] = benchmark_endpoint(client, url.format(year_ago=year_ago), iterations, warmup)
+    return results
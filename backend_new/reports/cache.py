@@ -0,0 +1,70 @@
+"""
+Versioned report result cache
+
+Report responses are cached under (report, user, company, params, version).
+The version lives in the database and is bumped after every commit that
+touches report data, so a cache hit can never be stale and every process
+sees the same version whichever cache backend is configured.
+"""
+
+import hashlib
+from functools import wraps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from rest_framework.response import Response
+from .models import ReportCacheVersion
+
+VERSION_NAME = 'reports'
+
+
+def current_version():
+    version = ReportCacheVersion.objects.filter(name=VERSION_NAME).values_list('version', flat=True).first()
+    return version or 0
+
+
+def bump_version():
+    if ReportCacheVersion.objects.filter(name=VERSION_NAME).update(version=F('version') + 1):
+        return
+    try:
+        with transaction.atomic():
+            ReportCacheVersion.objects.create(name=VERSION_NAME)
+    except IntegrityError:
+        ReportCacheVersion.objects.filter(name=VERSION_NAME).update(version=F('version') + 1)
+
+
+def invalidate_reports():
+    """
+    Bump the version once the current transaction commits
+    """
+    transaction.on_commit(bump_version)
+
+
+def cache_key(report, request, version):
+    params = '&'.join(f'{key}={value}' for key, value in sorted(request.GET.items()))
+    # Today's date is part of the key because default date windows move with it
+    raw = f'{report}|{request.user.pk}|{request.GET.get("company_id", "")}|{params}|{timezone.now().date()}'
+    digest = hashlib.md5(raw.encode()).hexdigest()
+    return f'report:{report}:v{version}:{digest}'
+
+
+def cached_report(report):
+    """
+    Cache successful responses of a report view
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            key = cache_key(report, request, current_version())
+            data = cache.get(key)
+            if data is not None:
+                return Response(data)
+
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200:
+                cache.set(key, response.data, getattr(settings, 'REPORT_CACHE_TIMEOUT', 3600))
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,113 @@
+"""
+Consolidated multi-company reports
+
+Each company's figures are computed in parallel on a bounded thread pool.
+Every worker thread gets its own database connection from Django, which is
+closed when its task finishes. The per-company results are merged into group
+totals, so the wall-clock time follows the slowest company rather than the
+sum of all of them.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+from masters.models import Company
+from .profit_loss import profit_loss_data, profit_loss_summary
+from .stock import stock_totals
+
+
+def parse_company_ids(value):
+    """
+    Parse a comma separated company_ids parameter. Raises ValueError on bad input.
+    """
+    if not value:
+        return None
+    return [int(company_id) for company_id in value.split(',') if company_id.strip()]
+
+
+def group_companies(user, company_ids=None):
+    companies = Company.objects.filter(created_by=user)
+    if company_ids:
+        companies = companies.filter(id__in=company_ids)
+    return list(companies.order_by('id').values('id', 'name'))
+
+
+def _run_for_company(runner, company_id):
+    try:
+        return runner(company_id)
+    finally:
+        # Worker threads open their own connection, do not leave it behind
+        connections.close_all()
+
+
+def fan_out(companies, runner):
+    """
+    Run runner(company_id) for every company on the pool and return the results in order
+    """
+    if not companies:
+        return []
+    workers = min(getattr(settings, 'REPORT_CONSOLIDATION_WORKERS', 4), len(companies))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(lambda company: _run_for_company(runner, company['id']), companies))
+
+
+def consolidated_stock(user, company_ids=None):
+    companies = group_companies(user, company_ids)
+    results = fan_out(companies, lambda company_id: stock_totals(user, company_id))
+
+    subtotals = [
+        {'company_id': company['id'], 'company_name': company['name'], **totals}
+        for company, totals in zip(companies, results)
+    ]
+    fields = ['total_products', 'stock_in', 'stock_out', 'adjustments', 'reserved_stock',
+              'available_stock', 'stock_value']
+    return {
+        'report_type': 'Consolidated Stock Report',
+        'generated_at': timezone.now(),
+        'total_companies': len(companies),
+        'summary': {field: sum(row[field] for row in subtotals) for field in fields},
+        'companies': subtotals,
+    }
+
+
+def merge_series(company_series):
+    """
+    Sum per-company P&L series bucket by bucket, they all share the same buckets
+    """
+    merged = []
+    for buckets in zip(*company_series):
+        merged.append({
+            'period_start': buckets[0]['period_start'],
+            'label': buckets[0]['label'],
+            'sales': sum(bucket['sales'] for bucket in buckets),
+            'purchases': sum(bucket['purchases'] for bucket in buckets),
+            'gross_profit': sum(bucket['gross_profit'] for bucket in buckets),
+        })
+    return merged
+
+
+def consolidated_profit_loss(user, start_date, end_date, company_ids=None, granularity=None):
+    companies = group_companies(user, company_ids)
+    results = fan_out(
+        companies,
+        lambda company_id: profit_loss_data(user, start_date, end_date, company_id, granularity)
+    )
+
+    total_sales = sum(result['summary']['total_sales'] for result in results)
+    total_purchases = sum(result['summary']['total_purchases'] for result in results)
+    data = {
+        'report_type': 'Consolidated Profit & Loss Report',
+        'period': f"{start_date} to {end_date}",
+        'generated_at': timezone.now(),
+        'total_companies': len(companies),
+        'summary': profit_loss_summary(total_sales, total_purchases),
+        'companies': [
+            {'company_id': company['id'], 'company_name': company['name'], **result['summary']}
+            for company, result in zip(companies, results)
+        ],
+    }
+    if granularity:
+        data['granularity'] = granularity
+        data['series'] = merge_series([result['series'] for result in results])
+    return data
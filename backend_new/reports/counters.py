@@ -0,0 +1,144 @@
+"""
+Dashboard counters
+
+Keeps DashboardCounter rows in step with record creation and deletion so the
+dashboard reads one row per company instead of counting every table. A record
+whose owner, company or contact type changes is moved to its new counters.
+"""
+
+import copy
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db.models import DecimalField, F, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from masters.models import Company, Contact, Product
+from inventory.models import CustomerInvoice, PurchaseOrder, SalesOrder, VendorBill
+from .models import DashboardCounter
+
+CUSTOMER_TYPES = ['customer', 'both']
+SUPPLIER_TYPES = ['supplier', 'both']
+
+COUNTER_FIELDS = [
+    'total_companies', 'total_products', 'total_customers', 'total_suppliers',
+    'total_purchase_orders', 'total_sales_orders', 'total_bills', 'total_invoices',
+]
+
+COMPANY_SCOPED_FIELDS = ['total_purchase_orders', 'total_sales_orders', 'total_bills', 'total_invoices']
+
+# Fields that decide which counters a record is in
+COUNTER_STATE_FIELDS = ['created_by_id', 'company_id', 'contact_type']
+
+# Model -> counter field for models that count once per row
+MODEL_COUNTERS = {
+    Product: 'total_products',
+    PurchaseOrder: 'total_purchase_orders',
+    SalesOrder: 'total_sales_orders',
+    VendorBill: 'total_bills',
+    CustomerInvoice: 'total_invoices',
+}
+
+
+def counter_fields(instance):
+    """
+    Counter fields a record contributes to
+    """
+    if isinstance(instance, Company):
+        return ['total_companies']
+    if isinstance(instance, Contact):
+        fields = []
+        if instance.contact_type in CUSTOMER_TYPES:
+            fields.append('total_customers')
+        if instance.contact_type in SUPPLIER_TYPES:
+            fields.append('total_suppliers')
+        return fields
+    return [MODEL_COUNTERS[type(instance)]]
+
+
+def counter_key(instance):
+    company_id = instance.pk if isinstance(instance, Company) else instance.company_id
+    return instance.created_by_id, company_id
+
+
+def counter_state(instance):
+    """
+    The saved values that place a record in its counters, see counted_as()
+    """
+    # Read from __dict__ so deferred fields are not fetched
+    return {name: instance.__dict__[name] for name in COUNTER_STATE_FIELDS if name in instance.__dict__}
+
+
+def counted_as(instance, state):
+    """
+    Copy of the record with the counter_state() it was counted with
+    """
+    previous = copy.copy(instance)
+    previous.__dict__.update(state)
+    return previous
+
+
+def move_counters(instance, state):
+    """
+    Move a saved record from the counters it was counted in under state to its current ones
+    """
+    previous = counted_as(instance, state)
+    if (counter_key(previous), counter_fields(previous)) == (counter_key(instance), counter_fields(instance)):
+        return
+    apply_counter_delta(previous, -1)
+    apply_counter_delta(instance, 1)
+
+
+def apply_counter_delta(instance, delta):
+    fields = counter_fields(instance)
+    if not fields:
+        return
+
+    user_id, company_id = counter_key(instance)
+    counters = DashboardCounter.objects.filter(user_id=user_id, company_id=company_id)
+    updates = {field: F(field) + delta for field in fields}
+    if counters.update(updated_at=timezone.now(), **updates) or delta < 0:
+        # Nothing to decrement when the row is already gone with its company
+        return
+
+    try:
+        with transaction.atomic():
+            DashboardCounter.objects.create(
+                user_id=user_id,
+                company_id=company_id,
+                **{field: delta for field in fields}
+            )
+    except IntegrityError:
+        counters.update(**updates)
+
+
+def dashboard_counts(user, company_id=None):
+    """
+    Sum the user's counter rows, transaction counts limited to company_id when given
+    """
+    company_filter = Q(company_id=company_id) if company_id else None
+    totals = {}
+    for field in COUNTER_FIELDS:
+        # Master data counts stay user-wide, like the dashboard always showed them
+        scope = company_filter if field in COMPANY_SCOPED_FIELDS else None
+        totals[field] = Coalesce(Sum(field, filter=scope), 0)
+    return DashboardCounter.objects.filter(user=user).aggregate(**totals)
+
+
+def _paid_total(model, date_field, user, start_date, company_id):
+    paid = model.objects.filter(created_by=user, status='paid', **{f'{date_field}__gte': start_date})
+    if company_id:
+        paid = paid.filter(company_id=company_id)
+    paid = paid.values('created_by').annotate(total=Sum('total_amount')).values('total')
+    return Coalesce(Subquery(paid), Value(Decimal('0')), output_field=DecimalField())
+
+
+def paid_since(user, start_date, company_id=None):
+    """
+    Paid (sales, purchases) totals from start_date onwards, both read in one query
+    """
+    totals = get_user_model().objects.filter(pk=user.pk).annotate(
+        sales=_paid_total(CustomerInvoice, 'invoice_date', user, start_date, company_id),
+        purchases=_paid_total(VendorBill, 'bill_date', user, start_date, company_id),
+    ).values('sales', 'purchases').get()
+    return totals['sales'], totals['purchases']
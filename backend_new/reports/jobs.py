@@ -0,0 +1,119 @@
+"""
+Background report jobs
+
+Report requests are stored as ReportJob rows and executed by
+`manage.py run_report_worker` processes, so heavy aggregation never runs
+inside a web request. A job left running longer than REPORT_JOB_TIMEOUT lost
+its worker, it is queued again until it has run REPORT_JOB_MAX_ATTEMPTS times.
+"""
+
+import csv
+import io
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+from .models import ReportJob
+from .profit_loss import profit_loss_data, report_period
+from .stock import stock_report_data
+from .timeseries import GRANULARITIES
+
+
+def run_stock(job):
+    params = job.params
+    as_of = params.get('as_of')
+    if as_of:
+        as_of = datetime.strptime(as_of, '%Y-%m-%d').date()
+    return stock_report_data(
+        job.user,
+        company_id=params.get('company_id'),
+        ordering=params.get('ordering'),
+        as_of=as_of,
+    )
+
+
+def run_profit_loss(job):
+    params = job.params
+    start_date, end_date = report_period(params.get('start_date'), params.get('end_date'))
+    granularity = params.get('granularity')
+    if granularity and granularity not in GRANULARITIES:
+        raise ValueError(f'Unknown granularity: {granularity}')
+    return profit_loss_data(job.user, start_date, end_date, params.get('company_id'), granularity)
+
+
+REPORT_RUNNERS = {
+    'stock': run_stock,
+    'pnl': run_profit_loss,
+}
+
+
+def recover_stale_jobs():
+    """
+    Queue running jobs whose worker stopped again, or fail them after their last attempt
+    """
+    stale = ReportJob.objects.filter(
+        status='running',
+        started_at__lt=timezone.now() - timedelta(seconds=getattr(settings, 'REPORT_JOB_TIMEOUT', 10 * 60)),
+    )
+    max_attempts = getattr(settings, 'REPORT_JOB_MAX_ATTEMPTS', 3)
+    failed = stale.filter(attempts__gte=max_attempts).update(
+        status='failed',
+        error=f'Timed out after {max_attempts} attempts',
+        finished_at=timezone.now(),
+    )
+    return stale.update(status='queued', started_at=None) + failed
+
+
+def claim_next_job():
+    """
+    Atomically move the oldest queued job to running, safe with many workers
+    """
+    recover_stale_jobs()
+    candidates = ReportJob.objects.filter(status='queued').order_by('created_at').values_list('id', flat=True)[:10]
+    for job_id in candidates:
+        claimed = ReportJob.objects.filter(id=job_id, status='queued').update(
+            status='running',
+            started_at=timezone.now(),
+            attempts=F('attempts') + 1
+        )
+        if claimed:
+            return ReportJob.objects.select_related('user').get(id=job_id)
+    return None
+
+
+def run_job(job):
+    try:
+        job.result = REPORT_RUNNERS[job.report_type](job)
+        job.status = 'completed'
+    except Exception as e:
+        job.error = str(e)
+        job.status = 'failed'
+    job.finished_at = timezone.now()
+    # A job that timed out was taken over by another worker, that one records the outcome
+    ReportJob.objects.filter(pk=job.pk, status='running', started_at=job.started_at).update(
+        result=job.result, status=job.status, error=job.error, finished_at=job.finished_at
+    )
+    return job
+
+
+def result_rows(result):
+    """
+    Flat rows for CSV export, the detail rows when there are any else the summary
+    """
+    if result.get('data'):
+        return result['data']
+    if result.get('series'):
+        return result['series']
+    if result.get('summary'):
+        return [result['summary']]
+    return []
+
+
+def result_csv(result):
+    rows = result_rows(result)
+    output = io.StringIO()
+    if rows:
+        writer = csv.DictWriter(output, fieldnames=list(rows[0].keys()))
+        writer.writeheader()
+        writer.writerows(rows)
+    return output.getvalue()
@@ -0,0 +1,229 @@
+"""
+Product and category sales leaderboards
+
+LeaderboardEntry rows hold running totals per product / category for the
+all-time window and the rolling 7, 30 and 90 day windows. They are adjusted
+when an order moves into or out of a revenue status, and per item when the
+items of an order in a revenue status change, so top-N reads are an
+indexed ORDER BY ... LIMIT instead of a scan over every order item.
+Per-day totals in LeaderboardDay let the rolling windows drop days that
+have aged out (see refresh_windows).
+"""
+
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from inventory.models import OrderItem
+from masters.models import Product
+from .models import LeaderboardDay, LeaderboardEntry
+from .rollups import REVENUE_STATUSES
+
+WINDOW_DAYS = {
+    '7d': 7,
+    '30d': 30,
+    '90d': 90,
+}
+
+WINDOWS = ['all', *WINDOW_DAYS]
+
+LINE_FIELDS = ['product_id', 'product__name', 'product__category_id', 'product__category__name']
+
+
+def window_start(window, today):
+    return today - timedelta(days=WINDOW_DAYS[window] - 1)
+
+
+def windows_for_day(day, today=None):
+    """
+    Windows an order placed on the given day currently counts towards
+    """
+    today = today or timezone.localdate()
+    return ['all'] + [window for window in WINDOW_DAYS if day >= window_start(window, today)]
+
+
+def leaderboard_lines(rows):
+    """
+    Turn item rows grouped by product into (dimension, item_id) -> line totals
+    """
+    lines = {}
+    for row in rows:
+        product_key = ('product', row['product_id'])
+        lines[product_key] = {
+            'name': row['product__name'],
+            'category_name': row['product__category__name'] or '',
+            'total_quantity': row['quantity'],
+            'total_revenue': row['revenue'] or Decimal('0'),
+        }
+        if row['product__category_id'] is None:
+            continue
+        category = lines.setdefault(('category', row['product__category_id']), {
+            'name': row['product__category__name'],
+            'category_name': '',
+            'total_quantity': 0,
+            'total_revenue': Decimal('0'),
+        })
+        category['total_quantity'] += row['quantity']
+        category['total_revenue'] += row['revenue'] or Decimal('0')
+    return lines
+
+
+def _increment(model, lookup, line, sign):
+    rows = model.objects.filter(**lookup)
+    quantity = sign * line['total_quantity']
+    revenue = sign * line['total_revenue']
+    updates = {
+        'total_quantity': F('total_quantity') + quantity,
+        'total_revenue': F('total_revenue') + revenue,
+    }
+    if rows.update(**updates) or sign < 0:
+        return
+
+    try:
+        with transaction.atomic():
+            model.objects.create(
+                name=line['name'],
+                category_name=line['category_name'],
+                total_quantity=quantity,
+                total_revenue=revenue,
+                **lookup
+            )
+    except IntegrityError:
+        rows.update(**updates)
+
+
+def _apply_rows(ordered_at, rows, sign):
+    day = timezone.localdate(ordered_at)
+    windows = windows_for_day(day)
+    for (dimension, item_id), line in leaderboard_lines(rows).items():
+        _increment(LeaderboardDay, {'day': day, 'dimension': dimension, 'item_id': item_id}, line, sign)
+        for window in windows:
+            _increment(LeaderboardEntry, {'dimension': dimension, 'window': window, 'item_id': item_id}, line, sign)
+
+
+def apply_order(order, sign=1):
+    """
+    Add (sign=1) or remove (sign=-1) an order's items from the leaderboards
+    """
+    rows = OrderItem.objects.filter(order_id=order.pk).values(*LINE_FIELDS).annotate(
+        quantity=Sum('quantity'),
+        revenue=Sum('total_price'),
+    ).order_by()
+    _apply_rows(order.created_at, rows, sign)
+
+
+def apply_item(product_id, quantity, revenue, ordered_at, sign=1):
+    """
+    Add or remove one item of an order that is already counted
+    """
+    product = Product.objects.filter(pk=product_id).values('name', 'category_id', 'category__name').first()
+    if product is None:
+        return
+    _apply_rows(ordered_at, [{
+        'product_id': product_id,
+        'product__name': product['name'],
+        'product__category_id': product['category_id'],
+        'product__category__name': product['category__name'],
+        'quantity': quantity,
+        'revenue': revenue,
+    }], sign)
+
+
+def _window_entries(window, day_rows):
+    """
+    Sum LeaderboardDay rows into LeaderboardEntry objects for one window
+    """
+    totals = defaultdict(lambda: {'total_quantity': 0, 'total_revenue': Decimal('0')})
+    names = {}
+    for row in day_rows:
+        key = (row['dimension'], row['item_id'])
+        totals[key]['total_quantity'] += row['total_quantity']
+        totals[key]['total_revenue'] += row['total_revenue']
+        names[key] = (row['name'], row['category_name'])
+    return [
+        LeaderboardEntry(
+            dimension=dimension,
+            window=window,
+            item_id=item_id,
+            name=names[(dimension, item_id)][0],
+            category_name=names[(dimension, item_id)][1],
+            **values
+        )
+        for (dimension, item_id), values in totals.items()
+        if values['total_quantity'] > 0
+    ]
+
+
+def refresh_windows(today=None, batch_size=1000):
+    """
+    Rebuild the rolling windows from the per-day totals so aged-out days drop off.
+    Meant to run once a day, it only reads the last 90 days of LeaderboardDay rows.
+    """
+    today = today or timezone.localdate()
+    earliest = window_start(max(WINDOW_DAYS, key=WINDOW_DAYS.get), today)
+    day_rows = list(LeaderboardDay.objects.filter(day__gte=earliest).values(
+        'day', 'dimension', 'item_id', 'name', 'category_name', 'total_quantity', 'total_revenue'
+    ))
+
+    with transaction.atomic():
+        LeaderboardEntry.objects.filter(window__in=list(WINDOW_DAYS)).delete()
+        for window in WINDOW_DAYS:
+            start = window_start(window, today)
+            LeaderboardEntry.objects.bulk_create(
+                _window_entries(window, [row for row in day_rows if row['day'] >= start]),
+                batch_size=batch_size,
+            )
+    return len(day_rows)
+
+
+def rebuild_leaderboards(batch_size=1000):
+    """
+    Recompute every leaderboard row from the order items
+    """
+    rows = OrderItem.objects.filter(order__status__in=REVENUE_STATUSES).annotate(
+        day=TruncDate('order__created_at')
+    ).values('day', *LINE_FIELDS).annotate(
+        quantity=Sum('quantity'),
+        revenue=Sum('total_price'),
+    ).order_by()
+
+    by_day = defaultdict(list)
+    for row in rows:
+        by_day[row['day']].append(row)
+
+    days = [
+        LeaderboardDay(day=day, dimension=dimension, item_id=item_id, **line)
+        for day, day_items in by_day.items()
+        for (dimension, item_id), line in leaderboard_lines(day_items).items()
+    ]
+
+    with transaction.atomic():
+        LeaderboardDay.objects.all().delete()
+        LeaderboardDay.objects.bulk_create(days, batch_size=batch_size)
+        LeaderboardEntry.objects.filter(window='all').delete()
+        LeaderboardEntry.objects.bulk_create(
+            _window_entries('all', [
+                {
+                    'dimension': day.dimension,
+                    'item_id': day.item_id,
+                    'name': day.name,
+                    'category_name': day.category_name,
+                    'total_quantity': day.total_quantity,
+                    'total_revenue': day.total_revenue,
+                }
+                for day in days
+            ]),
+            batch_size=batch_size,
+        )
+        refresh_windows(batch_size=batch_size)
+    return len(days)
+
+
+def top_entries(dimension, window='all', limit=None):
+    entries = LeaderboardEntry.objects.filter(
+        dimension=dimension, window=window, total_quantity__gt=0
+    ).order_by('-total_quantity', 'item_id')
+    return entries[:limit] if limit else entries
@@ -0,0 +1,96 @@
+import json
+import platform
+import subprocess
+import django
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from django.utils import timezone
+from reports.benchmark import BENCHMARK_ENDPOINTS, build_dataset, run_benchmarks
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the report endpoints on a generated dataset in a throwaway test database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=10000)
+        parser.add_argument('--movements', type=int, default=1000000)
+        parser.add_argument('--orders', type=int, default=200000)
+        parser.add_argument('--invoices', type=int, default=20000)
+        parser.add_argument('--companies', type=int, default=5)
+        parser.add_argument('--days', type=int, default=365, help='Days of history to spread rows over')
+        parser.add_argument(
+            '--scale',
+            type=float,
+            default=1.0,
+            help='Multiplier applied to every row count, e.g. 0.01 for a quick run',
+        )
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument(
+            '--endpoint',
+            action='append',
+            choices=list(BENCHMARK_ENDPOINTS),
+            help='Only benchmark this endpoint, can be repeated',
+        )
+        parser.add_argument('--cached', action='store_true', help='Keep the report cache enabled')
+        parser.add_argument('--output', help='Write the JSON results to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        scale = options['scale']
+        sizes = {
+            name: max(1, int(options[name] * scale))
+            for name in ['products', 'movements', 'orders', 'invoices']
+        }
+        caches = None if options['cached'] else {
+            'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+        }
+
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            self.stderr.write(f'Building dataset: {sizes}')
+            user = build_dataset(
+                companies=options['companies'], days=options['days'], seed=options['seed'], **sizes
+            )
+            self.stderr.write('Running benchmarks')
+            with override_settings(**({'CACHES': caches} if caches else {})):
+                results = run_benchmarks(
+                    user,
+                    iterations=options['iterations'],
+                    warmup=options['warmup'],
+                    endpoints=options['endpoint'],
+                )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        report = {
+            'generated_at': timezone.now().isoformat(),
+            'commit': _git_commit(),
+            'django': django.get_version(),
+            'python': platform.python_version(),
+            'database': connection.vendor,
+            'dataset': {**sizes, 'companies': options['companies'], 'days': options['days'],
+                        'seed': options['seed']},
+            'cached': options['cached'],
+            'endpoints': results,
+        }
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                handle.write(output + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Wrote benchmark results to {options['output']}"))
+        else:
+            self.stdout.write(output)
@@ -0,0 +1,40 @@
+from collections import defaultdict
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Q
+from masters.models import Company, Contact
+from reports.counters import CUSTOMER_TYPES, MODEL_COUNTERS, SUPPLIER_TYPES
+from reports.models import DashboardCounter
+
+
+class Command(BaseCommand):
+    help = 'Recount DashboardCounter rows from the source tables'
+
+    def handle(self, *args, **options):
+        counters = defaultdict(dict)
+
+        for row in Company.objects.values('created_by_id', 'id'):
+            counters[(row['created_by_id'], row['id'])]['total_companies'] = 1
+
+        contacts = Contact.objects.values('created_by_id', 'company_id').annotate(
+            total_customers=Count('id', filter=Q(contact_type__in=CUSTOMER_TYPES)),
+            total_suppliers=Count('id', filter=Q(contact_type__in=SUPPLIER_TYPES)),
+        )
+        for row in contacts:
+            counters[(row['created_by_id'], row['company_id'])].update(
+                total_customers=row['total_customers'],
+                total_suppliers=row['total_suppliers'],
+            )
+
+        for model, field in MODEL_COUNTERS.items():
+            for row in model.objects.values('created_by_id', 'company_id').annotate(total=Count('id')):
+                counters[(row['created_by_id'], row['company_id'])][field] = row['total']
+
+        with transaction.atomic():
+            DashboardCounter.objects.all().delete()
+            DashboardCounter.objects.bulk_create([
+                DashboardCounter(user_id=user_id, company_id=company_id, **values)
+                for (user_id, company_id), values in counters.items()
+            ], batch_size=1000)
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {len(counters)} dashboard counter rows'))
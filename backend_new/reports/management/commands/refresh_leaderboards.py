@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from reports.leaderboards import rebuild_leaderboards, refresh_windows
+
+
+class Command(BaseCommand):
+    help = 'Roll the 7/30/90 day sales leaderboards forward, run once a day'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Rebuild every leaderboard, all-time included, from the order items',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if options['full']:
+            count = rebuild_leaderboards(batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt leaderboards from {count} daily totals'))
+        else:
+            count = refresh_windows(batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Refreshed rolling leaderboards from {count} daily totals'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from reports.rollups import rollup_sales
+
+
+class Command(BaseCommand):
+    help = 'Refresh daily SalesReport rollups for days whose orders changed'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Recompute every order day instead of only the changed ones',
+        )
+
+    def handle(self, *args, **options):
+        count = rollup_sales(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(f'Refreshed {count} daily sales reports'))
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0002_productanalytics_is_active_salesreport_is_active'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='salesreport',
+            name='refreshed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='salesreport',
+            name='report_date',
+            field=models.DateField(unique=True),
+        ),
+        migrations.CreateModel(
+            name='SalesReportBreakdown',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(choices=[('category', 'Category'), ('product', 'Product')], max_length=20)),
+                ('name', models.CharField(max_length=200)),
+                ('total_quantity', models.IntegerField(default=0)),
+                ('total_revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('sales_report', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='breakdown', to='reports.salesreport')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['dimension', 'sales_report'], name='reports_sal_dimensi_1fe931_idx')],
+            },
+        ),
+    ]
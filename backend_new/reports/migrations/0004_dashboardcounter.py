@@ -0,0 +1,77 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:49
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def fill_dashboard_counters(apps, schema_editor):
+    """
+    Count the records that already exist, the signals only count new ones
+    """
+    DashboardCounter = apps.get_model('reports', 'DashboardCounter')
+    counters = {}
+
+    def counter(user_id, company_id):
+        return counters.setdefault((user_id, company_id), DashboardCounter(user_id=user_id, company_id=company_id))
+
+    for row in apps.get_model('masters', 'Company').objects.values('created_by_id', 'id'):
+        counter(row['created_by_id'], row['id']).total_companies = 1
+
+    contacts = apps.get_model('masters', 'Contact').objects.values('created_by_id', 'company_id').annotate(
+        customers=Count('id', filter=Q(contact_type__in=['customer', 'both'])),
+        suppliers=Count('id', filter=Q(contact_type__in=['supplier', 'both'])),
+    )
+    for row in contacts:
+        row_counter = counter(row['created_by_id'], row['company_id'])
+        row_counter.total_customers = row['customers']
+        row_counter.total_suppliers = row['suppliers']
+
+    counted = [
+        ('masters', 'Product', 'total_products'),
+        ('inventory', 'PurchaseOrder', 'total_purchase_orders'),
+        ('inventory', 'SalesOrder', 'total_sales_orders'),
+        ('inventory', 'VendorBill', 'total_bills'),
+        ('inventory', 'CustomerInvoice', 'total_invoices'),
+    ]
+    for app_label, model_name, field in counted:
+        rows = apps.get_model(app_label, model_name).objects.values('created_by_id', 'company_id').annotate(total=Count('id'))
+        for row in rows:
+            setattr(counter(row['created_by_id'], row['company_id']), field, row['total'])
+
+    DashboardCounter.objects.bulk_create(counters.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('masters', '0005_sellerinvoice_is_active_sellerproduct_is_active_and_more'),
+        ('reports', '0003_salesreport_refreshed_at_and_more'),
+        ('inventory', '0003_customerinvoice_is_active_purchaseorder_is_active_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DashboardCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_companies', models.IntegerField(default=0)),
+                ('total_products', models.IntegerField(default=0)),
+                ('total_customers', models.IntegerField(default=0)),
+                ('total_suppliers', models.IntegerField(default=0)),
+                ('total_purchase_orders', models.IntegerField(default=0)),
+                ('total_sales_orders', models.IntegerField(default=0)),
+                ('total_bills', models.IntegerField(default=0)),
+                ('total_invoices', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='dashboard_counters', to='masters.company')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='dashboard_counters', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'company')},
+            },
+        ),
+        migrations.RunPython(fill_dashboard_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0006_reportjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('dimension', models.CharField(choices=[('category', 'Category'), ('product', 'Product')], max_length=20)),
+                ('item_id', models.IntegerField()),
+                ('name', models.CharField(max_length=200)),
+                ('category_name', models.CharField(blank=True, max_length=100)),
+                ('total_quantity', models.IntegerField(default=0)),
+                ('total_revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'unique_together': {('day', 'dimension', 'item_id')},
+            },
+        ),
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(choices=[('category', 'Category'), ('product', 'Product')], max_length=20)),
+                ('window', models.CharField(choices=[('all', 'All time'), ('7d', 'Last 7 days'), ('30d', 'Last 30 days'), ('90d', 'Last 90 days')], max_length=10)),
+                ('item_id', models.IntegerField()),
+                ('name', models.CharField(max_length=200)),
+                ('category_name', models.CharField(blank=True, max_length=100)),
+                ('total_quantity', models.IntegerField(default=0)),
+                ('total_revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['dimension', 'window', '-total_quantity', 'item_id'], name='reports_lea_dimensi_3fdb2d_idx')],
+                'unique_together': {('dimension', 'window', 'item_id')},
+            },
+        ),
+    ]
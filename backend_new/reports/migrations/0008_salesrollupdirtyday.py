@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0007_leaderboardday_leaderboardentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesRollupDirtyDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(unique=True)),
+                ('marked_at', models.DateTimeField()),
+            ],
+        ),
+    ]
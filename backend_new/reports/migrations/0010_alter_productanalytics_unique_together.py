@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:40
+
+from decimal import Decimal
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def merge_duplicate_analytics(apps, schema_editor):
+    """
+    Fold the rows that concurrent flushes created for the same product into one
+    """
+    ProductAnalytics = apps.get_model('reports', 'ProductAnalytics')
+    duplicated = ProductAnalytics.objects.values('product_id').annotate(rows=Count('id'), keep=Min('id')).filter(rows__gt=1)
+    for row in duplicated:
+        rows = list(ProductAnalytics.objects.filter(product_id=row['product_id']))
+        kept = next(analytics for analytics in rows if analytics.pk == row['keep'])
+        kept.total_views = sum(analytics.total_views for analytics in rows)
+        kept.total_sales = sum(analytics.total_sales for analytics in rows)
+        kept.total_revenue = sum((analytics.total_revenue for analytics in rows), Decimal('0'))
+        kept.conversion_rate = (
+            min(Decimal(kept.total_sales * 100) / kept.total_views, Decimal('999.99')).quantize(Decimal('0.01'))
+            if kept.total_views else Decimal('0')
+        )
+        kept.save()
+        ProductAnalytics.objects.filter(product_id=row['product_id']).exclude(pk=kept.pk).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('masters', '0007_documentsequence'),
+        ('reports', '0009_reportjob_attempts'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_analytics, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='productanalytics',
+            unique_together={('product',)},
+        ),
+    ]
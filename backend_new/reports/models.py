@@ -1,12 +1,13 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.contrib.auth import get_user_model
-from masters.models import Product, Category
+from masters.models import Company, Product, Category
 from inventory.models import Order
 
 User = get_user_model()
 
 class SalesReport(models.Model):
-    report_date = models.DateField()
+    report_date = models.DateField(unique=True)
     total_orders = models.IntegerField(default=0)
     total_revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     total_commission = models.DecimalField(max_digits=12, decimal_places=2, default=0)
@@ -14,11 +15,44 @@ class SalesReport(models.Model):
     top_selling_category = models.CharField(max_length=100, blank=True)
     top_selling_product = models.CharField(max_length=200, blank=True)
     is_active = models.BooleanField(default=True)
+    refreshed_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
         return f"Sales Report - {self.report_date}"
 
+class SalesRollupDirtyDay(models.Model):
+    """
+    An order day whose SalesReport must be recomputed on the next rollup run.
+    Written when orders are deleted or their items edited or deleted, changes
+    that leave no updated_at behind. See reports.rollups.
+    """
+    day = models.DateField(unique=True)
+    marked_at = models.DateTimeField()
+    
+    def __str__(self):
+        return f"Dirty sales day {self.day}"
+
+class SalesReportBreakdown(models.Model):
+    DIMENSION_CHOICES = [
+        ('category', 'Category'),
+        ('product', 'Product'),
+    ]
+    
+    sales_report = models.ForeignKey(SalesReport, on_delete=models.CASCADE, related_name='breakdown')
+    dimension = models.CharField(max_length=20, choices=DIMENSION_CHOICES)
+    name = models.CharField(max_length=200)
+    total_quantity = models.IntegerField(default=0)
+    total_revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['dimension', 'sales_report']),
+        ]
+    
+    def __str__(self):
+        return f"{self.sales_report.report_date} - {self.name} ({self.dimension})"
+
 class ProductAnalytics(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='analytics')
     total_views = models.IntegerField(default=0)
@@ -28,5 +62,126 @@ class ProductAnalytics(models.Model):
     is_active = models.BooleanField(default=True)
     last_updated = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        # One row per product, flushes from several processes add to it
+        unique_together = ['product']
+    
     def __str__(self):
         return f"Analytics - {self.product.name}"
+
+class DashboardCounter(models.Model):
+    """
+    Per-user, per-company record counts kept current by model signals
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='dashboard_counters')
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='dashboard_counters')
+    total_companies = models.IntegerField(default=0)
+    total_products = models.IntegerField(default=0)
+    total_customers = models.IntegerField(default=0)
+    total_suppliers = models.IntegerField(default=0)
+    total_purchase_orders = models.IntegerField(default=0)
+    total_sales_orders = models.IntegerField(default=0)
+    total_bills = models.IntegerField(default=0)
+    total_invoices = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ['user', 'company']
+    
+    def __str__(self):
+        return f"Dashboard counters - {self.user.username} / {self.company.name}"
+
+class ReportCacheVersion(models.Model):
+    """
+    Version counter for cached report results, bumped whenever report data changes
+    """
+    name = models.CharField(max_length=50, unique=True)
+    version = models.BigIntegerField(default=1)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.name} v{self.version}"
+
+class ReportJob(models.Model):
+    REPORT_TYPE_CHOICES = [
+        ('stock', 'Stock Report'),
+        ('pnl', 'Profit & Loss Report'),
+    ]
+    
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='report_jobs')
+    report_type = models.CharField(max_length=30, choices=REPORT_TYPE_CHOICES)
+    params = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    result = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    error = models.TextField(blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_report_type_display()} job #{self.id} ({self.status})"
+
+class LeaderboardEntry(models.Model):
+    """
+    Running sales totals of one product or category over a leaderboard window
+    """
+    DIMENSION_CHOICES = [
+        ('category', 'Category'),
+        ('product', 'Product'),
+    ]
+    
+    WINDOW_CHOICES = [
+        ('all', 'All time'),
+        ('7d', 'Last 7 days'),
+        ('30d', 'Last 30 days'),
+        ('90d', 'Last 90 days'),
+    ]
+    
+    dimension = models.CharField(max_length=20, choices=DIMENSION_CHOICES)
+    window = models.CharField(max_length=10, choices=WINDOW_CHOICES)
+    item_id = models.IntegerField()
+    name = models.CharField(max_length=200)
+    category_name = models.CharField(max_length=100, blank=True)
+    total_quantity = models.IntegerField(default=0)
+    total_revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ['dimension', 'window', 'item_id']
+        indexes = [
+            models.Index(fields=['dimension', 'window', '-total_quantity', 'item_id']),
+        ]
+    
+    def __str__(self):
+        return f"{self.name} ({self.dimension}, {self.window}) - {self.total_quantity}"
+
+class LeaderboardDay(models.Model):
+    """
+    Per-day sales of one product or category, used to roll the windows forward
+    """
+    day = models.DateField()
+    dimension = models.CharField(max_length=20, choices=LeaderboardEntry.DIMENSION_CHOICES)
+    item_id = models.IntegerField()
+    name = models.CharField(max_length=200)
+    category_name = models.CharField(max_length=100, blank=True)
+    total_quantity = models.IntegerField(default=0)
+    total_revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    
+    class Meta:
+        unique_together = ['day', 'dimension', 'item_id']
+    
+    def __str__(self):
+        return f"{self.day} - {self.name} ({self.dimension})"
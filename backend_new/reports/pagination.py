@@ -0,0 +1,22 @@
+from rest_framework.pagination import PageNumberPagination
+
+
+class ReportPagination(PageNumberPagination):
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+
+def paginate(queryset, request):
+    """
+    Paginate a report queryset and return (rows, page_info)
+    """
+    paginator = ReportPagination()
+    rows = paginator.paginate_queryset(queryset, request)
+    page = paginator.page
+    return rows, {
+        'page': page.number,
+        'page_size': page.paginator.per_page,
+        'total_pages': page.paginator.num_pages,
+        'total_count': page.paginator.count,
+    }
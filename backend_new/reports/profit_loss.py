@@ -0,0 +1,88 @@
+"""
+Profit & loss report engine
+"""
+
+from datetime import datetime, timedelta
+from django.db.models import Sum
+from django.utils import timezone
+from inventory.models import CustomerInvoice, VendorBill
+from .timeseries import time_series
+
+
+def report_period(start_date=None, end_date=None):
+    """
+    Parse YYYY-MM-DD bounds, defaulting to the last 30 days. Raises ValueError on bad input.
+    """
+    end_date = datetime.strptime(end_date, '%Y-%m-%d').date() if end_date else timezone.now().date()
+    start_date = datetime.strptime(start_date, '%Y-%m-%d').date() if start_date else end_date - timedelta(days=30)
+    return start_date, end_date
+
+
+def profit_loss_querysets(user, start_date, end_date, company_id=None):
+    sales_query = CustomerInvoice.objects.filter(
+        created_by=user,
+        invoice_date__range=[start_date, end_date]
+    )
+    purchases_query = VendorBill.objects.filter(
+        created_by=user,
+        bill_date__range=[start_date, end_date]
+    )
+    
+    if company_id:
+        sales_query = sales_query.filter(company_id=company_id)
+        purchases_query = purchases_query.filter(company_id=company_id)
+    
+    return sales_query, purchases_query
+
+
+def profit_loss_summary(total_sales, total_purchases):
+    gross_profit = total_sales - total_purchases
+    return {
+        'total_sales': float(total_sales),
+        'total_purchases': float(total_purchases),
+        'gross_profit': float(gross_profit),
+        'profit_margin': float((gross_profit / total_sales * 100) if total_sales > 0 else 0)
+    }
+
+
+def profit_loss_series(sales, purchases):
+    return [
+        {
+            'period_start': sale['period_start'],
+            'label': sale['label'],
+            'sales': float(sale['total']),
+            'purchases': float(purchase['total']),
+            'gross_profit': float(sale['total'] - purchase['total']),
+        }
+        for sale, purchase in zip(sales, purchases)
+    ]
+
+
+def profit_loss_data(user, start_date, end_date, company_id=None, granularity=None):
+    """
+    Full P&L report payload for a period, with a bucketed series when granularity is given
+    """
+    sales_query, purchases_query = profit_loss_querysets(user, start_date, end_date, company_id)
+    
+    if granularity:
+        # One grouped query per side, the buckets cover the whole period so they sum to its totals
+        sales = time_series(sales_query, 'invoice_date', 'total_amount', granularity,
+                            end_date=end_date, start_date=start_date)
+        purchases = time_series(purchases_query, 'bill_date', 'total_amount', granularity,
+                                end_date=end_date, start_date=start_date)
+        total_sales = sum(bucket['total'] for bucket in sales)
+        total_purchases = sum(bucket['total'] for bucket in purchases)
+    else:
+        total_sales = sales_query.aggregate(total=Sum('total_amount'))['total'] or 0
+        total_purchases = purchases_query.aggregate(total=Sum('total_amount'))['total'] or 0
+    
+    data = {
+        'report_type': 'Profit & Loss Report',
+        'period': f"{start_date} to {end_date}",
+        'generated_at': timezone.now(),
+        'summary': profit_loss_summary(total_sales, total_purchases)
+    }
+    if granularity:
+        data['granularity'] = granularity
+        data['series'] = profit_loss_series(sales, purchases)
+    return data
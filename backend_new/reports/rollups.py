@@ -0,0 +1,209 @@
+"""
+Daily sales rollups
+
+One SalesReport row per order day, with per-category and per-product
+breakdown rows. Each run only recomputes days whose orders changed since
+the previous run, so analytics read a handful of pre-aggregated rows
+instead of the full order history. Order and item updates are found through
+their timestamps, deletions and item edits through SalesRollupDirtyDay.
+"""
+
+from collections import Counter, defaultdict
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Count, F, Max, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from inventory.models import Order, OrderItem
+from .models import SalesReport, SalesReportBreakdown, SalesRollupDirtyDay
+
+REVENUE_STATUSES = ['confirmed', 'shipped', 'delivered']
+COMMISSION_RATE = Decimal('0.10')
+
+BREAKDOWN_FIELDS = {
+    'category': 'product__category__name',
+    'product': 'product__name',
+}
+
+
+def mark_days_dirty(moments):
+    """
+    Queue the order days of the given datetimes for the next rollup run
+    """
+    now = timezone.now()
+    days = {timezone.localdate(moment) for moment in moments if moment}
+    SalesRollupDirtyDay.objects.bulk_create(
+        [SalesRollupDirtyDay(day=day, marked_at=now) for day in days],
+        update_conflicts=True,
+        unique_fields=['day'],
+        update_fields=['marked_at'],
+    )
+
+
+def changed_days(since=None):
+    """
+    Order days touched since the given time (every order day when since is None)
+    """
+    orders = Order.objects.all()
+    if since is None:
+        return set(orders.annotate(day=TruncDate('created_at')).values_list('day', flat=True).distinct())
+
+    days = set(
+        orders.filter(updated_at__gte=since)
+        .annotate(day=TruncDate('created_at')).values_list('day', flat=True).distinct()
+    )
+    days |= set(
+        OrderItem.objects.filter(created_at__gte=since)
+        .annotate(day=TruncDate('order__created_at')).values_list('day', flat=True).distinct()
+    )
+    return days
+
+
+def day_totals(days):
+    """
+    Map day -> order count and revenue for the given days
+    """
+    rows = Order.objects.filter(created_at__date__in=days).annotate(
+        day=TruncDate('created_at')
+    ).values('day').annotate(
+        total_orders=Count('id'),
+        total_revenue=Sum('total_amount', filter=Q(status__in=REVENUE_STATUSES)),
+    )
+    return {
+        row['day']: {
+            'total_orders': row['total_orders'],
+            'total_revenue': row['total_revenue'] or Decimal('0'),
+        }
+        for row in rows
+    }
+
+
+def day_breakdown(days, dimension):
+    """
+    Yield (day, name, quantity, revenue) for sold items grouped by dimension
+    """
+    rows = OrderItem.objects.filter(
+        order__created_at__date__in=days,
+        order__status__in=REVENUE_STATUSES,
+    ).annotate(
+        day=TruncDate('order__created_at'),
+        name=F(BREAKDOWN_FIELDS[dimension]),
+    ).values('day', 'name').annotate(
+        total_quantity=Sum('quantity'),
+        total_revenue=Sum('total_price'),
+    )
+    for row in rows:
+        if row['name'] is not None:
+            yield row['day'], row['name'], row['total_quantity'], row['total_revenue']
+
+
+def _top(counter):
+    return counter.most_common(1)[0][0] if counter else ''
+
+
+def rollup_sales(full=False):
+    """
+    Recompute SalesReport rows for changed days and return how many were written
+    """
+    started_at = timezone.now()
+    since = None if full else SalesReport.objects.aggregate(latest=Max('refreshed_at'))['latest']
+    dirty = set(SalesRollupDirtyDay.objects.filter(marked_at__lte=started_at).values_list('day', flat=True))
+    days = sorted(changed_days(since) | dirty)
+    if not days:
+        return 0
+
+    totals = day_totals(days)
+    breakdown = {dimension: list(day_breakdown(days, dimension)) for dimension in BREAKDOWN_FIELDS}
+    quantities = defaultdict(lambda: defaultdict(Counter))
+    for dimension, rows in breakdown.items():
+        for day, name, quantity, _ in rows:
+            quantities[day][dimension][name] += quantity
+
+    with transaction.atomic():
+        reports = {}
+        for day in days:
+            day_total = totals.get(day, {'total_orders': 0, 'total_revenue': Decimal('0')})
+            tops = {dimension: _top(quantities[day][dimension]) for dimension in BREAKDOWN_FIELDS}
+            commission = day_total['total_revenue'] * COMMISSION_RATE
+            reports[day], _ = SalesReport.objects.update_or_create(
+                report_date=day,
+                defaults={
+                    'total_orders': day_total['total_orders'],
+                    'total_revenue': day_total['total_revenue'],
+                    'total_commission': commission,
+                    'net_profit': day_total['total_revenue'] - commission,
+                    'top_selling_category': tops['category'],
+                    'top_selling_product': tops['product'],
+                    'refreshed_at': started_at,
+                }
+            )
+
+        SalesReportBreakdown.objects.filter(sales_report__report_date__in=days).delete()
+        SalesReportBreakdown.objects.bulk_create([
+            SalesReportBreakdown(
+                sales_report=reports[day],
+                dimension=dimension,
+                name=name,
+                total_quantity=quantity,
+                total_revenue=revenue or Decimal('0'),
+            )
+            for dimension, rows in breakdown.items()
+            for day, name, quantity, revenue in rows
+        ])
+        # Days marked again while this run was computing stay queued
+        SalesRollupDirtyDay.objects.filter(day__in=dirty, marked_at__lte=started_at).delete()
+
+    return len(days)
+
+
+def pending_days(start_date, end_date):
+    """
+    Days of the range whose orders changed after the last rollup run, or that
+    were queued for it. Their SalesReport rows are stale or missing.
+    """
+    since = SalesReport.objects.aggregate(latest=Max('refreshed_at'))['latest']
+    dirty = SalesRollupDirtyDay.objects.filter(day__range=[start_date, end_date]).values_list('day', flat=True)
+    return {day for day in changed_days(since) | set(dirty) if start_date <= day <= end_date}
+
+
+def sales_summary(start_date, end_date):
+    """
+    Totals and top sellers for a date range, read from the daily rollups.
+    Today is still changing and days the rollup has not caught up with yet
+    would be short, so those are computed live from their own orders.
+    """
+    today = timezone.now().date()
+    live_days = pending_days(start_date, end_date)
+    if start_date <= today <= end_date:
+        live_days.add(today)
+    rolled = Q(report_date__range=[start_date, end_date]) & ~Q(report_date__in=live_days)
+
+    summary = SalesReport.objects.filter(rolled).aggregate(
+        total_orders=Sum('total_orders'),
+        total_revenue=Sum('total_revenue'),
+    )
+    total_orders = summary['total_orders'] or 0
+    total_revenue = summary['total_revenue'] or Decimal('0')
+
+    tops = {}
+    for dimension in BREAKDOWN_FIELDS:
+        rows = SalesReportBreakdown.objects.filter(
+            dimension=dimension,
+            sales_report__in=SalesReport.objects.filter(rolled),
+        ).values('name').annotate(total_quantity=Sum('total_quantity'))
+        tops[dimension] = Counter({row['name']: row['total_quantity'] for row in rows})
+
+    if live_days:
+        for live in day_totals(live_days).values():
+            total_orders += live['total_orders']
+            total_revenue += live['total_revenue']
+        for dimension in BREAKDOWN_FIELDS:
+            for _, name, quantity, _ in day_breakdown(live_days, dimension):
+                tops[dimension][name] += quantity
+
+    return {
+        'total_orders': total_orders,
+        'total_revenue': total_revenue,
+        'top_selling_category': _top(tops['category']) or None,
+        'top_selling_product': _top(tops['product']) or None,
+    }
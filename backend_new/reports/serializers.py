@@ -1,34 +1,41 @@
 from rest_framework import serializers
-from .models import SalesReport, ProductAnalytics
+from .models import SalesReport, ProductAnalytics, ReportJob
 from masters.models import Product
 from users.models import User
 
 class SalesReportSerializer(serializers.ModelSerializer):
-    created_by_name = serializers.CharField(source='created_by.username', read_only=True)
-    
     class Meta:
         model = SalesReport
         fields = [
-            'id', 'report_name', 'report_type', 'report_date', 'start_date',
-            'end_date', 'total_sales', 'total_orders', 'total_customers',
-            'average_order_value', 'top_products', 'sales_by_category',
-            'sales_by_month', 'is_generated', 'created_by', 'created_by_name',
-            'created_at', 'updated_at'
+            'id', 'report_date', 'total_orders', 'total_revenue', 'total_commission',
+            'net_profit', 'top_selling_category', 'top_selling_product', 'is_active',
+            'refreshed_at', 'created_at'
         ]
-        read_only_fields = ['id', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'refreshed_at', 'created_at']
 
 class ProductAnalyticsSerializer(serializers.ModelSerializer):
     product_name = serializers.CharField(source='product.name', read_only=True)
     product_sku = serializers.CharField(source='product.sku', read_only=True)
-    created_by_name = serializers.CharField(source='created_by.username', read_only=True)
     
     class Meta:
         model = ProductAnalytics
         fields = [
-            'id', 'product', 'product_name', 'product_sku', 'analytics_type',
-            'analytics_date', 'views_count', 'sales_count', 'revenue',
-            'conversion_rate', 'average_rating', 'total_reviews',
-            'stock_level', 'low_stock_alert', 'created_by', 'created_by_name',
-            'created_at', 'updated_at'
+            'id', 'product', 'product_name', 'product_sku', 'total_views',
+            'total_sales', 'total_revenue', 'conversion_rate', 'is_active',
+            'last_updated'
+        ]
+        read_only_fields = ['id', 'last_updated']
+
+class ReportJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ReportJob
+        fields = [
+            'id', 'report_type', 'params', 'status', 'error', 'attempts',
+            'created_at', 'started_at', 'finished_at'
         ]
-        read_only_fields = ['id', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'status', 'error', 'attempts', 'created_at', 'started_at', 'finished_at']
+    
+    def validate_params(self, value):
+        if not isinstance(value, dict):
+            raise serializers.ValidationError('params must be an object')
+        return value
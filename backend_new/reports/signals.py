@@ -0,0 +1,107 @@
+from django.db.models.signals import post_delete, post_init, post_save
+from masters.models import Company, Contact, Product
+from inventory.models import (
+    CustomerInvoice, Order, OrderItem, PurchaseOrder, SalesOrder, StockMovement, VendorBill
+)
+from .cache import invalidate_reports
+from .counters import MODEL_COUNTERS, apply_counter_delta, counted_as, counter_state, move_counters
+from .leaderboards import apply_item, apply_order
+from .models import SalesReport
+from .rollups import REVENUE_STATUSES, mark_days_dirty
+
+COUNTED_MODELS = [Company, Contact, *MODEL_COUNTERS]
+
+# Any write to these can change a report result
+REPORT_SOURCE_MODELS = [
+    CustomerInvoice, VendorBill, StockMovement, Order, OrderItem,
+    PurchaseOrder, SalesOrder, Company, Contact, Product, SalesReport,
+]
+
+
+def remember_counter_state(sender, instance, **kwargs):
+    instance._counter_state = counter_state(instance)
+
+
+def count_saved(sender, instance, created, **kwargs):
+    if created:
+        apply_counter_delta(instance, 1)
+    else:
+        move_counters(instance, instance._counter_state)
+    instance._counter_state = counter_state(instance)
+
+
+def count_deleted(sender, instance, **kwargs):
+    # Uncount what was saved, not unsaved edits on the instance
+    apply_counter_delta(counted_as(instance, instance._counter_state), -1)
+
+
+def report_data_changed(sender, **kwargs):
+    invalidate_reports()
+
+
+def remember_order_status(sender, instance, **kwargs):
+    # Read from __dict__ so a deferred status field is not fetched
+    instance._leaderboard_status = instance.__dict__.get('status')
+
+
+def order_status_changed(sender, instance, created, **kwargs):
+    was_counted = not created and instance._leaderboard_status in REVENUE_STATUSES
+    is_counted = instance.status in REVENUE_STATUSES
+    if is_counted != was_counted:
+        apply_order(instance, 1 if is_counted else -1)
+    instance._leaderboard_status = instance.status
+
+
+def order_removed(sender, instance, **kwargs):
+    mark_days_dirty([instance.created_at])
+
+
+def remember_order_item(sender, instance, **kwargs):
+    # Read from __dict__ so deferred fields are not fetched
+    values = instance.__dict__
+    instance._leaderboard_line = (values.get('product_id'), values.get('quantity'), values.get('total_price'))
+
+
+def order_item_changed(instance, created=False, deleted=False):
+    order = Order.objects.filter(pk=instance.order_id).values('status', 'created_at').first()
+    previous = instance._leaderboard_line
+    remember_order_item(OrderItem, instance)
+    if order is None:
+        return
+    if not created:
+        # New items are found by their created_at, edits and deletes leave no trace
+        mark_days_dirty([order['created_at']])
+    if order['status'] not in REVENUE_STATUSES:
+        return
+
+    # Deleting an order deletes its items first, they take themselves off the leaderboards
+    if not created and None not in previous:
+        apply_item(*previous, order['created_at'], -1)
+    if not deleted:
+        apply_item(*instance._leaderboard_line, order['created_at'], 1)
+
+
+def order_item_saved(sender, instance, created, **kwargs):
+    order_item_changed(instance, created=created)
+
+
+def order_item_deleted(sender, instance, **kwargs):
+    order_item_changed(instance, deleted=True)
+
+
+for model in COUNTED_MODELS:
+    post_init.connect(remember_counter_state, sender=model, dispatch_uid=f'dashboard_count_loaded_{model.__name__}')
+    post_save.connect(count_saved, sender=model, dispatch_uid=f'dashboard_count_saved_{model.__name__}')
+    post_delete.connect(count_deleted, sender=model, dispatch_uid=f'dashboard_count_deleted_{model.__name__}')
+
+for model in REPORT_SOURCE_MODELS:
+    post_save.connect(report_data_changed, sender=model, dispatch_uid=f'report_cache_saved_{model.__name__}')
+    post_delete.connect(report_data_changed, sender=model, dispatch_uid=f'report_cache_deleted_{model.__name__}')
+
+post_init.connect(remember_order_status, sender=Order, dispatch_uid='leaderboard_order_loaded')
+post_save.connect(order_status_changed, sender=Order, dispatch_uid='leaderboard_order_saved')
+post_delete.connect(order_removed, sender=Order, dispatch_uid='rollup_order_deleted')
+
+post_init.connect(remember_order_item, sender=OrderItem, dispatch_uid='order_item_loaded')
+post_save.connect(order_item_saved, sender=OrderItem, dispatch_uid='order_item_saved')
+post_delete.connect(order_item_deleted, sender=OrderItem, dispatch_uid='order_item_deleted')
@@ -0,0 +1,167 @@
+"""
+Stock report engine
+
+Reads stock in / stock out / adjustments for every product from the
+maintained StockBalance rows in a single grouped query. Historical
+positions (as_of) start from the nearest StockSnapshot checkpoint and
+replay only the movements recorded after it.
+"""
+
+from decimal import Decimal
+from django.db.models import DecimalField, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from masters.models import Product
+from inventory.models import StockBalance, StockMovement, StockSnapshot
+from inventory.snapshots import day_end, latest_checkpoint
+
+STOCK_ORDERING_FIELDS = ['name', 'sku', 'stock_in', 'stock_out', 'adjustments', 'available_stock']
+
+QUANTITY_FIELD = DecimalField(max_digits=14, decimal_places=2)
+
+# Worklist rows shown inline by product_performance
+LOW_STOCK_PREVIEW = 50
+
+
+def _balance_total(field, company_id=None):
+    only = Q(stock_balances__company_id=company_id) if company_id else None
+    return Coalesce(Sum(f'stock_balances__{field}', filter=only), Value(Decimal('0')), output_field=QUANTITY_FIELD)
+
+
+def _product_total(queryset, field):
+    totals = queryset.filter(product=OuterRef('pk')).values('product').annotate(total=Sum(field)).values('total')
+    return Coalesce(Subquery(totals, output_field=QUANTITY_FIELD), Value(Decimal('0')), output_field=QUANTITY_FIELD)
+
+
+def _as_of_totals(as_of, user, company_id=None):
+    """
+    Annotations for the stock position at the end of the as_of date, scoped to
+    the user's products and the company like the live balances
+    """
+    checkpoint = latest_checkpoint(as_of)
+    snapshots = StockSnapshot.objects.filter(snapshot_date=checkpoint, product__created_by=user)
+    movements = StockMovement.objects.filter(created_at__lt=day_end(as_of), product__created_by=user)
+    if company_id:
+        snapshots = snapshots.filter(company_id=company_id)
+        movements = movements.filter(company_id=company_id)
+    if checkpoint:
+        movements = movements.filter(created_at__gte=day_end(checkpoint))
+
+    def replay(field, movement_type):
+        return (
+            _product_total(snapshots, field)
+            + _product_total(movements.filter(movement_type=movement_type), 'quantity')
+        )
+
+    return {
+        'stock_in': replay('total_in', 'in'),
+        'stock_out': replay('total_out', 'out'),
+        'adjustments': replay('total_adjustment', 'adjustment'),
+        'reserved_stock': Value(Decimal('0'), output_field=QUANTITY_FIELD),
+    }
+
+
+def stock_queryset(user, company_id=None, ordering=None, as_of=None):
+    """
+    Products annotated with stock_in, stock_out, adjustments and available_stock
+    """
+    queryset = Product.objects.filter(created_by=user).select_related('company')
+    if company_id:
+        queryset = queryset.filter(company_id=company_id)
+
+    if as_of:
+        queryset = queryset.annotate(**_as_of_totals(as_of, user, company_id)).annotate(
+            available_stock=F('stock_in') - F('stock_out') + F('adjustments'),
+        )
+    else:
+        queryset = queryset.annotate(
+            stock_in=_balance_total('total_in', company_id),
+            stock_out=_balance_total('total_out', company_id),
+            adjustments=_balance_total('total_adjustment', company_id),
+            reserved_stock=_balance_total('reserved', company_id),
+            available_stock=_balance_total('on_hand', company_id),
+        )
+
+    # Only allow ordering on known columns, always tie-break on id so pages are stable
+    if ordering and ordering.lstrip('-') in STOCK_ORDERING_FIELDS:
+        return queryset.order_by(ordering, 'id')
+    return queryset.order_by('id')
+
+
+def stock_row(product):
+    return {
+        'product_id': product.id,
+        'product_name': product.name,
+        'product_sku': product.sku,
+        'unit_price': float(product.unit_price),
+        'stock_in': float(product.stock_in),
+        'stock_out': float(product.stock_out),
+        'adjustments': float(product.adjustments),
+        'reserved_stock': float(product.reserved_stock),
+        'available_stock': float(product.available_stock),
+        'stock_value': float(product.available_stock * product.unit_price),
+        'company_name': product.company.name,
+    }
+
+
+def stock_report_data(user, company_id=None, ordering=None, as_of=None):
+    """
+    Full, unpaginated stock report payload
+    """
+    products = stock_queryset(user, company_id=company_id, ordering=ordering, as_of=as_of)
+    rows = [stock_row(product) for product in products.iterator(chunk_size=2000)]
+    return {
+        'report_type': 'Stock Report',
+        'generated_at': timezone.now(),
+        'as_of': as_of,
+        'total_products': len(rows),
+        'data': rows,
+    }
+
+
+def stock_totals(user, company_id):
+    """
+    Stock subtotals for one company, read from its balances in one aggregate
+    """
+    totals = StockBalance.objects.filter(company_id=company_id, product__created_by=user).aggregate(
+        stock_in=Sum('total_in'),
+        stock_out=Sum('total_out'),
+        adjustments=Sum('total_adjustment'),
+        reserved_stock=Sum('reserved'),
+        available_stock=Sum('on_hand'),
+        stock_value=Sum(F('on_hand') * F('product__unit_price'), output_field=QUANTITY_FIELD),
+    )
+    data = {field: float(value or 0) for field, value in totals.items()}
+    data['total_products'] = Product.objects.filter(created_by=user, company_id=company_id).count()
+    return data
+
+
+def low_stock_queryset(user=None, company_id=None):
+    """
+    Balances on the reorder worklist, read through the partial needs_reorder index
+    """
+    balances = StockBalance.objects.filter(
+        needs_reorder=True,
+        product__is_active=True,
+    ).select_related('product', 'product__category', 'company')
+    if user is not None:
+        balances = balances.filter(product__created_by=user)
+    if company_id:
+        balances = balances.filter(company_id=company_id)
+    return balances.order_by('company_id', 'product_id')
+
+
+def low_stock_row(balance):
+    available = balance.on_hand - balance.reserved
+    return {
+        'product_id': balance.product_id,
+        'product_name': balance.product.name,
+        'product_sku': balance.product.sku,
+        'category_name': balance.product.category.name if balance.product.category else None,
+        'company_name': balance.company.name,
+        'on_hand': float(balance.on_hand),
+        'reserved': float(balance.reserved),
+        'available_stock': float(available),
+        'reorder_level': balance.reorder_level,
+        'shortage': float(balance.reorder_level - available),
+    }
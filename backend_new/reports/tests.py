@@ -1,3 +1,316 @@
-from django.test import TestCase
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+from django.db import DatabaseError
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from users.models import User
+from masters.models import Category, Company, Contact, Product
+from inventory.models import Order, OrderItem
+from .analytics import AnalyticsBuffer, analytics_buffer, write_counts
+from .counters import dashboard_counts
+from .jobs import claim_next_job, run_job
+from .leaderboards import rebuild_leaderboards
+from .models import LeaderboardEntry, ProductAnalytics, ReportJob, SalesReport
+from .rollups import rollup_sales, sales_summary
 
-# Create your tests here.
+
+class ReportsTestCase(TestCase):
+    """
+    A user with one company and two products in one category
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='analyst', password='analyst')
+        cls.company = cls.make_company('Test Company')
+        cls.category = Category.objects.create(name='Gadgets')
+        cls.widget = cls.make_product('Widget', 'SKU-1')
+        cls.gizmo = cls.make_product('Gizmo', 'SKU-2')
+
+    @classmethod
+    def make_product(cls, name, sku):
+        return Product.objects.create(
+            company=cls.company, category=cls.category, name=name, product_type='goods', sku=sku,
+            unit_price=Decimal('10.00'), stock_quantity=100, created_by=cls.user,
+        )
+
+    @classmethod
+    def make_company(cls, name):
+        return Company.objects.create(
+            name=name, address='1 Test Street', city='Pune', state='MH', postal_code='411001',
+            phone='0000000000', email='company@example.com', tax_id=f'TAX-{name}', created_by=cls.user,
+        )
+
+    def make_order(self, status='confirmed', lines=None):
+        order = Order.objects.create(
+            user=self.user, shipping_address='2 Test Street', status=status, total_amount=Decimal('100'),
+        )
+        for product, quantity in lines or []:
+            OrderItem.objects.create(order=order, product=product, quantity=quantity, unit_price=Decimal('10'))
+        return order
+
+
+class SalesRollupTests(ReportsTestCase):
+
+    def report(self):
+        return SalesReport.objects.get(report_date=timezone.localdate())
+
+    def test_deleting_an_order_refreshes_its_day(self):
+        self.make_order(lines=[(self.widget, 1)])
+        doomed = self.make_order(lines=[(self.gizmo, 5)])
+        rollup_sales()
+        self.assertEqual((self.report().total_orders, self.report().top_selling_product), (2, 'Gizmo'))
+
+        doomed.delete()
+        rollup_sales()
+
+        report = self.report()
+        self.assertEqual(report.total_orders, 1)
+        self.assertEqual(report.total_revenue, Decimal('100'))
+        self.assertEqual(report.top_selling_product, 'Widget')
+
+    def test_editing_or_deleting_an_item_refreshes_its_day(self):
+        order = self.make_order(lines=[(self.widget, 3), (self.gizmo, 2)])
+        rollup_sales()
+        self.assertEqual(self.report().top_selling_product, 'Widget')
+
+        item = order.items.get(product=self.gizmo)
+        item.quantity = 9
+        item.save()
+        rollup_sales()
+        self.assertEqual(self.report().top_selling_product, 'Gizmo')
+
+        item.delete()
+        rollup_sales()
+        self.assertEqual(self.report().top_selling_product, 'Widget')
+
+    def test_an_unchanged_day_is_not_recomputed(self):
+        self.make_order(lines=[(self.widget, 1)])
+        self.assertEqual(rollup_sales(), 1)
+        self.assertEqual(rollup_sales(), 0)
+
+    def test_the_summary_counts_days_the_rollup_has_not_caught_up_with(self):
+        yesterday = timezone.now() - timedelta(days=1)
+
+        def order_yesterday(lines):
+            order = self.make_order(lines=lines)
+            Order.objects.filter(pk=order.pk).update(created_at=yesterday)
+
+        order_yesterday([(self.widget, 1)])
+        rollup_sales()
+        order_yesterday([(self.gizmo, 5)])
+
+        day = timezone.localdate(yesterday)
+        summary = sales_summary(day - timedelta(days=1), day)
+        self.assertEqual((summary['total_orders'], summary['total_revenue']), (2, Decimal('200')))
+        self.assertEqual(summary['top_selling_product'], 'Gizmo')
+
+        rollup_sales()
+        self.assertEqual(sales_summary(day - timedelta(days=1), day), summary)
+
+
+class DashboardCounterTests(ReportsTestCase):
+
+    def make_contact(self, contact_type):
+        return Contact.objects.create(
+            company=self.company, contact_type=contact_type, name='Contact', email='contact@example.com',
+            phone='0000000000', address='3 Test Street', city='Pune', state='MH', postal_code='411001',
+            created_by=self.user,
+        )
+
+    def counts(self, company=None):
+        counts = dashboard_counts(self.user, company.pk if company else None)
+        return {field: counts[field] for field in ('total_companies', 'total_products', 'total_customers', 'total_suppliers')}
+
+    def test_changing_a_contact_type_moves_its_count(self):
+        contact = self.make_contact('customer')
+        contact.contact_type = 'both'
+        contact.save()
+        self.assertEqual((self.counts()['total_customers'], self.counts()['total_suppliers']), (1, 1))
+
+        contact.contact_type = 'supplier'
+        contact.save()
+        self.assertEqual((self.counts()['total_customers'], self.counts()['total_suppliers']), (0, 1))
+
+        contact.delete()
+        self.assertEqual((self.counts()['total_customers'], self.counts()['total_suppliers']), (0, 0))
+
+    def test_moving_a_product_to_another_company_moves_its_count(self):
+        other = self.make_company('Other Company')
+        self.widget.company = other
+        self.widget.save()
+
+        self.assertEqual(other.dashboard_counters.get().total_products, 1)
+        self.assertEqual(self.company.dashboard_counters.get().total_products, 1)
+        self.assertEqual(self.counts()['total_products'], 2)
+
+    def test_deleting_uncounts_the_saved_values(self):
+        contact = self.make_contact('customer')
+        # An unsaved edit does not decide which counter the delete takes from
+        contact.contact_type = 'supplier'
+        contact.delete()
+        self.assertEqual((self.counts()['total_customers'], self.counts()['total_suppliers']), (0, 0))
+
+
+@override_settings(REPORT_JOB_TIMEOUT=60, REPORT_JOB_MAX_ATTEMPTS=2)
+class ReportJobTests(ReportsTestCase):
+
+    def abandon(self, job):
+        # The worker died a while after claiming the job
+        ReportJob.objects.filter(pk=job.pk).update(started_at=timezone.now() - timedelta(minutes=5))
+
+    def test_a_job_whose_worker_died_is_claimed_again(self):
+        job = ReportJob.objects.create(user=self.user, report_type='stock')
+        claimed = claim_next_job()
+        self.assertEqual((claimed.pk, claimed.attempts), (job.pk, 1))
+        self.assertIsNone(claim_next_job())
+
+        self.abandon(claimed)
+        reclaimed = claim_next_job()
+        self.assertEqual((reclaimed.pk, reclaimed.attempts), (job.pk, 2))
+
+        run_job(reclaimed)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'completed')
+
+    def test_a_job_fails_after_its_last_attempt(self):
+        job = ReportJob.objects.create(user=self.user, report_type='stock')
+        self.abandon(claim_next_job())
+        self.abandon(claim_next_job())
+
+        self.assertIsNone(claim_next_job())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error), ('failed', 'Timed out after 2 attempts'))
+
+    def test_a_worker_that_was_taken_over_does_not_record_its_result(self):
+        ReportJob.objects.create(user=self.user, report_type='stock')
+        slow = claim_next_job()
+        self.abandon(slow)
+        slow.started_at = ReportJob.objects.get(pk=slow.pk).started_at
+        claim_next_job()
+
+        run_job(slow)
+        self.assertEqual(ReportJob.objects.get(pk=slow.pk).status, 'running')
+
+
+class ProductAnalyticsTests(ReportsTestCase):
+
+    def tearDown(self):
+        analytics_buffer.flush()
+
+    def test_product_detail_records_a_view(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        for url in (f'/api/products/{self.widget.pk}/', f'/api/crud/products/{self.widget.pk}/'):
+            self.assertEqual(client.get(url).status_code, 200)
+        analytics_buffer.flush()
+
+        self.assertEqual(ProductAnalytics.objects.get(product=self.widget).total_views, 2)
+
+    def test_a_quiet_buffer_is_flushed_by_its_timer(self):
+        written = threading.Event()
+        buffer = AnalyticsBuffer(interval=0.05)
+        with mock.patch('reports.analytics.write_counts', side_effect=lambda counts: written.set()) as write:
+            buffer.record_view(self.widget.pk)
+            self.assertTrue(written.wait(5))
+
+        self.assertEqual(write.call_args.args[0][self.widget.pk]['views'], 1)
+        self.assertIsNone(buffer.timer)
+
+    @override_settings(PRODUCT_ANALYTICS_FLUSH_INTERVAL=0)
+    def test_a_failed_flush_does_not_fail_the_request(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with mock.patch('reports.analytics.write_counts', side_effect=DatabaseError('database is locked')), \
+                self.assertLogs('reports.analytics', 'ERROR'):
+            self.assertEqual(client.get(f'/api/products/{self.widget.pk}/').status_code, 200)
+
+        # The view is written by the next flush
+        analytics_buffer.flush()
+        self.assertEqual(ProductAnalytics.objects.get(product=self.widget).total_views, 1)
+
+    def test_a_flush_adds_to_the_row_another_process_created(self):
+        ProductAnalytics.objects.create(product=self.widget, total_views=3)
+        write_counts({
+            self.widget.pk: {'views': 1, 'sales': 2, 'revenue': Decimal('20')},
+            self.gizmo.pk: {'views': 4, 'sales': 0, 'revenue': Decimal('0')},
+        })
+
+        rows = ProductAnalytics.objects.order_by('product__name').values_list('product__name', 'total_views', 'total_sales')
+        self.assertEqual(list(rows), [('Gizmo', 4, 0), ('Widget', 4, 2)])
+
+
+class LeaderboardTests(ReportsTestCase):
+
+    def standings(self):
+        return {
+            (entry.dimension, entry.window, entry.name): (entry.total_quantity, entry.total_revenue)
+            for entry in LeaderboardEntry.objects.filter(total_quantity__gt=0)
+        }
+
+    def assertStandings(self, expected):
+        standings = self.standings()
+        self.assertEqual(
+            {key: quantity for key, (quantity, _) in standings.items() if key[1] == 'all' and key[0] == 'product'},
+            expected,
+        )
+        # The running totals match a rebuild from the order items
+        rebuild_leaderboards()
+        self.assertEqual(self.standings(), standings)
+
+    def test_items_of_a_counted_order_move_the_leaderboards(self):
+        order = self.make_order(lines=[(self.widget, 2)])
+        self.assertStandings({('product', 'all', 'Widget'): 2})
+
+        item = OrderItem.objects.create(order=order, product=self.gizmo, quantity=3, unit_price=Decimal('10'))
+        self.assertStandings({('product', 'all', 'Widget'): 2, ('product', 'all', 'Gizmo'): 3})
+
+        item.quantity = 5
+        item.save()
+        self.assertStandings({('product', 'all', 'Widget'): 2, ('product', 'all', 'Gizmo'): 5})
+
+        item.product = self.widget
+        item.save()
+        self.assertStandings({('product', 'all', 'Widget'): 7})
+
+        item.delete()
+        self.assertStandings({('product', 'all', 'Widget'): 2})
+
+    def test_items_of_an_uncounted_order_wait_for_its_status(self):
+        order = self.make_order(status='pending', lines=[(self.widget, 2)])
+        OrderItem.objects.create(order=order, product=self.widget, quantity=1, unit_price=Decimal('10'))
+        self.assertEqual(self.standings(), {})
+
+        order.status = 'confirmed'
+        order.save()
+        self.assertStandings({('product', 'all', 'Widget'): 3})
+
+    def test_deleting_an_order_removes_its_items_once(self):
+        self.make_order(lines=[(self.widget, 1)])
+        doomed = self.make_order(lines=[(self.widget, 4), (self.gizmo, 2)])
+
+        doomed.delete()
+        self.assertStandings({('product', 'all', 'Widget'): 1})
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'performance'}})
+class ProductPerformanceTests(ReportsTestCase):
+
+    def test_low_stock_lists_only_the_users_products(self):
+        other = User.objects.create_user(username='other', password='other')
+        for product, owner in ((self.widget, self.user), (self.make_product('Other', 'SKU-3'), other)):
+            product.created_by = owner
+            product.reorder_level = 500
+            product.save()
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        response = client.get('/api/reports/product-performance/')
+        self.assertEqual([row['name'] for row in response.json()['low_stock_products']], ['Widget'])
+
+        other_company = self.make_company('Other Company')
+        response = client.get('/api/reports/product-performance/', {'company_id': other_company.pk})
+        self.assertEqual(response.json()['low_stock_products'], [])
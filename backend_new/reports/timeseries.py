@@ -0,0 +1,114 @@
+"""
+Time-series aggregation helpers shared by the report views
+"""
+
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from django.db.models import Count, DateField, DateTimeField, Sum
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
+from django.utils import timezone
+
+GRANULARITIES = {
+    'day': TruncDay,
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+
+
+def period_start(day, granularity):
+    if granularity == 'month':
+        return day.replace(day=1)
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    return day
+
+
+def previous_period(start, granularity):
+    if granularity == 'month':
+        return (start - timedelta(days=1)).replace(day=1)
+    if granularity == 'week':
+        return start - timedelta(days=7)
+    return start - timedelta(days=1)
+
+
+def next_period(start, granularity):
+    if granularity == 'month':
+        return (start + timedelta(days=32)).replace(day=1)
+    if granularity == 'week':
+        return start + timedelta(days=7)
+    return start + timedelta(days=1)
+
+
+def range_period_starts(granularity, start_date, end_date):
+    """
+    Start dates of every calendar bucket overlapping start_date..end_date, oldest first
+    """
+    starts = [period_start(start_date, granularity)]
+    while next_period(starts[-1], granularity) <= end_date:
+        starts.append(next_period(starts[-1], granularity))
+    return starts
+
+
+def period_starts(granularity, periods, end_date):
+    """
+    Start dates of the last `periods` calendar buckets up to end_date, oldest first
+    """
+    starts = [period_start(end_date, granularity)]
+    while len(starts) < periods:
+        starts.append(previous_period(starts[-1], granularity))
+    starts.reverse()
+    return starts
+
+
+def period_label(start, granularity):
+    if granularity == 'month':
+        return start.strftime('%b %Y')
+    if granularity == 'week':
+        return f"Week of {start.strftime('%d %b %Y')}"
+    return start.strftime('%d %b %Y')
+
+
+def time_series(queryset, date_field, amount_field, granularity='month', periods=6, end_date=None, start_date=None):
+    """
+    Total, count and average of amount_field per calendar bucket, in one grouped query.
+    Covers start_date..end_date when start_date is given, else the last `periods` buckets.
+    Buckets without rows are returned with zeros so the series has no holes.
+    """
+    end_date = end_date or timezone.now().date()
+    if start_date:
+        starts = range_period_starts(granularity, start_date, end_date)
+    else:
+        starts = period_starts(granularity, periods, end_date)
+        start_date = starts[0]
+
+    # DateTimeField columns need aware bounds, DateField columns take plain dates
+    if isinstance(queryset.model._meta.get_field(date_field), DateTimeField):
+        lower = timezone.make_aware(datetime.combine(start_date, time.min))
+        upper = timezone.make_aware(datetime.combine(end_date + timedelta(days=1), time.min))
+    else:
+        lower, upper = start_date, end_date + timedelta(days=1)
+
+    rows = queryset.filter(**{
+        f'{date_field}__gte': lower,
+        f'{date_field}__lt': upper,
+    }).annotate(
+        bucket=GRANULARITIES[granularity](date_field, output_field=DateField())
+    ).values('bucket').annotate(
+        total=Sum(amount_field),
+        count=Count('pk'),
+    ).order_by()
+    buckets = {row['bucket']: row for row in rows}
+
+    series = []
+    for start in starts:
+        row = buckets.get(start, {})
+        total = row.get('total') or Decimal('0')
+        count = row.get('count') or 0
+        series.append({
+            'period_start': start,
+            'label': period_label(start, granularity),
+            'total': total,
+            'count': count,
+            'average': total / count if count else Decimal('0'),
+        })
+    return series
@@ -3,8 +3,13 @@ from . import views
 
 urlpatterns = [
     path('stock/', views.stock_report, name='stock-report'),
+    path('low-stock/', views.low_stock_report, name='low-stock-report'),
     path('pnl/', views.profit_loss_report, name='profit-loss-report'),
+    path('ageing/', views.ageing_report, name='ageing-report'),
     path('dashboard/', views.dashboard_summary, name='dashboard-summary'),
     path('ecommerce/', views.ecommerce_analytics, name='ecommerce-analytics'),
     path('product-performance/', views.product_performance, name='product-performance'),
+    path('jobs/', views.report_jobs, name='report-jobs'),
+    path('jobs/<int:job_id>/', views.report_job_detail, name='report-job-detail'),
+    path('jobs/<int:job_id>/download/', views.report_job_download, name='report-job-download'),
 ]
@@ -1,175 +1,172 @@
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from django.db.models import Sum, Count, Q
+from rest_framework import status
+import json
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Sum, F
+from django.http import HttpResponse
 from django.utils import timezone
 from datetime import datetime, timedelta
-from masters.models import Company, Product, Contact
-from inventory.models import (
-    PurchaseOrder, SalesOrder, VendorBill, CustomerInvoice, StockMovement, Order, OrderItem
-)
+from masters.models import Product
+from inventory.models import Order
+from .ageing import AGEING_SOURCES, ageing_queryset, ageing_row, ageing_summary
+from .cache import cached_report
+from .consolidated import consolidated_profit_loss, consolidated_stock, parse_company_ids
+from .counters import dashboard_counts, paid_since
+from .leaderboards import WINDOWS, top_entries
+from .jobs import result_csv
+from .models import ReportJob
+from .pagination import paginate
+from .profit_loss import profit_loss_data, report_period
+from .serializers import ReportJobSerializer
+from .rollups import COMMISSION_RATE, REVENUE_STATUSES, sales_summary
+from .timeseries import GRANULARITIES, time_series
+from .stock import LOW_STOCK_PREVIEW, low_stock_queryset, low_stock_row, stock_queryset, stock_row
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@cached_report('stock')
 def stock_report(request):
     """
     Stock Report - Product-wise available quantity
     """
     company_id = request.GET.get('company_id')
+    ordering = request.GET.get('ordering')
+    as_of = request.GET.get('as_of')
     
-    # Get all products for the user's companies
-    products_query = Product.objects.filter(created_by=request.user)
-    if company_id:
-        products_query = products_query.filter(company_id=company_id)
+    # Group view across companies, one subtotal per company computed in parallel
+    if request.GET.get('consolidated') == 'true':
+        if as_of:
+            return Response({'error': 'as_of is not supported for consolidated reports'},
+                          status=status.HTTP_400_BAD_REQUEST)
+        try:
+            company_ids = parse_company_ids(request.GET.get('company_ids'))
+        except ValueError:
+            return Response({'error': 'company_ids must be a comma separated list of ids'},
+                          status=status.HTTP_400_BAD_REQUEST)
+        return Response(consolidated_stock(request.user, company_ids))
     
-    stock_data = []
+    # Point-in-time report, answered from the nearest snapshot checkpoint
+    if as_of:
+        try:
+            as_of = datetime.strptime(as_of, '%Y-%m-%d').date()
+        except ValueError:
+            return Response({'error': 'as_of must be in YYYY-MM-DD format'}, status=status.HTTP_400_BAD_REQUEST)
     
-    for product in products_query:
-        # Calculate stock in
-        stock_in = StockMovement.objects.filter(
-            product=product,
-            movement_type='in',
-            created_by=request.user
-        ).aggregate(total=Sum('quantity'))['total'] or 0
-        
-        # Calculate stock out
-        stock_out = StockMovement.objects.filter(
-            product=product,
-            movement_type='out',
-            created_by=request.user
-        ).aggregate(total=Sum('quantity'))['total'] or 0
-        
-        # Calculate available stock
-        available_stock = stock_in - stock_out
-        
-        stock_data.append({
-            'product_id': product.id,
-            'product_name': product.name,
-            'product_sku': product.sku,
-            'unit_price': float(product.unit_price),
-            'stock_in': float(stock_in),
-            'stock_out': float(stock_out),
-            'available_stock': float(available_stock),
-            'company_name': product.company.name
-        })
+    products_query = stock_queryset(request.user, company_id=company_id, ordering=ordering, as_of=as_of)
+    products, page_info = paginate(products_query, request)
     
     return Response({
         'report_type': 'Stock Report',
         'generated_at': timezone.now(),
-        'total_products': len(stock_data),
-        'data': stock_data
+        'as_of': as_of,
+        'total_products': page_info['total_count'],
+        'pagination': page_info,
+        'data': [stock_row(product) for product in products]
     })
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@cached_report('low_stock')
+def low_stock_report(request):
+    """
+    Low Stock Report - Products below their reorder level
+    """
+    company_id = request.GET.get('company_id')
+    
+    balances, page_info = paginate(low_stock_queryset(request.user, company_id), request)
+    
+    return Response({
+        'report_type': 'Low Stock Report',
+        'generated_at': timezone.now(),
+        'pagination': page_info,
+        'data': [low_stock_row(balance) for balance in balances]
+    })
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@cached_report('pnl')
 def profit_loss_report(request):
     """
     P&L Report - Sales vs Purchases
     """
     company_id = request.GET.get('company_id')
-    start_date = request.GET.get('start_date')
-    end_date = request.GET.get('end_date')
     
     # Default to last 30 days if no dates provided
-    if not end_date:
-        end_date = timezone.now().date()
-    if not start_date:
-        start_date = end_date - timedelta(days=30)
+    try:
+        start_date, end_date = report_period(request.GET.get('start_date'), request.GET.get('end_date'))
+    except ValueError:
+        return Response({'error': 'Dates must be in YYYY-MM-DD format'}, status=status.HTTP_400_BAD_REQUEST)
     
-    # Convert string dates to date objects
-    if isinstance(start_date, str):
-        start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
-    if isinstance(end_date, str):
-        end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
+    granularity = request.GET.get('granularity')
+    if granularity and granularity not in GRANULARITIES:
+        return Response({'error': f"granularity must be one of: {', '.join(GRANULARITIES)}"},
+                      status=status.HTTP_400_BAD_REQUEST)
     
-    # Filter by company if provided
-    sales_query = CustomerInvoice.objects.filter(
-        created_by=request.user,
-        invoice_date__range=[start_date, end_date]
-    )
-    purchases_query = VendorBill.objects.filter(
-        created_by=request.user,
-        bill_date__range=[start_date, end_date]
-    )
+    if request.GET.get('consolidated') == 'true':
+        try:
+            company_ids = parse_company_ids(request.GET.get('company_ids'))
+        except ValueError:
+            return Response({'error': 'company_ids must be a comma separated list of ids'},
+                          status=status.HTTP_400_BAD_REQUEST)
+        return Response(consolidated_profit_loss(request.user, start_date, end_date, company_ids, granularity))
     
-    if company_id:
-        sales_query = sales_query.filter(company_id=company_id)
-        purchases_query = purchases_query.filter(company_id=company_id)
+    return Response(profit_loss_data(request.user, start_date, end_date, company_id, granularity))
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@cached_report('ageing')
+def ageing_report(request):
+    """
+    Aged receivables / payables - open balances per contact by days overdue
+    """
+    company_id = request.GET.get('company_id')
+    report_type = request.GET.get('type', 'receivables')
+    if report_type not in AGEING_SOURCES:
+        return Response({'error': f"type must be one of: {', '.join(AGEING_SOURCES)}"},
+                      status=status.HTTP_400_BAD_REQUEST)
+    
+    as_of = request.GET.get('as_of')
+    try:
+        as_of = datetime.strptime(as_of, '%Y-%m-%d').date() if as_of else timezone.now().date()
+    except ValueError:
+        return Response({'error': 'as_of must be in YYYY-MM-DD format'}, status=status.HTTP_400_BAD_REQUEST)
     
-    # Calculate totals
-    total_sales = sales_query.aggregate(total=Sum('total_amount'))['total'] or 0
-    total_purchases = purchases_query.aggregate(total=Sum('total_amount'))['total'] or 0
-    gross_profit = total_sales - total_purchases
+    contacts_query = ageing_queryset(request.user, report_type, as_of, company_id)
+    contacts, page_info = paginate(contacts_query, request)
+    summary = ageing_summary(request.user, report_type, as_of, company_id)
     
     return Response({
-        'report_type': 'Profit & Loss Report',
-        'period': f"{start_date} to {end_date}",
+        'report_type': 'Aged Receivables' if report_type == 'receivables' else 'Aged Payables',
         'generated_at': timezone.now(),
-        'summary': {
-            'total_sales': float(total_sales),
-            'total_purchases': float(total_purchases),
-            'gross_profit': float(gross_profit),
-            'profit_margin': float((gross_profit / total_sales * 100) if total_sales > 0 else 0)
-        }
+        'as_of': as_of,
+        'summary': summary,
+        'pagination': page_info,
+        'data': [ageing_row(row) for row in contacts]
     })
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@cached_report('dashboard')
 def dashboard_summary(request):
     """
     Dashboard Summary - Key metrics for the dashboard
     """
     company_id = request.GET.get('company_id')
     
-    # Filter by company if provided
-    base_filter = {'created_by': request.user}
-    if company_id:
-        base_filter['company_id'] = company_id
-    
-    # Get counts
-    total_companies = Company.objects.filter(created_by=request.user).count()
-    total_products = Product.objects.filter(created_by=request.user).count()
-    total_customers = Contact.objects.filter(
-        contact_type__in=['customer', 'both'],
-        created_by=request.user
-    ).count()
-    total_suppliers = Contact.objects.filter(
-        contact_type__in=['supplier', 'both'],
-        created_by=request.user
-    ).count()
-    
-    # Get transaction counts
-    total_purchase_orders = PurchaseOrder.objects.filter(**base_filter).count()
-    total_sales_orders = SalesOrder.objects.filter(**base_filter).count()
-    total_bills = VendorBill.objects.filter(**base_filter).count()
-    total_invoices = CustomerInvoice.objects.filter(**base_filter).count()
-    
-    # Calculate totals for current month
-    current_month_start = timezone.now().replace(day=1)
-    current_month_sales = CustomerInvoice.objects.filter(
-        **base_filter,
-        invoice_date__gte=current_month_start,
-        status='paid'
-    ).aggregate(total=Sum('total_amount'))['total'] or 0
+    # Get counts from the maintained counters, one row per company
+    counters = dashboard_counts(request.user, company_id)
     
-    current_month_purchases = VendorBill.objects.filter(
-        **base_filter,
-        bill_date__gte=current_month_start,
-        status='paid'
-    ).aggregate(total=Sum('total_amount'))['total'] or 0
+    # Calculate paid totals for current month in a single query
+    current_month_start = timezone.now().date().replace(day=1)
+    current_month_sales, current_month_purchases = paid_since(request.user, current_month_start, company_id)
     
     return Response({
         'report_type': 'Dashboard Summary',
         'generated_at': timezone.now(),
         'summary': {
-            'total_companies': total_companies,
-            'total_products': total_products,
-            'total_customers': total_customers,
-            'total_suppliers': total_suppliers,
-            'total_purchase_orders': total_purchase_orders,
-            'total_sales_orders': total_sales_orders,
-            'total_bills': total_bills,
-            'total_invoices': total_invoices,
+            **counters,
             'current_month_sales': float(current_month_sales),
             'current_month_purchases': float(current_month_purchases),
             'current_month_profit': float(current_month_sales - current_month_purchases)
@@ -178,6 +175,7 @@ def dashboard_summary(request):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@cached_report('ecommerce')
 def ecommerce_analytics(request):
     """
     E-commerce Analytics - Sales, orders, and product performance
@@ -186,59 +184,40 @@ def ecommerce_analytics(request):
     end_date = timezone.now().date()
     start_date = end_date - timedelta(days=30)
     
-    # Total orders
-    total_orders = Order.objects.filter(created_at__date__range=[start_date, end_date]).count()
+    try:
+        months = min(max(int(request.GET.get('months', 6)), 1), 120)
+    except ValueError:
+        return Response({'error': 'months must be a number'}, status=status.HTTP_400_BAD_REQUEST)
     
-    # Total revenue
-    total_revenue = Order.objects.filter(
-        created_at__date__range=[start_date, end_date],
-        status__in=['confirmed', 'shipped', 'delivered']
-    ).aggregate(total=Sum('total_amount'))['total'] or 0
+    # Totals and top sellers from the daily rollups
+    summary = sales_summary(start_date, end_date)
+    total_orders = summary['total_orders']
+    total_revenue = summary['total_revenue']
     
     # Total commission (10% of revenue)
-    total_commission = total_revenue * 0.10
+    total_commission = total_revenue * COMMISSION_RATE
     
     # Net profit
     net_profit = total_revenue - total_commission
     
-    # Top selling category
-    top_category = OrderItem.objects.filter(
-        order__created_at__date__range=[start_date, end_date],
-        order__status__in=['confirmed', 'shipped', 'delivered']
-    ).values('product__category__name').annotate(
-        total_sales=Sum('quantity')
-    ).order_by('-total_sales').first()
-    
-    # Top selling product
-    top_product = OrderItem.objects.filter(
-        order__created_at__date__range=[start_date, end_date],
-        order__status__in=['confirmed', 'shipped', 'delivered']
-    ).values('product__name').annotate(
-        total_sales=Sum('quantity')
-    ).order_by('-total_sales').first()
-    
     # Recent orders
     recent_orders = Order.objects.filter(
         created_at__date__range=[start_date, end_date]
-    ).order_by('-created_at')[:10]
+    ).select_related('user').order_by('-created_at')[:10]
     
-    # Monthly sales data
-    monthly_sales = []
-    for i in range(6):  # Last 6 months
-        month_start = (timezone.now().replace(day=1) - timedelta(days=30*i)).date()
-        month_end = (month_start + timedelta(days=30)).date()
-        
-        month_revenue = Order.objects.filter(
-            created_at__date__range=[month_start, month_end],
-            status__in=['confirmed', 'shipped', 'delivered']
-        ).aggregate(total=Sum('total_amount'))['total'] or 0
-        
-        monthly_sales.append({
-            'month': month_start.strftime('%b %Y'),
-            'revenue': float(month_revenue)
-        })
-    
-    monthly_sales.reverse()
+    # Monthly sales data, one grouped query over calendar months
+    monthly_sales = [
+        {
+            'month': bucket['label'],
+            'period_start': bucket['period_start'],
+            'revenue': float(bucket['total']),
+            'orders': bucket['count'],
+            'average_order_value': float(bucket['average']),
+        } for bucket in time_series(
+            Order.objects.filter(status__in=REVENUE_STATUSES),
+            'created_at', 'total_amount', granularity='month', periods=months, end_date=end_date
+        )
+    ]
     
     return Response({
         'report_type': 'E-commerce Analytics',
@@ -249,8 +228,8 @@ def ecommerce_analytics(request):
             'total_revenue': float(total_revenue),
             'total_commission': float(total_commission),
             'net_profit': float(net_profit),
-            'top_selling_category': top_category['product__category__name'] if top_category else None,
-            'top_selling_product': top_product['product__name'] if top_product else None,
+            'top_selling_category': summary['top_selling_category'],
+            'top_selling_product': summary['top_selling_product'],
         },
         'recent_orders': [
             {
@@ -267,38 +246,103 @@ def ecommerce_analytics(request):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@cached_report('product_performance')
 def product_performance(request):
     """
     Product Performance Analytics
     """
-    # Top selling products
-    top_products = OrderItem.objects.filter(
-        order__status__in=['confirmed', 'shipped', 'delivered']
-    ).values(
-        'product__name', 'product__category__name', 'product__unit_price'
-    ).annotate(
-        total_sales=Sum('quantity'),
-        total_revenue=Sum('total_price')
-    ).order_by('-total_sales')[:10]
+    window = request.GET.get('window', 'all')
+    if window not in WINDOWS:
+        return Response({'error': f"window must be one of: {', '.join(WINDOWS)}"},
+                      status=status.HTTP_400_BAD_REQUEST)
     
-    # Category performance
-    category_performance = OrderItem.objects.filter(
-        order__status__in=['confirmed', 'shipped', 'delivered']
-    ).values('product__category__name').annotate(
-        total_sales=Sum('quantity'),
-        total_revenue=Sum('total_price')
-    ).order_by('-total_sales')
+    # Top selling products and category totals, read from the maintained leaderboards
+    entries = list(top_entries('product', window, limit=10))
+    unit_prices = dict(Product.objects.filter(
+        id__in=[entry.item_id for entry in entries]
+    ).values_list('id', 'unit_price'))
+    top_products = [
+        {
+            'product__name': entry.name,
+            'product__category__name': entry.category_name or None,
+            'product__unit_price': unit_prices.get(entry.item_id),
+            'total_sales': entry.total_quantity,
+            'total_revenue': entry.total_revenue,
+        }
+        for entry in entries
+    ]
     
-    # Low stock products
-    low_stock_products = Product.objects.filter(
-        stock_quantity__lt=10,
-        is_active=True
-    ).values('name', 'stock_quantity', 'category__name')
+    category_performance = top_entries('category', window).values(
+        'total_revenue',
+        product__category__name=F('name'),
+        total_sales=F('total_quantity'),
+    )
+    
+    # Low stock products, the head of the reorder worklist (full list at /api/reports/low-stock/)
+    low_stock_products = low_stock_queryset(request.user, request.GET.get('company_id')).values(
+        name=F('product__name'),
+        stock_quantity=F('on_hand') - F('reserved'),
+        category__name=F('product__category__name')
+    )[:LOW_STOCK_PREVIEW]
     
     return Response({
         'report_type': 'Product Performance',
         'generated_at': timezone.now(),
-        'top_products': list(top_products),
+        'window': window,
+        'top_products': top_products,
         'category_performance': list(category_performance),
         'low_stock_products': list(low_stock_products)
-    })
\ No newline at end of file
+    })
+
+@api_view(['GET', 'POST'])
+@permission_classes([IsAuthenticated])
+def report_jobs(request):
+    """
+    List the user's report jobs or queue a new one for the report worker
+    """
+    if request.method == 'POST':
+        serializer = ReportJobSerializer(data=request.data)
+        if serializer.is_valid():
+            job = serializer.save(user=request.user)
+            return Response(ReportJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    jobs = ReportJob.objects.filter(user=request.user).order_by('-created_at')[:50]
+    return Response(ReportJobSerializer(jobs, many=True).data)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def report_job_detail(request, job_id):
+    """
+    Poll the status of a report job
+    """
+    try:
+        job = ReportJob.objects.get(id=job_id, user=request.user)
+    except ReportJob.DoesNotExist:
+        return Response({'error': 'Report job not found'}, status=status.HTTP_404_NOT_FOUND)
+    return Response(ReportJobSerializer(job).data)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def report_job_download(request, job_id):
+    """
+    Download a finished report job as JSON (default) or CSV (?export=csv)
+    """
+    try:
+        job = ReportJob.objects.get(id=job_id, user=request.user)
+    except ReportJob.DoesNotExist:
+        return Response({'error': 'Report job not found'}, status=status.HTTP_404_NOT_FOUND)
+    
+    if job.status != 'completed':
+        return Response({'error': f'Report job is {job.status}'}, status=status.HTTP_409_CONFLICT)
+    
+    export = request.GET.get('export', 'json')
+    if export == 'csv':
+        response = HttpResponse(result_csv(job.result), content_type='text/csv')
+    elif export == 'json':
+        response = HttpResponse(json.dumps(job.result, cls=DjangoJSONEncoder), content_type='application/json')
+    else:
+        return Response({'error': 'export must be csv or json'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    response['Content-Disposition'] = f'attachment; filename="{job.report_type}-report-{job.id}.{export}"'
+    return response
@@ -89,6 +89,66 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# Report results are cached here; switch to FileBasedCache to share across processes
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "shiv-accounts",
+    }
+}
+
+REPORT_CACHE_TIMEOUT = 60 * 60
+
+# Seconds product view / sale counts are buffered in memory before being written
+PRODUCT_ANALYTICS_FLUSH_INTERVAL = 30
+
+# Threads used to build consolidated multi-company reports
+REPORT_CONSOLIDATION_WORKERS = 4
+
+# Seconds a report job may stay running before its worker is presumed dead and
+# the job is queued again, failed after REPORT_JOB_MAX_ATTEMPTS runs
+REPORT_JOB_TIMEOUT = 10 * 60
+REPORT_JOB_MAX_ATTEMPTS = 3
+
+# Document number allocation per document type (app_label.model_name). Types that
+# allow gaps hand out numbers from a block of block_size reserved once per process;
+# unlisted types are gap-free and take each number inside the inserting transaction.
+DOCUMENT_SEQUENCES = {
+    'inventory.order': {'allow_gaps': True, 'block_size': 50},
+    'inventory.customerinvoice': {'allow_gaps': False},
+}
+
+# Seconds a cart line holds its stock after it was last added or changed
+CART_RESERVATION_TTL = 15 * 60
+
+# Flat delivery charge added to every non-empty cart and order
+CART_DELIVERY_CHARGE = '50.00'
+
+# Queue checkouts as CheckoutIntents for the process_checkouts workers instead of
+# placing the order in the request, for traffic peaks
+QUEUED_CHECKOUT = False
+
+# Checkout intents a worker claims and places in one transaction
+CHECKOUT_QUEUE_BATCH_SIZE = 100
+
+# Seconds a checkout intent may stay running before its worker is presumed dead
+# and the intent is queued again, failed after CHECKOUT_INTENT_MAX_ATTEMPTS claims
+CHECKOUT_INTENT_TIMEOUT = 5 * 60
+CHECKOUT_INTENT_MAX_ATTEMPTS = 3
+
+# Seconds a response stored for an Idempotency-Key is replayed to retries
+IDEMPOTENCY_KEY_RETENTION = 24 * 60 * 60
+
+# Seconds after which a key claimed by a request that never finished (its process
+# died) can be used again. A claim is not renewed while its request runs, so this
+# must stay above the web server's worker / request timeout, past which a request
+# is killed anyway, or a slow request's retry would run the view a second time
+IDEMPOTENCY_CLAIM_TIMEOUT = 15 * 60
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
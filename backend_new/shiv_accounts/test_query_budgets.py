@@ -0,0 +1,473 @@
+"""
+Per-endpoint query budgets
+
+Every URL in shiv_accounts/urls.py (crud_urls.py included) declares the most
+queries a request may run. Each endpoint is requested against a small and a
+large fixture; a test fails when an endpoint goes over its budget or runs
+more queries on the large fixture than on the small one, and prints the SQL
+with the project line each query came from. Every request must answer with
+its expected status first, routes that do not answer 200 to a GET are listed
+in GET_STATUS and only 2xx responses are held to a budget.
+
+Run with: python manage.py test shiv_accounts.test_query_budgets
+"""
+
+import os
+import re
+import traceback
+from collections import Counter
+from datetime import date, timedelta
+from decimal import Decimal
+from django.conf import settings
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import URLPattern, URLResolver, get_resolver
+from rest_framework.test import APIClient
+from users.models import User
+from masters.models import (
+    Category, ChartOfAccounts, Company, Contact, Product, ProductImage, ProductReview,
+    SellerInvoice, SellerProduct, SellerProfile, Tax
+)
+from inventory.models import (
+    Cart, CheckoutIntent, CustomerInvoice, CustomerInvoiceLineItem, Order, OrderItem, PurchaseOrder,
+    PurchaseOrderLineItem, SalesOrder, SalesOrderLineItem, StockMovement, VendorBill, VendorBillLineItem
+)
+from reports.analytics import analytics_buffer
+from reports.models import ProductAnalytics, ReportJob, SalesReport
+
+SMALL = 2
+LARGE = 8
+
+# Route -> most queries a GET may run. Routes are the full patterns from the root URLconf.
+QUERY_BUDGETS = {
+    # Auth
+    'api/auth/register/': 2,
+    'api/auth/login/': 2,
+    'api/auth/logout/': 2,
+    'api/auth/profile/': 2,
+    'api/auth/roles/': 2,
+    'api/auth/by-role/<str:role>/': 2,
+    'api/auth/by-type/<str:user_type>/': 2,
+    'api/auth/check-username/': 2,
+    # Master data
+    'api/companies/': 4,
+    'api/companies/<int:pk>/': 4,
+    'api/contacts/': 4,
+    'api/contacts/<int:pk>/': 4,
+    'api/products/': 5,
+    'api/products/<int:pk>/': 4,
+    'api/taxes/': 4,
+    'api/taxes/<int:pk>/': 4,
+    'api/chart-of-accounts/': 4,
+    'api/chart-of-accounts/<int:pk>/': 4,
+    'api/categories/': 4,
+    'api/categories/<int:pk>/': 4,
+    'api/products/<int:product_id>/reviews/': 4,
+    'api/products/<int:product_id>/images/': 4,
+    'api/seller-profiles/': 4,
+    'api/seller-profiles/<int:pk>/': 4,
+    'api/seller-products/': 4,
+    'api/seller-products/<int:pk>/': 4,
+    'api/seller-products/<int:product_id>/approve/': 2,
+    'api/admin/seller-products/': 4,
+    'api/admin/seller-products/<int:pk>/': 4,
+    'api/seller-invoices/': 4,
+    'api/seller-invoices/<int:pk>/': 4,
+    # Inventory and e-commerce
+    'api/purchase-orders/': 3,
+    'api/purchase-orders/<int:pk>/': 3,
+    'api/purchase-orders/<int:po_id>/convert-to-bill/': 2,
+    'api/sales-orders/': 3,
+    'api/sales-orders/<int:pk>/': 3,
+    'api/sales-orders/<int:so_id>/convert-to-invoice/': 2,
+    'api/bills/': 3,
+    'api/bills/<int:pk>/': 3,
+    'api/invoices/': 3,
+    'api/invoices/<int:pk>/': 3,
+    'api/stock-movements/': 1,
+    'api/cart/': 4,
+    'api/cart/bulk/': 2,
+    'api/cart/summary/': 2,
+    'api/cart/<int:pk>/': 4,
+    'api/orders/': 4,
+    'api/orders/<int:pk>/': 4,
+    'api/checkout/': 2,
+    'api/checkout/<int:intent_id>/': 4,
+    # Reports
+    'api/reports/stock/': 6,
+    'api/reports/low-stock/': 6,
+    'api/reports/pnl/': 6,
+    'api/reports/ageing/': 6,
+    'api/reports/dashboard/': 6,
+    'api/reports/ecommerce/': 12,
+    'api/reports/product-performance/': 8,
+    'api/reports/jobs/': 4,
+    'api/reports/jobs/<int:job_id>/': 4,
+    'api/reports/jobs/<int:job_id>/download/': 4,
+    # Generic CRUD
+    'api/crud/users/': 4,
+    'api/crud/users/<int:pk>/': 4,
+    'api/crud/companies/': 4,
+    'api/crud/companies/<int:pk>/': 4,
+    'api/crud/contacts/': 4,
+    'api/crud/contacts/<int:pk>/': 4,
+    'api/crud/categories/': 4,
+    'api/crud/categories/<int:pk>/': 4,
+    'api/crud/products/': 5,
+    'api/crud/products/<int:pk>/': 4,
+    'api/crud/products/<int:product_id>/images/': 4,
+    'api/crud/products/<int:product_id>/images/<int:pk>/': 4,
+    'api/crud/products/<int:product_id>/reviews/': 2,
+    'api/crud/products/<int:product_id>/reviews/<int:pk>/': 1,
+    'api/crud/taxes/': 4,
+    'api/crud/taxes/<int:pk>/': 4,
+    'api/crud/chart-of-accounts/': 4,
+    'api/crud/chart-of-accounts/<int:pk>/': 4,
+    'api/crud/sellers/seller-profiles/': 4,
+    'api/crud/sellers/seller-profiles/<int:pk>/': 4,
+    'api/crud/sellers/seller-products/': 4,
+    'api/crud/sellers/seller-products/<int:pk>/': 4,
+    'api/crud/sellers/seller-invoices/': 4,
+    'api/crud/sellers/seller-invoices/<int:pk>/': 4,
+    'api/crud/ecommerce/carts/': 4,
+    'api/crud/ecommerce/carts/<int:pk>/': 4,
+    'api/crud/ecommerce/orders/': 4,
+    'api/crud/ecommerce/orders/<int:pk>/': 4,
+    'api/crud/ecommerce/order-items/': 4,
+    'api/crud/ecommerce/order-items/<int:pk>/': 4,
+    'api/crud/purchases/purchase-orders/': 4,
+    'api/crud/purchases/purchase-orders/<int:pk>/': 3,
+    'api/crud/sales/sales-orders/': 4,
+    'api/crud/sales/sales-orders/<int:pk>/': 3,
+    'api/crud/sales/customer-invoices/': 4,
+    'api/crud/sales/customer-invoices/<int:pk>/': 3,
+    'api/crud/inventory/stock-movements/': 2,
+    'api/crud/inventory/stock-movements/<int:pk>/': 1,
+    'api/crud/reports/sales-reports/': 2,
+    'api/crud/reports/sales-reports/<int:pk>/': 1,
+    'api/crud/reports/product-analytics/': 2,
+    'api/crud/reports/product-analytics/<int:pk>/': 1,
+    'api/crud/bulk/bulk/delete/<str:model_name>/': 2,
+    'api/crud/bulk/bulk/update/<str:model_name>/': 2,
+}
+
+# (method, route) pairs that still run more queries as rows grow. An entry here is reported but
+# does not fail; once the route is fixed the test fails until the entry is removed.
+KNOWN_GROWTH = set()
+
+# Route -> status a GET is expected to answer with when it is not 200. Only 2xx
+# responses are held to their budget.
+GET_STATUS = {
+    # POST-only routes
+    'api/auth/register/': 405,
+    'api/auth/login/': 405,
+    'api/auth/logout/': 405,
+    'api/cart/bulk/': 405,
+    'api/checkout/': 405,
+    'api/seller-products/<int:product_id>/approve/': 405,
+    'api/purchase-orders/<int:po_id>/convert-to-bill/': 405,
+    'api/sales-orders/<int:so_id>/convert-to-invoice/': 405,
+    'api/crud/bulk/bulk/delete/<str:model_name>/': 405,
+    'api/crud/bulk/bulk/update/<str:model_name>/': 405,
+}
+
+# POST /api/checkout/, savepoints included
+CHECKOUT_QUERY_BUDGET = 28
+
+# POST /api/cart/bulk/ with every product, savepoints included, the holds mirrored on StockBalance.reserved
+CART_BULK_QUERY_BUDGET = 15
+
+# Values for path parameters that do not name a model primary key
+PATH_VALUES = {
+    'role': 'admin',
+    'user_type': 'buyer',
+    'model_name': 'products',
+}
+
+# Path parameters that are the primary key of a fixed model
+PATH_MODELS = {
+    'product_id': Product,
+    'po_id': PurchaseOrder,
+    'so_id': SalesOrder,
+    'job_id': ReportJob,
+}
+
+EXCLUDED_PREFIXES = ('admin/',)
+
+PROJECT_DIR = str(settings.BASE_DIR)
+
+
+def iter_routes(patterns=None, prefix=''):
+    """
+    Yield (route, pattern) for every URL pattern below the root URLconf
+    """
+    for pattern in patterns if patterns is not None else get_resolver().url_patterns:
+        route = prefix + str(pattern.pattern)
+        if isinstance(pattern, URLResolver):
+            yield from iter_routes(pattern.url_patterns, route)
+        elif isinstance(pattern, URLPattern) and not route.startswith(EXCLUDED_PREFIXES):
+            yield route, pattern
+
+
+def view_model(pattern):
+    view_class = getattr(pattern.callback, 'view_class', None)
+    if view_class is None:
+        return None
+    queryset = getattr(view_class, 'queryset', None)
+    if queryset is not None:
+        return queryset.model
+    serializer_class = getattr(view_class, 'serializer_class', None)
+    return serializer_class.Meta.model if serializer_class else None
+
+
+def build_path(route, pattern):
+    """
+    Fill the route's parameters with ids from the fixture
+    """
+    def replace(match):
+        name = match.group('name')
+        if name in PATH_VALUES:
+            return PATH_VALUES[name]
+        model = PATH_MODELS.get(name) or view_model(pattern)
+        obj = model.objects.order_by('id').first() if model else None
+        return str(obj.pk if obj else 1)
+
+    return '/' + re.sub(r'<(?:\w+:)?(?P<name>\w+)>', replace, route)
+
+
+def _frame(frame, base):
+    return f'{os.path.relpath(frame.filename, base)}:{frame.lineno} in {frame.name}'
+
+
+def query_origin(stack):
+    """
+    Innermost project frame behind a query, plus the library frame that ran it
+    """
+    project = library = None
+    for frame in reversed(stack):
+        filename = os.path.abspath(frame.filename)
+        if filename == os.path.abspath(__file__):
+            continue
+        if filename.startswith(PROJECT_DIR) and 'site-packages' not in filename:
+            if not filename.endswith('manage.py'):
+                project = _frame(frame, PROJECT_DIR)
+            break
+        if library is None and f'django{os.sep}db' not in filename:
+            library = _frame(frame, os.path.dirname(os.path.dirname(filename)))
+    return ' <- '.join(origin for origin in (project, library) if origin) or '<framework>'
+
+
+class QueryRecorder:
+    """
+    Database execute wrapper that keeps each query's SQL and origin
+    """
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append((sql, query_origin(traceback.extract_stack()[:-1])))
+        return execute(sql, params, many, context)
+
+
+def record(client, method, path, data=None, status=200):
+    recorder = QueryRecorder()
+    with connection.execute_wrapper(recorder):
+        response = getattr(client, method)(path, data, format='json')
+    # A query count only means something for the response the route is meant to give
+    if response.status_code != status:
+        raise AssertionError(
+            f'{method.upper()} {path} returned {response.status_code}, expected {status}: {response.content[:500]!r}'
+        )
+    return recorder.queries
+
+
+def describe(queries):
+    """
+    Queries grouped by SQL shape, the repeated ones first
+    """
+    shapes = Counter()
+    origins = {}
+    for sql, origin in queries:
+        shape = re.sub(r'\b\d+\b', 'N', sql)
+        shapes[shape] += 1
+        origins.setdefault(shape, origin)
+    lines = []
+    for shape, count in shapes.most_common():
+        lines.append(f'  {count}x  {origins[shape]}\n      {shape[:300]}')
+    return '\n'.join(lines)
+
+
+def populate(user, count, start=0):
+    """
+    Add `count` rows of every model owned by user, numbered from start
+    """
+    today = date.today()
+    for index in range(start, start + count):
+        company = Company.objects.create(
+            name=f'Company {index}', address='1 Test Street', city='Pune', state='MH', postal_code='411001',
+            phone='0000000000', email=f'company{index}@example.com', tax_id=f'TAX-{index}', created_by=user,
+        )
+        category = Category.objects.create(name=f'Category {index}')
+        tax = Tax.objects.create(company=company, name='GST', rate=Decimal('18'), created_by=user)
+        ChartOfAccounts.objects.create(
+            company=company, code=f'{1000 + index}', name=f'Account {index}', account_type='asset', created_by=user,
+        )
+        contact = Contact.objects.create(
+            company=company, contact_type='both', name=f'Contact {index}', email=f'contact{index}@example.com',
+            phone='0000000000', address='2 Test Street', city='Pune', state='MH', postal_code='411001',
+            created_by=user,
+        )
+        product = Product.objects.create(
+            company=company, category=category, tax=tax, name=f'Product {index}', product_type='goods',
+            sku=f'SKU-{index}', unit_price=Decimal('10.00'), stock_quantity=1000, created_by=user,
+        )
+        ProductImage.objects.create(product=product, image=f'products/{index}.jpg')
+        ProductReview.objects.create(product=product, user=user, rating=4, comment='Fine')
+        # SellerProduct.save() multiplies the price by a float, bulk_create skips it
+        SellerProduct.objects.bulk_create([
+            SellerProduct(seller=user, product=product, selling_price=Decimal('12.00'), commission_amount=Decimal('1.20'))
+        ])
+        SellerInvoice.objects.create(
+            seller=user, total_sales=Decimal('100'), commission_amount=Decimal('10'), net_amount=Decimal('90'),
+        )
+        StockMovement.objects.create(
+            company=company, product=product, movement_type='in', quantity=500,
+            reference_type='test', reference_id=index, created_by=user,
+        )
+        Cart.objects.create(user=user, product=product, quantity=1)
+        ProductAnalytics.objects.create(product=product)
+        SalesReport.objects.create(report_date=today - timedelta(days=index + 1))
+        ReportJob.objects.create(user=user, report_type='stock', status='completed', result={'data': []})
+
+        purchase_order = PurchaseOrder.objects.create(
+            company=company, supplier=contact, po_date=today, expected_delivery_date=today,
+            status='confirmed', created_by=user,
+        )
+        sales_order = SalesOrder.objects.create(
+            company=company, customer=contact, so_date=today, expected_delivery_date=today,
+            status='confirmed', created_by=user,
+        )
+        bill = VendorBill.objects.create(
+            company=company, supplier=contact, bill_date=today, due_date=today, total_amount=Decimal('50'),
+            status='confirmed', created_by=user,
+        )
+        invoice = CustomerInvoice.objects.create(
+            company=company, customer=contact, invoice_date=today, due_date=today, total_amount=Decimal('80'),
+            status='sent', created_by=user,
+        )
+        order = Order.objects.create(user=user, shipping_address='3 Test Street', status='confirmed')
+        for line in range(count):
+            PurchaseOrderLineItem.objects.create(
+                purchase_order=purchase_order, product=product, quantity=1, unit_price=Decimal('5'), line_total=0,
+            )
+            SalesOrderLineItem.objects.create(
+                sales_order=sales_order, product=product, quantity=1, unit_price=Decimal('10'), line_total=0,
+            )
+            VendorBillLineItem.objects.create(
+                vendor_bill=bill, product=product, quantity=1, unit_price=Decimal('5'), line_total=0,
+            )
+            CustomerInvoiceLineItem.objects.create(
+                customer_invoice=invoice, product=product, quantity=1, unit_price=Decimal('10'), line_total=0,
+            )
+            OrderItem.objects.create(order=order, product=product, quantity=1, unit_price=Decimal('10'))
+        CheckoutIntent.objects.create(user=user, status='completed', order=order)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+class QueryBudgetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='budget', password='budget', role='admin', is_staff=True)
+        SellerProfile.objects.create(user=cls.user, business_name='Budget Traders', business_type='retail')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.client.raise_request_exception = False
+
+    def tearDown(self):
+        # Product detail reads buffer analytics counts, write them while the test database exists
+        analytics_buffer.flush()
+
+    def measure_all(self):
+        return {
+            route: record(self.client, 'get', build_path(route, pattern), status=GET_STATUS.get(route, 200))
+            for route, pattern in iter_routes()
+        }
+
+    def test_every_route_has_a_budget(self):
+        missing = [route for route, _ in iter_routes() if route not in QUERY_BUDGETS]
+        self.assertEqual(missing, [], 'Declare a query budget for these routes in QUERY_BUDGETS')
+        routes = {route for route, _ in iter_routes()}
+        self.assertEqual([route for route in GET_STATUS if route not in routes], [], 'GET_STATUS names unknown routes')
+
+    def test_get_query_budgets(self):
+        populate(self.user, SMALL)
+        small = self.measure_all()
+        populate(self.user, LARGE - SMALL, start=SMALL)
+        large = self.measure_all()
+
+        for route, queries in large.items():
+            if not 200 <= GET_STATUS.get(route, 200) < 300:
+                continue
+            with self.subTest(route=route):
+                grew = len(queries) > len(small[route])
+                budget = QUERY_BUDGETS.get(route)
+                if ('get', route) in KNOWN_GROWTH:
+                    self.assertTrue(grew, f'{route} no longer grows with row count, remove it from KNOWN_GROWTH')
+                    continue
+                self.assertFalse(
+                    grew,
+                    f'{route} ran {len(small[route])} queries with {SMALL} rows and {len(queries)} '
+                    f'with {LARGE} rows:\n{describe(queries)}'
+                )
+                if budget is not None:
+                    self.assertLessEqual(
+                        len(queries), budget,
+                        f'{route} ran {len(queries)} queries, budget is {budget}:\n{describe(queries)}'
+                    )
+
+    def test_checkout_query_budget(self):
+        populate(self.user, SMALL)
+        small = record(self.client, 'post', '/api/checkout/', {'shipping_address': 'Test'}, status=201)
+        populate(self.user, LARGE, start=SMALL)
+        large = record(self.client, 'post', '/api/checkout/', {'shipping_address': 'Test'}, status=201)
+
+        if ('post', 'api/checkout/') in KNOWN_GROWTH:
+            self.assertGreater(len(large), len(small), 'checkout no longer grows with cart size, remove it from KNOWN_GROWTH')
+            return
+        self.assertLessEqual(
+            len(large), len(small),
+            f'checkout ran {len(small)} queries for {SMALL} cart items and {len(large)} for {LARGE}:\n'
+            f'{describe(large)}'
+        )
+        self.assertLessEqual(
+            len(large), CHECKOUT_QUERY_BUDGET,
+            f'checkout ran {len(large)} queries, budget is {CHECKOUT_QUERY_BUDGET}:\n{describe(large)}'
+        )
+
+    def test_cart_bulk_query_budget(self):
+        def upsert(quantity):
+            return record(self.client, 'post', '/api/cart/bulk/', {
+                'items': [{'product': pk, 'quantity': quantity} for pk in Product.objects.values_list('pk', flat=True)]
+            })
+
+        # Both measured runs update existing holds and create new ones
+        populate(self.user, SMALL)
+        upsert(1)
+        populate(self.user, SMALL, start=SMALL)
+        small = upsert(2)
+        populate(self.user, LARGE, start=2 * SMALL)
+        large = upsert(3)
+
+        self.assertLessEqual(
+            len(large), len(small),
+            f'cart bulk upsert ran {len(small)} queries for {2 * SMALL} products and {len(large)} for '
+            f'{2 * SMALL + LARGE}:\n{describe(large)}'
+        )
+        self.assertLessEqual(
+            len(large), CART_BULK_QUERY_BUDGET,
+            f'cart bulk upsert ran {len(large)} queries, budget is {CART_BULK_QUERY_BUDGET}:\n{describe(large)}'
+        )